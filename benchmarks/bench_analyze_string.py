@@ -0,0 +1,141 @@
+"""
+Values per second for helpers.analyze_string, compared with the classifier it replaced.
+
+    python benchmarks/bench_analyze_string.py [--values 20000] [--repeat 5]
+
+The corpus mimics what a capture feeds the analyzer: a modest set of distinct header and cookie values
+repeated on every request, plus hashes, base64 blobs, dates and plain tokens.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import traceback
+from datetime import datetime
+
+from dateutil import parser as date_parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harryparser import helpers
+
+
+# The classifier as it was before the staged pipeline, kept verbatim as the "before" baseline
+def legacy_is_base64(s):
+    try:
+        decoded_bytes = base64.b64decode(s)
+        if base64.b64encode(decoded_bytes).decode() == s:
+            return True, decoded_bytes
+    except Exception:
+        pass
+    return False, None
+
+
+def legacy_is_hash(s):
+    if len(str(s)) <= 64:
+        hash_types = {
+            r"^[a-fA-F\d]{32}$": "MD5",
+            r"^[a-fA-F\d]{40}$": "SHA-1",
+            r"^[a-fA-F\d]{64}$": "SHA-256",
+        }
+        for pattern, hash_type in hash_types.items():
+            if re.match(pattern, s):
+                return hash_type
+    return None
+
+
+def legacy_is_date(s):
+    if re.match(r'^\d{10}(\d{3})?$', s):
+        return datetime.utcfromtimestamp(int(s[:10])).strftime("%Y-%m-%d %H:%M:%S")
+    if not re.search(r"[-/:.]", s):
+        return None
+    try:
+        return date_parser.parse(s, fuzzy=True).strftime("%Y-%m-%d %H:%M:%S")
+    except:
+        return None
+
+
+def legacy_analyze_string(s):
+    if type(s) == str and s.strip():
+        try:
+            is_base64_encoded, decoded_bytes = legacy_is_base64(str(s))
+            if is_base64_encoded:
+                return f"Base64 encoded. Decoded bytes: {decoded_bytes}"
+            hash_type = legacy_is_hash(str(s))
+            if hash_type:
+                return f"Hash detected ({hash_type})."
+            standardized_date = legacy_is_date(str(s))
+            if standardized_date:
+                return f"Date detected. Standardized date: {standardized_date}"
+        except:
+            traceback.print_exc()
+    return False
+
+
+def build_corpus(count, distinct, seed=0):
+    rng = random.Random(seed)
+    pool = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0 Safari/537.36",
+        "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "gzip, deflate, br", "en-US,en;q=0.9", "keep-alive", "no-cache", "same-origin", "?1", "document",
+        "Tue, 15 Nov 1994 08:12:31 GMT", "2023-05-01T10:00:00.000Z", "https://www.example.com/path/to/page.html",
+    ]
+    for i in range(distinct):
+        kind = i % 6
+        token = hashlib.sha256(f"{seed}-{i}".encode()).hexdigest()
+        if kind == 0:
+            pool.append(token[:32])
+        elif kind == 1:
+            pool.append(base64.b64encode(token.encode()[:rng.randint(5, 40)]).decode())
+        elif kind == 2:
+            pool.append(f"GA1.2.{rng.randint(10 ** 8, 10 ** 9)}.{rng.randint(10 ** 9, 2 * 10 ** 9)}")
+        elif kind == 3:
+            pool.append(str(rng.randint(1500000000, 1700000000)))
+        elif kind == 4:
+            pool.append(f"session-{token[:12]}; path=/; v=1.{i}")
+        else:
+            pool.append(json.dumps({"id": i, "ts": f"2023-05-0{i % 9 + 1} 10:00"}))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def measure(func, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        helpers._classify_cached.cache_clear()
+        start = time.perf_counter()
+        for value in corpus:
+            func(value)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(corpus) / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="analyze_string throughput, before and after")
+    arg_parser.add_argument("--values", type=int, default=20000, help="Values classified per round")
+    arg_parser.add_argument("--distinct", type=int, default=600, help="Distinct values in the corpus")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Rounds, the best one is reported")
+    args = arg_parser.parse_args()
+
+    corpus = build_corpus(args.values, args.distinct)
+    distinct = set(corpus)
+    mismatches = [value for value in distinct if legacy_analyze_string(value) != helpers.classify_string(value)]
+
+    results = {
+        "values": len(corpus),
+        "distinct_values": len(distinct),
+        "before_values_per_sec": round(measure(legacy_analyze_string, corpus, args.repeat)),
+        "after_uncached_values_per_sec": round(measure(helpers.classify_string, corpus, args.repeat)),
+        "after_values_per_sec": round(measure(helpers.analyze_string, corpus, args.repeat)),
+        "verdict_mismatches": len(mismatches),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
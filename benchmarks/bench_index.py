@@ -0,0 +1,103 @@
+"""
+Time adding captures to the cross-capture index and querying it once it holds millions of observations.
+
+    python benchmarks/bench_index.py [--captures 2000] [--rows 1000] [--shared 0.2] [--everywhere 20]
+                                     [--output results.json]
+
+Captures are synthetic rows rather than parsed HARs, so the benchmark only measures the index. Each capture has
+--rows distinct observations, a --shared fraction of them drawn from a pool common to every site (the identifiers
+the index exists to find), the rest unique to the capture. On top of those, --everywhere values are sent with every
+request of every capture, like User-Agent and Accept strings.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harryparser.index import CaptureIndex
+from harryparser.rows import RequestInfo, RowStore
+
+ENTITIES = ("Google LLC", "Facebook, Inc.", "Microsoft Corporation", "Hotjar Ltd", "Segment.io, Inc.")
+NAMES = ("_ga", "_fbp", "uid", "session", "X-Client-Id", "cid", "visitor_id", "anonymousId")
+
+
+def capture_rows(rng, capture, rows, shared, shared_pool, everywhere=()):
+    request_table = [RequestInfo(f"https://site{capture}.example/", 1, f"site{capture}.example", f"site{capture}")]
+    for i, entity in enumerate(ENTITIES, 2):
+        request_table.append(RequestInfo(f"https://{i}.tracker.example/", i, f"tracker{i}.example", entity))
+    data = RowStore("cookies", request_table)
+    for i in range(rows):
+        value = rng.choice(shared_pool) if rng.random() < shared else f"unique-{capture}-{i}"
+        data.append(rng.randrange(len(request_table)), rng.choice(NAMES), value)
+    for value in everywhere:
+        # Sent with every request, so seen with every domain and entity
+        for ref in range(len(request_table)):
+            data.append(ref, "User-Agent", value)
+    return [("Cookies", data)], len(request_table)
+
+
+def timed_query(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return round(best * 1000, 2), len(result)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cross-capture index ingest and query timings")
+    arg_parser.add_argument("--captures", type=int, default=2000, help="Captures indexed")
+    arg_parser.add_argument("--rows", type=int, default=1000, help="Rows per capture")
+    arg_parser.add_argument("--shared", type=float, default=0.2, help="Fraction of rows with a shared value")
+    arg_parser.add_argument("--everywhere", type=int, default=20, help="Values in every capture")
+    arg_parser.add_argument("--output", type=str, default=None, help="Write the JSON results here (default: stdout)")
+    args = arg_parser.parse_args()
+
+    rng = random.Random(0)
+    shared_pool = [f"shared-{rng.getrandbits(64):x}" for _ in range(5000)]
+    everywhere = [f"Mozilla/5.0 (build {i})" for i in range(args.everywhere)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = CaptureIndex(os.path.join(tmp_dir, "index.sqlite"))
+        start = time.perf_counter()
+        for capture in range(args.captures):
+            har_file = os.path.join(tmp_dir, f"{capture}.har")
+            open(har_file, "w").close()
+            component_rows, entries = capture_rows(rng, capture, args.rows, args.shared, shared_pool, everywhere)
+            index.add_capture(har_file, f"site{capture}.example", component_rows, entries)
+        ingest_seconds = time.perf_counter() - start
+        unique_value = next(value for value in component_rows[0][1].values if value.startswith("unique-"))
+        observations = index.conn.execute("SELECT count(*) FROM observations").fetchone()[0]
+
+        queries = {
+            "lookup_shared": lambda: index.lookup(shared_pool[0]),
+            "lookup_unique": lambda: index.lookup(unique_value),
+            "shared_top50": lambda: index.shared(min_sites=2),
+            "shared_by_name": lambda: index.shared(min_sites=2, name="_fbp"),
+            "shared_by_entity": lambda: index.shared(min_sites=10, entity="Hotjar Ltd"),
+        }
+        results = {
+            "captures": args.captures,
+            "observations": observations,
+            "index_mb": round(os.path.getsize(os.path.join(tmp_dir, "index.sqlite")) / (1 << 20), 1),
+            "ingest_seconds": round(ingest_seconds, 2),
+            "ms_per_capture": round(ingest_seconds * 1000 / args.captures, 2),
+            "queries": {name: dict(zip(("ms", "rows"), timed_query(func))) for name, func in queries.items()},
+        }
+        index.close()
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fout:
+            fout.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Throughput of helpers.parse_multipart_form on large multipart uploads, compared with the cgi.FieldStorage path it
+replaced.
+
+    python benchmarks/bench_multipart.py [--fields 200] [--file_size 5000000] [--repeat 3]
+
+Each body mixes small text fields, a JSON field and one binary file upload, the way a form with an attachment
+shows up in a HAR. The cgi baseline is skipped on Pythons where the module no longer exists.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+import traceback
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harryparser import helpers
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import cgi
+except ImportError:
+    cgi = None
+
+
+# The multipart parsing as it was before the built-in parser, kept as the "before" baseline
+def legacy_parse_multipart_form(mimeType, text):
+    form = cgi.FieldStorage(
+        fp=io.BytesIO(text.encode()),
+        environ={
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': mimeType,
+        },
+        keep_blank_values=True
+    )
+    data = {}
+    for field in form.keys():
+        v = form[field].value
+        if isinstance(v, bytes):
+            # cgi hands file uploads back as bytes, which the old code would choke on, leave them out here
+            continue
+        if "{" in v:
+            try:
+                v = json.loads(form[field].value)
+            except:
+                pass
+        data[field] = v
+    try:
+        return helpers.flatten_dict(data)
+    except:
+        traceback.print_exc()
+
+
+def build_body(fields, file_size, seed=0):
+    rng = random.Random(seed)
+    boundary = f"----WebKitFormBoundary{rng.getrandbits(64):016x}"
+    parts = []
+    for i in range(fields):
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="field_{i}"\r\n\r\n'
+                     f'value-{rng.getrandbits(48):012x}\r\n')
+    payload = json.dumps({"event": "upload", "meta": {"fields": fields, "client": {"id": rng.getrandbits(32)}}})
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="json"\r\n\r\n{payload}\r\n')
+    # HAR exports carry binary uploads as text, one character per byte
+    blob = bytes(rng.getrandbits(8) for _ in range(file_size)).decode("latin-1").replace(f"--{boundary}", "")
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="upload"; filename="capture.bin"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n{blob}\r\n')
+    return f"multipart/form-data; boundary={boundary}", "".join(parts) + f"--{boundary}--\r\n"
+
+
+def measure(func, mime_type, body, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(mime_type, body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Multipart parsing throughput, before and after")
+    arg_parser.add_argument("--fields", type=int, default=200, help="Text fields in the body")
+    arg_parser.add_argument("--file_size", type=int, default=5000000, help="Size of the uploaded file, in bytes")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Rounds, the best one is reported")
+    args = arg_parser.parse_args()
+
+    mime_type, body = build_body(args.fields, args.file_size)
+    body_mb = len(body.encode()) / (1 << 20)
+    after_time, after = measure(helpers.parse_multipart_form, mime_type, body, args.repeat)
+    results = {
+        "fields": args.fields,
+        "body_mb": round(body_mb, 2),
+        "after_seconds": round(after_time, 4),
+        "after_mb_per_sec": round(body_mb / after_time, 1),
+    }
+    if cgi is not None:
+        before_time, before = measure(legacy_parse_multipart_form, mime_type, body, args.repeat)
+        results.update({
+            "before_seconds": round(before_time, 4),
+            "before_mb_per_sec": round(body_mb / before_time, 1),
+            "speedup": round(before_time / after_time, 1),
+            "same_fields": before == after,
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Time each phase of a parse on a synthetic HAR and write the results as JSON, to track regressions across commits.
+
+    python benchmarks/bench_phases.py [--entries 5000] [--headers 12] [--cookies 6]
+                                      [--post_mix json=2,multipart=1,code=1,none=6] [--subdomains 20]
+                                      [--format xlsx] [--stream] [--repeat 3] [--output results.json]
+
+Phases:
+    load              reading and decoding the entries (HarParser.iter_entries)
+    extract_entries   the extraction loop over the loaded entries, analysis included
+    analyze_string    analyze_string alone over every extracted value, cache cleared first
+    flatten_dict      flatten_dict alone over every decoded JSON post body
+    output            writing the rows with create_workbook (no DNS checks)
+
+Each phase is run --repeat times on a fresh parser and the best time is kept.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harryparser import helpers
+from harryparser.harryparser import HarParser
+from harryparser.outputs import OUTPUT_FORMATS
+from harryparser.tds import TdsIndex
+
+from synthetic_har import PARENT_DOMAIN, add_generator_arguments, generator_params, write_har
+
+TDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "harryparser", "tds.json")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run_once(har_file, output_file, output_format, stream, tds_index):
+    """One full pass, returns {phase: (seconds, items)}"""
+    h = HarParser(har_file, output_file, PARENT_DOMAIN, TDS_FILE, check_dns=False, stream=stream,
+                  output_format=output_format, tds_index=tds_index)
+    helpers._classify_cached.cache_clear()
+    phases = {}
+
+    seconds, entries = timed(lambda: list(h.iter_entries()))
+    phases["load"] = (seconds, len(entries))
+
+    def extract():
+        for request_id, entry in enumerate(entries, 1):
+            h.extract_entry(entry, request_id)
+    seconds, _ = timed(extract)
+    phases["extract_entries"] = (seconds, len(entries))
+
+    values = [value for _, data in h.component_rows() for name, value in zip(data.names, data.values)
+              if not (type(name) == str and name.startswith("!_analyzed_"))]
+    helpers._classify_cached.cache_clear()
+    seconds, _ = timed(lambda: [helpers.analyze_string(value) for value in values])
+    phases["analyze_string"] = (seconds, len(values))
+
+    bodies = []
+    for entry in entries:
+        text = (entry["request"].get("postData") or {}).get("text") or ""
+        if text.startswith("{") or text.startswith("["):
+            body = json.loads(text)
+            bodies.append(body[0] if type(body) == list else body)
+    seconds, _ = timed(lambda: [helpers.flatten_dict(body) for body in bodies])
+    phases["flatten_dict"] = (seconds, len(bodies))
+
+    rows = sum(len(data) for _, data in h.component_rows())
+    seconds, _ = timed(h.create_workbook)
+    phases["output"] = (seconds, rows)
+    return phases
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Per-phase timings of a parse on a synthetic HAR")
+    add_generator_arguments(arg_parser)
+    arg_parser.add_argument("-f", "--format", type=str, default="xlsx", choices=list(OUTPUT_FORMATS),
+                            help="Output format timed in the output phase (default: xlsx)")
+    arg_parser.add_argument("-s", "--stream", action="store_true", default=False, help="Load with the stream reader")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Rounds, the best one is reported")
+    arg_parser.add_argument("--output", type=str, default=None, help="Write the JSON results here (default: stdout)")
+    args = arg_parser.parse_args()
+
+    params = generator_params(args)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        har_file = write_har(os.path.join(tmp_dir, "synthetic.har"), **params)
+        har_size = os.path.getsize(har_file)
+        # Loaded once up front, the TDS index isn't part of any phase
+        tds_index = TdsIndex.load(TDS_FILE)
+        best = {}
+        for i in range(args.repeat):
+            output_file = os.path.join(tmp_dir, f"out_{i}.{OUTPUT_FORMATS[args.format].extension}")
+            for phase, (seconds, items) in run_once(har_file, output_file, args.format, args.stream,
+                                                      tds_index).items():
+                if phase not in best or seconds < best[phase][0]:
+                    best[phase] = (seconds, items)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        # Without lxml openpyxl falls back to a much slower XML writer, which dominates the xlsx output phase
+        "openpyxl_lxml": openpyxl.LXML,
+        "params": params,
+        "har_mb": round(har_size / (1 << 20), 2),
+        "format": args.format,
+        "stream": args.stream,
+        "repeat": args.repeat,
+        "phases": {phase: {"seconds": round(seconds, 4), "items": items,
+                           "items_per_sec": round(items / seconds) if seconds else None}
+                   for phase, (seconds, items) in best.items()},
+    }
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fout:
+            fout.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
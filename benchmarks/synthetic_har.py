@@ -0,0 +1,175 @@
+"""
+Deterministic synthetic HAR files for benchmarking.
+
+    python benchmarks/synthetic_har.py out.har [--entries 5000] [--headers 12] [--cookies 6]
+                                               [--post_mix json=2,multipart=1,code=1,none=6] [--subdomains 20]
+
+The same parameters and seed always produce the same file. Values are drawn from a pool so they repeat across
+requests the way real headers and cookies do, and the pool mixes hashes, base64, epochs, dates and plain tokens
+so every analyze_string stage gets work.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+
+PARENT_DOMAIN = "example.com"
+# Third parties present in tds.json, so entity lookups hit as well as miss
+THIRD_PARTIES = ("www.google-analytics.com", "stats.g.doubleclick.net", "connect.facebook.net", "bat.bing.com",
+                 "cdn.segment.com", "api.mixpanel.com", "static.hotjar.com", "cdn77.org")
+POST_KINDS = ("json", "multipart", "code", "none")
+DEFAULT_POST_MIX = {"json": 2, "multipart": 1, "code": 1, "none": 6}
+
+
+def parse_post_mix(spec):
+    """`json=2,multipart=1` -> {"json": 2.0, "multipart": 1.0}, kinds left out get no weight"""
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in POST_KINDS:
+            raise ValueError(f"Unknown post body kind '{kind}', expected one of {', '.join(POST_KINDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def value_pool(rng, size):
+    pool = []
+    for i in range(size):
+        token = hashlib.sha256(f"{rng.random()}-{i}".encode()).hexdigest()
+        kind = i % 6
+        if kind == 0:
+            pool.append(token[:32])
+        elif kind == 1:
+            pool.append(base64.b64encode(token.encode()[:rng.randint(6, 40)]).decode())
+        elif kind == 2:
+            pool.append(str(rng.randint(1500000000, 1700000000) * (1000 if rng.random() < 0.5 else 1)))
+        elif kind == 3:
+            pool.append(f"2023-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T10:{rng.randint(10, 59)}:00Z")
+        elif kind == 4:
+            pool.append(f"GA1.2.{rng.randint(10 ** 8, 10 ** 9)}.{rng.randint(10 ** 9, 2 * 10 ** 9)}")
+        else:
+            pool.append(f"session-{token[:rng.randint(6, 24)]}")
+    return pool
+
+
+class HarGenerator:
+    def __init__(self, headers=12, cookies=6, post_mix=None, subdomains=20, seed=0, pool_size=2000):
+        self.rng = random.Random(seed)
+        self.headers = headers
+        self.cookies = cookies
+        mix = DEFAULT_POST_MIX if post_mix is None else post_mix
+        self.post_kinds = [kind for kind in POST_KINDS if mix.get(kind)]
+        self.post_weights = [mix[kind] for kind in self.post_kinds]
+        self.hosts = [f"sub{i}.{PARENT_DOMAIN}" for i in range(subdomains)] + [f"www.{PARENT_DOMAIN}"]
+        self.pool = value_pool(self.rng, pool_size)
+        self.header_names = ["User-Agent", "Accept", "Accept-Language", "Referer", "X-Request-Id", "X-Client-Ts",
+                             "Sec-Fetch-Site", "Sec-Fetch-Mode", "X-Signature", "X-Session"]
+        self.header_names += [f"X-Custom-{i}" for i in range(max(0, headers - len(self.header_names)))]
+        self.cookie_names = ["_ga", "_gid", "_fbp", "sessionid", "csrftoken", "ajs_anonymous_id"]
+        self.cookie_names += [f"c{i}" for i in range(max(0, cookies - len(self.cookie_names)))]
+
+    def value(self):
+        return self.rng.choice(self.pool)
+
+    def url(self):
+        host = self.rng.choice(THIRD_PARTIES) if self.rng.random() < 0.4 else self.rng.choice(self.hosts)
+        return f"https://{host}/collect/{self.rng.randint(0, 99)}?v=1&cid={self.value()}"
+
+    def json_body(self):
+        # Analytics beacons: nested events, lists of objects and a JSON document embedded in a string
+        events = [{"name": f"event_{self.rng.randint(0, 20)}", "ts": self.value(),
+                   "params": {"page": {"id": self.value(), "ref": self.value()}, "n": self.rng.randint(0, 1000)}}
+                  for _ in range(self.rng.randint(1, 4))]
+        body = {"client_id": self.value(), "events": events, "context": json.dumps({"ua": self.value(),
+                                                                                  "screen": {"w": 1920, "h": 1080}})}
+        return "application/json", json.dumps([body] if self.rng.random() < 0.2 else body)
+
+    def multipart_body(self):
+        boundary = f"----WebKitFormBoundary{self.rng.getrandbits(64):016x}"
+        parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="f{i}"\r\n\r\n{self.value()}\r\n'
+                 for i in range(self.rng.randint(2, 8))]
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="payload"\r\n\r\n'
+                     f'{json.dumps({"id": self.value(), "meta": {"ts": self.value()}})}\r\n')
+        return f"multipart/form-data; boundary={boundary}", "".join(parts) + f"--{boundary}--\r\n"
+
+    def code_body(self):
+        # The `$key=value` arguments some tracking snippets post as text/plain
+        keys = ("id", "ts", "sig", "v")[:self.rng.randint(1, 4)]
+        return "text/plain", "".join(f"${k}={self.value()}" for k in keys)
+
+    def post_data(self, kind):
+        if kind == "json":
+            mime_type, text = self.json_body()
+        elif kind == "multipart":
+            mime_type, text = self.multipart_body()
+        else:
+            mime_type, text = self.code_body()
+        return {"mimeType": mime_type, "text": text}
+
+    def entry(self):
+        kind = self.rng.choices(self.post_kinds, self.post_weights)[0] if self.post_kinds else "none"
+        url = self.url()
+        request = {
+            "method": "GET" if kind == "none" else "POST",
+            "url": url,
+            "httpVersion": "HTTP/2",
+            "headers": [{"name": name, "value": self.value()} for name in self.header_names[:self.headers]],
+            "cookies": [{"name": name, "value": self.value()} for name in self.cookie_names[:self.cookies]],
+            "queryString": [{"name": "v", "value": "1"}, {"name": "cid", "value": url.rsplit("=", 1)[1]}],
+            "headersSize": -1,
+            "bodySize": 0,
+        }
+        if kind != "none":
+            request["postData"] = self.post_data(kind)
+        return {
+            "startedDateTime": "2023-05-01T10:00:00.000Z",
+            "time": self.rng.randint(5, 500),
+            "request": request,
+            "response": {"status": 200, "statusText": "OK", "httpVersion": "HTTP/2",
+                         "headers": [{"name": "Content-Type", "value": "application/json"}],
+                         "cookies": [], "content": {"size": 2, "mimeType": "application/json", "text": "{}"},
+                         "redirectURL": "", "headersSize": -1, "bodySize": 2},
+            "cache": {},
+            "timings": {"send": 0, "wait": 10, "receive": 1},
+        }
+
+
+def generate_har(entries=5000, headers=12, cookies=6, post_mix=None, subdomains=20, seed=0):
+    generator = HarGenerator(headers, cookies, post_mix, subdomains, seed)
+    return {"log": {"version": "1.2", "creator": {"name": "harryparser-benchmark", "version": "1"},
+                    "pages": [], "entries": [generator.entry() for _ in range(entries)]}}
+
+
+def write_har(path, **params):
+    with open(path, "w", encoding="utf-8") as fout:
+        json.dump(generate_har(**params), fout)
+    return path
+
+
+def add_generator_arguments(arg_parser):
+    arg_parser.add_argument("--entries", type=int, default=5000, help="Requests in the HAR")
+    arg_parser.add_argument("--headers", type=int, default=12, help="Headers per request")
+    arg_parser.add_argument("--cookies", type=int, default=6, help="Cookies per request")
+    arg_parser.add_argument("--post_mix", type=parse_post_mix, default=DEFAULT_POST_MIX,
+                            help="Relative weights of post bodies, e.g. json=2,multipart=1,code=1,none=6")
+    arg_parser.add_argument("--subdomains", type=int, default=20, help="Distinct subdomains of the parent domain")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def generator_params(args):
+    return {"entries": args.entries, "headers": args.headers, "cookies": args.cookies, "post_mix": args.post_mix,
+            "subdomains": args.subdomains, "seed": args.seed}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Write a deterministic synthetic HAR file")
+    arg_parser.add_argument("output", help="HAR file to write")
+    add_generator_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    write_har(args.output, **generator_params(args))
+
+
+if __name__ == "__main__":
+    main()
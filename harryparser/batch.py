@@ -0,0 +1,131 @@
+import glob
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .harryparser import HarParser
+    from .tds import TdsIndex
+    from .logger import logger
+    from .outputs import COLUMNS, get_sink
+    from .stats import Stats
+    from .index import CaptureIndex
+except:
+    from harryparser import HarParser
+    from tds import TdsIndex
+    from logger import logger
+    from outputs import COLUMNS, get_sink
+    from stats import Stats
+    from index import CaptureIndex
+
+# Batch output has one extra column so rows (and their request_ids) can be traced back to their capture
+BATCH_COLUMNS = COLUMNS + ["har_file"]
+
+# Files queued per worker. Results are merged in input order, so this bounds how many parsed files wait in memory
+# behind a slow one.
+FILES_IN_FLIGHT = 2
+
+# Per-process state, filled once by _init_worker and reused for every file that worker parses
+_worker_state = {}
+
+
+def expand_har_paths(paths):
+    """Expand directories (their *.har files) and glob patterns into a de-duplicated, ordered list of files"""
+    har_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            har_files.extend(sorted(glob.glob(os.path.join(path, "*.har"))))
+        elif any(c in path for c in "*?["):
+            har_files.extend(sorted(glob.glob(path, recursive=True)))
+        else:
+            har_files.append(path)
+    return list(dict.fromkeys(har_files))
+
+
+def _init_worker(tds_file):
+    _worker_state["tds_index"] = TdsIndex.load(tds_file)
+
+
+def _parse_har_file(har_file, parent_domain, tds_file, stream, stats_options, parser_options):
+    # stats_options is None unless the caller asked for stats, detailed timings have a cost
+    stats = Stats(**stats_options) if stats_options is not None else None
+    h = HarParser(har_file, None, parent_domain, tds_file, check_dns=False, stream=stream,
+                  tds_index=_worker_state.get("tds_index"), stats=stats, **parser_options)
+    h.extract()
+    return list(h.component_rows()), h.subdomains, h.stats.report(), h.extraction_fingerprint()
+
+
+def run_batch(har_files, output_file, parent_domain, tds_file="tds.json", check_dns=True, stream=False,
+              output_format="xlsx", workers=None, stats=None, index_file=None, **parser_options):
+    """
+    Parse many HAR files across a process pool and merge them into a single output, in the order given.
+    A file that fails to parse is logged and left out, the rest of the batch still completes.
+    Any other keyword arguments are passed on to every HarParser.
+    Worker stats are merged into stats, so extraction phases add up the time spent across all workers.
+    With index_file, each file is added to that cross-capture index as its own capture.
+    """
+    stats_options = {"trace_memory": stats.trace_memory} if stats is not None else None
+    if stats is None:
+        stats = Stats()
+    # A TDS file the workers can't load would only surface as a BrokenProcessPool, after the output was created.
+    # Loading it here reports the actual error up front and leaves the workers a warm TDS cache.
+    with stats.phase("tds_load"):
+        TdsIndex.load(tds_file)
+    workers = workers or os.cpu_count()
+    # Subdomains are scanned in the background as each file comes in, de-duplicated across files by the scanner
+    scanner = None
+    if check_dns:
+        # dnspython and httpx are slow to import, they are only loaded when DNS checks are on
+        try:
+            from .dns_helper import SubdomainScanner
+        except:
+            from dns_helper import SubdomainScanner
+        scanner = SubdomainScanner([], stats=stats)
+        scanner.start()
+    # Written from this process only, the workers just extract
+    index = CaptureIndex(index_file) if index_file else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tds_file,)) as executor, \
+                get_sink(output_format, output_file, BATCH_COLUMNS) as sink:
+            pending = deque()
+
+            def merge_oldest():
+                har_file, future = pending.popleft()
+                try:
+                    components, file_subdomains, file_stats, options = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to parse {har_file}: {e}")
+                    stats.count("files_failed")
+                    return
+                logger.info(f"Parsed {har_file}")
+                stats.merge(file_stats)
+                stats.count("files")
+                with stats.phase("output"):
+                    for sheet_name, data in components:
+                        sink.write_rows(sheet_name, (row + [har_file] for row in data))
+                if index:
+                    with stats.phase("index"):
+                        index.add_capture(har_file, parent_domain, components,
+                                          len(components[0][1].request_table) if components else 0, options)
+                if scanner:
+                    for subdomain in file_subdomains:
+                        scanner.add(subdomain)
+
+            for har_file in har_files:
+                pending.append((har_file, executor.submit(_parse_har_file, har_file, parent_domain, tds_file, stream,
+                                                          stats_options, parser_options)))
+                if len(pending) >= workers * FILES_IN_FLIGHT:
+                    merge_oldest()
+            while pending:
+                merge_oldest()
+
+            if scanner:
+                scanner.finish()
+                with stats.phase("output"):
+                    sink.write_dns_rows(scanner.result_rows())
+    finally:
+        if scanner:
+            # No-op once finished, otherwise the batch failed and the scan is abandoned
+            scanner.finish(cancel=True)
+        if index:
+            index.close()
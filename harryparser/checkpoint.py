@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+
+try:
+    from .logger import logger
+    from .rows import RequestInfo, intern_name
+except:
+    from logger import logger
+    from rows import RequestInfo, intern_name
+
+# Bump whenever extraction changes in a way that makes stored rows stale
+CHECKPOINT_VERSION = 2
+# Bytes hashed at each end of the already processed prefix
+PREFIX_SAMPLE_SIZE = 1 << 16
+
+
+def prefix_digest(har_file, offset):
+    """
+    Hash of the first `offset` bytes of the file, sampled at both ends so checking it stays cheap on huge files.
+    Appending entries only ever rewrites what comes after the last complete entry, which this doesn't cover.
+    """
+    sha = hashlib.sha256(str(offset).encode())
+    with open(har_file, "rb") as fin:
+        sha.update(fin.read(min(offset, PREFIX_SAMPLE_SIZE)))
+        tail_start = max(offset - PREFIX_SAMPLE_SIZE, PREFIX_SAMPLE_SIZE)
+        if tail_start < offset:
+            fin.seek(tail_start)
+            sha.update(fin.read(offset - tail_start))
+    return sha.hexdigest()
+
+
+def encode_segment(segment):
+    """One JSON line for a segment from HarParser.segment_since()"""
+    request_table, stores, subdomains = segment
+    requests = [[request.url, request.request_id, request.domain, request.entity] for request in request_table]
+    columns = [[list(refs), names, values] for refs, names, values in stores]
+    # Row values come from JSON, anything else is stored the way the outputs write it
+    return json.dumps([requests, columns, subdomains], default=str).encode("ascii") + b"\n"
+
+
+def decode_segment(line):
+    requests, columns, subdomains = json.loads(line)
+    return ([RequestInfo(*request) for request in requests],
+            [(refs, [intern_name(name) for name in names], values) for refs, names, values in columns],
+            subdomains)
+
+
+class Checkpoint:
+    """
+    Remembers how far into a HAR file extraction got, and the rows extracted so far.
+
+    Two files live next to the HAR (or in checkpoint_dir): `<har>.checkpoint` is a small JSON document with the
+    entry count, the byte offset just past the last processed entry, a hash of that prefix and a fingerprint of
+    the extraction options. `<har>.rows` holds the rows as JSON lines, one segment appended per run, so each run
+    only writes what it added. Plain data only, a checkpoint directory someone else can write to can't run code.
+    """
+
+    def __init__(self, har_file, fingerprint, checkpoint_dir=None):
+        self.har_file = har_file
+        self.fingerprint = fingerprint
+        base = os.path.basename(har_file)
+        directory = checkpoint_dir or os.path.dirname(os.path.abspath(har_file))
+        self.checkpoint_file = os.path.join(directory, f"{base}.checkpoint")
+        self.rows_file = os.path.join(directory, f"{base}.rows")
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_file, "r") as fin:
+                state = json.load(fin)
+        except (OSError, ValueError):
+            return None
+        if state.get("version") != CHECKPOINT_VERSION or state.get("fingerprint") != self.fingerprint:
+            logger.info("Extraction options changed since the last checkpoint, parsing from the start")
+            return None
+        offset = state["offset"]
+        if os.path.getsize(self.har_file) < offset or prefix_digest(self.har_file, offset) != state["prefix_hash"]:
+            logger.info("HAR file changed before the last checkpoint, parsing from the start")
+            return None
+        return state
+
+    def load(self, parser):
+        """
+        Restore the stored rows into parser and return (entry_count, offset) to resume from.
+        Returns (0, 0) and clears the stored rows when there is no usable checkpoint.
+        """
+        state = self._read_checkpoint()
+        if state is None:
+            self.reset()
+            return 0, 0
+
+        try:
+            with open(self.rows_file, "r+b") as fin:
+                # A run that died after appending its segment but before saving the checkpoint left extra bytes
+                fin.truncate(state["rows_size"])
+                while fin.tell() < state["rows_size"]:
+                    parser.add_segment(decode_segment(fin.readline()))
+        except (OSError, ValueError, TypeError) as e:
+            raise ValueError(f"Stored rows for {self.har_file} are unreadable, delete {self.checkpoint_file}") from e
+        logger.info(f"Resuming {self.har_file} after {state['entry_count']} entries")
+        return state["entry_count"], state["offset"]
+
+    def save(self, parser, mark, entry_count, offset):
+        """Append the rows parser extracted since mark (from parser.mark()) and record the new position"""
+        segment = parser.segment_since(mark)
+        os.makedirs(os.path.dirname(self.rows_file), exist_ok=True)
+        with open(self.rows_file, "ab") as fout:
+            fout.write(encode_segment(segment))
+            rows_size = fout.tell()
+
+        state = {"version": CHECKPOINT_VERSION, "fingerprint": self.fingerprint, "entry_count": entry_count,
+                 "offset": offset, "prefix_hash": prefix_digest(self.har_file, offset), "rows_size": rows_size}
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, "w") as fout:
+            json.dump(state, fout)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def reset(self):
+        for path in (self.checkpoint_file, self.rows_file):
+            if os.path.exists(path):
+                os.remove(path)
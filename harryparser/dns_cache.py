@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import time
+
+try:
+    from .logger import logger
+except:
+    from logger import logger
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "harryparser", "dns_cache.sqlite")
+# How long a "no such name"/"no answer" result or a failed HTTP probe is trusted
+NEGATIVE_TTL = 300
+# Redirects carry no TTL of their own, they are re-checked daily
+REDIRECT_TTL = 24 * 60 * 60
+# Seconds to wait for another scan's write to finish, writes are a single short transaction
+LOCK_TIMEOUT = 5
+
+
+class DnsCache:
+    """
+    On-disk cache of DNS answers and redirect probes, shared across runs.
+
+    Entries are keyed on (name, record type, nameserver) and expire with the TTL of the record they came from.
+    Values are stored as JSON. Writes are buffered and committed in flush(), in one short transaction per scan, so
+    concurrent scans on the same file (other runs, other service workers) never wait on each other for long. A
+    cache that can't be read or written only costs misses, lookups go live instead.
+    """
+
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE):
+        self.cache_file = cache_file
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        # Autocommit, reads never leave a transaction open
+        self.conn = sqlite3.connect(cache_file, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dns_cache (name TEXT, record_type TEXT, nameserver TEXT, "
+                          "value TEXT, expires REAL, PRIMARY KEY (name, record_type, nameserver))")
+        try:
+            self.conn.execute("DELETE FROM dns_cache WHERE expires < ?", (time.time(),))
+        except sqlite3.OperationalError as e:
+            # Expired entries are ignored by get() anyway, pruning can wait for the next run
+            logger.debug(f"DNS cache not pruned: {e}")
+        # (name, record_type, nameserver) -> (value, expires) not written yet
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, cache_file):
+        """DnsCache on cache_file, or None when it can't be opened (read-only or missing home directory...)"""
+        try:
+            return cls(cache_file)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"DNS cache {cache_file} unavailable, querying live: {e}")
+            return None
+
+    def get(self, name, record_type, nameserver=""):
+        """Return (True, value) for a live entry, (False, None) otherwise"""
+        row = self.pending.get((name, record_type, nameserver))
+        if row is None:
+            try:
+                row = self.conn.execute("SELECT value, expires FROM dns_cache WHERE name = ? AND record_type = ? "
+                                        "AND nameserver = ?", (name, record_type, nameserver)).fetchone()
+            except sqlite3.Error as e:
+                logger.debug(f"DNS cache read failed: {e}")
+        if row is None or row[1] < time.time():
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, json.loads(row[0])
+
+    def set(self, name, record_type, nameserver, value, ttl):
+        self.pending[(name, record_type, nameserver)] = (json.dumps(value), time.time() + ttl)
+
+    def flush(self):
+        if self.pending:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.executemany("INSERT OR REPLACE INTO dns_cache VALUES (?, ?, ?, ?, ?)",
+                                          (key + row for key, row in self.pending.items()))
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write DNS cache {self.cache_file}: {e}")
+            self.pending.clear()
+        logger.info(f"DNS cache: {self.hits} hits, {self.misses} misses")
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -1,84 +1,311 @@
+import asyncio
+import contextlib
 import threading
+import time
 
+import dns.asyncresolver
+import dns.exception
+import dns.rdatatype
 import dns.resolver
-import requests
+import httpx
 
-from logger import logger
+try:
+    from .logger import logger
+    from .dns_cache import DEFAULT_CACHE_FILE, NEGATIVE_TTL, REDIRECT_TTL, DnsCache
+    from .stats import Stats
+except:
+    from logger import logger
+    from dns_cache import DEFAULT_CACHE_FILE, NEGATIVE_TTL, REDIRECT_TTL, DnsCache
+    from stats import Stats
+
+# Upper bound on DNS queries and HTTP requests in flight at once, across all subdomains
+DEFAULT_CONCURRENCY = 64
+# Seconds allowed for a single DNS query (all retries included) or HTTP request
+DEFAULT_TIMEOUT = 5.0
+# Stop following a redirect chain after this many hops, loops would otherwise never end
+MAX_REDIRECTS = 10
+
+# Nameserver hostname -> (ips, expires), shared by every scan in the process since sites share nameservers
+_nameserver_ips = {}
+NAMESERVER_TTL = 300
 
 
 class SubdomainScanner:
-    def __init__(self, subdomains):
-        self.subdomains = subdomains
+    def __init__(self, subdomains, max_concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 cache_file=DEFAULT_CACHE_FILE, stats=None):
+        self.subdomains = list(subdomains)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # Set cache_file to None to always query live
+        self.cache_file = cache_file
+        # dns.query and http.redirect add up the latency of each request, which overlap, not wall time
+        self.stats = stats if stats is not None else Stats()
         self.results = {}
-        self.lock = threading.Lock()
+        self._seen = set(self.subdomains)
+        self._thread = None
 
     def scan_subdomains(self):
-        threads = []
+        with self.stats.phase("dns_scan"):
+            asyncio.run(self.scan_subdomains_async())
+        self.stats.count("subdomains", len(self.subdomains))
+
+    async def scan_subdomains_async(self):
+        async with self._session():
+            outputs = await asyncio.gather(*(self._scan_subdomain(subdomain) for subdomain in self.subdomains))
+        # Keep the subdomains in the order they were found rather than the order they finished
+        self.results.update(zip(self.subdomains, outputs))
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._resolver = dns.asyncresolver.Resolver()
+        self._nameserver_tasks = {}
+        self._cache = DnsCache.open(self.cache_file) if self.cache_file else None
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+        try:
+            async with httpx.AsyncClient(follow_redirects=False, timeout=self.timeout, limits=limits) as client:
+                self._client = client
+                yield
+        finally:
+            if self._cache:
+                self._cache.close()
+
+    def start(self):
+        """
+        Scan in a background thread, so DNS runs while the HAR is still being parsed.
+        Subdomains are fed with add() as they are found and finish() waits for the last of them.
+        """
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run_background, name="dns-scan", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def add(self, subdomain):
+        if subdomain in self._seen:
+            return
+        self._seen.add(subdomain)
+        self.subdomains.append(subdomain)
+        if self._thread is not None:
+            # A scan that died is reported by finish(), extraction goes on
+            self._call_soon(self._queue.put_nowait, subdomain)
+
+    def finish(self, cancel=False):
+        """Wait for every subdomain added so far to be scanned, or with cancel stop right away"""
+        if self._thread is None:
+            return
+        start = time.perf_counter()
+        if cancel:
+            self._call_soon(self._main_task.cancel)
+        else:
+            self._call_soon(self._queue.put_nowait, None)
+        self._thread.join()
+        self._thread = None
+        # Only the part of the scan that didn't overlap with anything else
+        self.stats.add("dns_wait", time.perf_counter() - start)
+        self.stats.count("subdomains", len(self.subdomains))
+        if self._error is not None and not cancel:
+            raise self._error
+
+    def _call_soon(self, callback, *args):
+        """Run callback on the scan's loop, unless the loop has already stopped"""
+        if self._error is not None or not self._thread.is_alive():
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop closed in the meantime, _error says why
+            pass
+
+    def _run_background(self):
+        start = time.perf_counter()
+        try:
+            asyncio.run(self._scan_queue())
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            self._error = e
+        finally:
+            # Also unblocks start() if the loop failed to come up
+            self._ready.set()
+            self.stats.add("dns_scan", time.perf_counter() - start)
+
+    async def _scan_queue(self):
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        self._queue = asyncio.Queue()
+        # Anything added before the loop was up is already in self.subdomains
         for subdomain in self.subdomains:
-            thread = threading.Thread(target=self._scan_subdomain, args=(subdomain,))
-            threads.append(thread)
-            thread.start()
+            self._queue.put_nowait(subdomain)
+        self._ready.set()
+
+        async with self._session():
+            tasks = {}
+            while True:
+                subdomain = await self._queue.get()
+                if subdomain is None:
+                    break
+                tasks[subdomain] = asyncio.ensure_future(self._scan_subdomain(subdomain))
+            outputs = await asyncio.gather(*tasks.values())
+        self.results.update(zip(tasks, outputs))
+
+    def result_rows(self):
+        """Flatten the results into rows ordered like outputs.DNS_COLUMNS"""
+        rows = []
+
+        # Iterate over each subdomain and record type in the data dictionary
+        for subdomain, record_types in self.results.items():
+            for record_type, record_data in record_types.items():
+                # Handle empty record types
+                if not record_data:
+                    rows.append({'Subdomain': subdomain, 'Record Type': record_type})
+                    continue
+                for ip_address, ip_data in record_data.items():
+                    # Handle empty IP addresses
+                    if not ip_data:
+                        rows.append({'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address})
+                        continue
+                    for key, value in ip_data.items():
+                        # Handle empty key-value pairs
+                        if not value:
+                            rows.append(
+                                {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
+                                 'Key': key})
+                            continue
+                        # Handle multiple redirects
+                        if key == 'redirects':
+                            for redirect in value:
+                                rows.append(
+                                    {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
+                                     'Source IP': redirect[0], 'Target URL': redirect[1]})
+                        # Handle multiple A records
+                        elif key == 'a_records':
+                            # Get resolved_ips for Source IP field
+                            resolved_ips = ', '.join(ip_data.get('resolved_ips', []))
+                            for item in value:
+                                rows.append(
+                                    {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
+                                     'Key': key.capitalize(), 'Value': item, 'Source IP': resolved_ips})
+                        # Handle resolved IPs for NS records
+                        elif key == 'resolved_ips':
+                            # Skip resolved_ips rows
+                            continue
 
-        # Wait for all threads to finish
-        for thread in threads:
-            thread.join()
+        columns = ['Subdomain', 'Record Type', 'IP Address', 'Key', 'Value', 'Source IP', 'Target URL']
+        return [[row.get(column, '') for column in columns] for row in rows]
 
-    def _scan_subdomain(self, subdomain):
+    async def _scan_subdomain(self, subdomain):
         logger.info(f'Scanning subdomain: {subdomain}')
-        output = self._check_domain(subdomain)
-        # Add result to shared dictionary
-        with self.lock:
-            self.results[subdomain] = output
-
-    def _query_dns_records(self, domain):
-        records = {'A': [], 'CNAME': [], 'NS': []}
-        for record_type in records.keys():
+        return await self._check_domain(subdomain)
+
+    async def _resolve(self, resolver, name, record_type):
+        async with self._semaphore:
+            start = time.perf_counter()
             try:
-                answers = dns.resolver.resolve(domain, record_type)
-                for answer in answers:
-                    target_or_address = answer.address if record_type == 'A' else answer.target
-                    if record_type in ['NS', 'CNAME']:
-                        target_or_address = str(target_or_address).rstrip('. ')
-                    records[record_type].append(str(target_or_address))
-            except dns.resolver.NoNameservers as e:
-                logger.error(e)
-            except dns.resolver.NoAnswer as e:
-                logger.error(e)
-        return records
-
-    def _record_redirects(self, domain):
-        try:
-            response = requests.get(f'http://{domain}', allow_redirects=False)
-            if response.status_code in (301, 302):
-                return response.headers['Location']
-        except requests.exceptions.RequestException:
-            pass
-        return None
+                return await resolver.resolve(name, record_type, lifetime=self.timeout)
+            finally:
+                self.stats.add("dns.query", time.perf_counter() - start)
+                self.stats.count(f"dns.queries.{record_type}")
+
+    async def _lookup(self, name, record_type, resolver=None):
+        """Resolve name to a list of strings (addresses or targets), through the persistent cache"""
+        resolver = resolver or self._resolver
+        nameserver = ",".join(str(ns) for ns in resolver.nameservers)
+        if self._cache:
+            hit, values = self._cache.get(name, record_type, nameserver)
+            if hit:
+                self.stats.count("dns.cache_hits")
+                return values
 
-    def _resolve_dns(self, nameserver, domain):
-        my_resolver = dns.resolver.Resolver()
-        resolution_object = {}
         try:
-            ips = my_resolver.resolve(nameserver, 'A')
-            my_resolver.nameservers = [str(ip) for ip in ips]
-            resolution_object["resolved_ips"] = my_resolver.nameservers
-        except dns.resolver.NXDOMAIN:
-            raise ValueError(f"Invalid nameserver: {nameserver}")
+            answers = await self._resolve(resolver, name, record_type)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+            logger.error(e)
+            if self._cache:
+                self._cache.set(name, record_type, nameserver, [], NEGATIVE_TTL)
+            return []
+        except dns.exception.DNSException as e:
+            # Timeouts and server failures are transient, they are never cached
+            logger.error(e)
+            return []
+
+        if record_type == 'A':
+            values = [rdata.address for rdata in answers if rdata.rdtype == dns.rdatatype.A]
+        else:
+            values = [str(rdata.target).rstrip('. ') for rdata in answers]
+        if self._cache:
+            self._cache.set(name, record_type, nameserver, values, max(answers.expiration - time.time(), 0))
+        return values
+
+    async def _query_dns_records(self, domain):
+        record_types = ['A', 'CNAME', 'NS']
+        values = await asyncio.gather(*(self._lookup(domain, record_type) for record_type in record_types))
+        return dict(zip(record_types, values))
+
+    async def _record_redirects(self, domain):
+        """Return (location, ok), ok is False when the probe itself failed"""
         try:
-            answer = my_resolver.resolve(domain)
-            resolution_object["a_records"] = [rdata.address for rdata in answer if rdata.rdtype == dns.rdatatype.A]
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    # Only the status line and headers are needed, the body is never read
+                    async with self._client.stream('GET', f'http://{domain}') as response:
+                        if response.status_code in (301, 302):
+                            self.stats.count("http.redirects")
+                            return response.headers.get('Location'), True
+                        return None, True
+                finally:
+                    self.stats.add("http.redirect", time.perf_counter() - start)
+        except (httpx.HTTPError, httpx.InvalidURL, ValueError):
+            # ValueError: hosts httpx can't encode, such as a bad IDNA label in a CNAME or Location
+            self.stats.count("http.failures")
+            return None, False
 
-        except dns.resolver.NoNameservers as e:
-            logger.error(e)
+    async def _cached_redirect(self, domain):
+        if self._cache:
+            hit, location = self._cache.get(domain, 'HTTP')
+            if hit:
+                self.stats.count("http.cache_hits")
+                return location
+        location, ok = await self._record_redirects(domain)
+        if self._cache:
+            self._cache.set(domain, 'HTTP', '', location, REDIRECT_TTL if ok else NEGATIVE_TTL)
+        return location
+
+    async def _get_nameserver_ips(self, nameserver):
+        cached = _nameserver_ips.get(nameserver)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        # Many subdomains share nameservers, concurrent requests for the same one wait on a single lookup
+        task = self._nameserver_tasks.get(nameserver)
+        if task is None:
+            task = self._nameserver_tasks[nameserver] = asyncio.ensure_future(self._lookup(nameserver, 'A'))
+        ips = await task
+        _nameserver_ips[nameserver] = (ips, time.time() + NAMESERVER_TTL)
+        return ips
+
+    async def _resolve_dns(self, nameserver, domain):
+        resolution_object = {}
+        ips = await self._get_nameserver_ips(nameserver)
+        if not ips:
+            logger.error(f"Invalid nameserver: {nameserver}")
+            return resolution_object
+
+        my_resolver = dns.asyncresolver.Resolver(configure=False)
+        my_resolver.nameservers = list(ips)
+        resolution_object["resolved_ips"] = my_resolver.nameservers
+        a_records = await self._lookup(domain, 'A', my_resolver)
+        if a_records:
+            resolution_object["a_records"] = a_records
 
         return resolution_object
 
-    def _get_redirect_chain(self, domain):
+    async def _get_redirect_chain(self, domain):
         redirect_chain = []
         current_domain = domain
 
-        while current_domain:
-            next_domain = self._record_redirects(current_domain)
+        while current_domain and len(redirect_chain) < MAX_REDIRECTS:
+            next_domain = await self._cached_redirect(current_domain)
             if next_domain:
                 redirect_chain.append((current_domain, next_domain))
                 current_domain = next_domain
@@ -87,20 +314,29 @@ class SubdomainScanner:
 
         return redirect_chain
 
-    def _check_domain(self, domain):
-        records = self._query_dns_records(domain)
+    async def _check_value(self, record_type, value, domain):
+        if record_type in ["A", "CNAME"]:
+            redirect_chain = await self._get_redirect_chain(value)
+            return {"redirects": redirect_chain} if redirect_chain else {}
+        if record_type == "NS":
+            return await self._resolve_dns(value, domain)
+        return {}
 
-        output_dict = {}
+    async def _check_domain(self, domain):
+        records = await self._query_dns_records(domain)
 
+        output_dict = {}
+        checks = []
         for record_type, record_values in records.items():
             output_dict[record_type] = {}
             for value in record_values:
                 output_dict[record_type][value] = {}
-                if record_type in ["A", "CNAME"]:
-                    redirect_chain = self._get_redirect_chain(value)
-                    if redirect_chain:
-                        output_dict[record_type][value]["redirects"] = redirect_chain
-                if record_type == "NS":
-                    output_dict[record_type][value] = self._resolve_dns(value, domain)
+                checks.append((record_type, value))
+
+        # Redirect chains and nameserver lookups for every record run concurrently
+        outputs = await asyncio.gather(*(self._check_value(record_type, value, domain)
+                                         for record_type, value in checks))
+        for (record_type, value), output in zip(checks, outputs):
+            output_dict[record_type][value] = output
 
         return output_dict
@@ -0,0 +1,44 @@
+import functools
+import urllib.parse
+
+DEFAULT_CACHE_SIZE = 65536
+
+
+class DomainExtractor:
+    """
+    tldextract wrapper that never touches the network and extracts each distinct host only once.
+
+    The extractor only uses the public suffix list snapshot bundled with tldextract (no fetching, no disk cache),
+    and results are kept in a bounded LRU keyed by the URL's netloc since captures repeat the same hosts constantly.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        import tldextract
+
+        self.extractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+        self._extract_netloc = functools.lru_cache(maxsize=cache_size)(self.extractor)
+
+    def extract(self, url):
+        try:
+            netloc = urllib.parse.urlsplit(url).netloc
+        except ValueError:
+            # Malformed URLs from real captures (http://[::1), tldextract copes with them on its own
+            netloc = None
+        if not netloc:
+            # Nothing to key on (data: URLs and the like), these are rare enough to extract directly
+            return self.extractor(url)
+        return self._extract_netloc(netloc)
+
+    def cache_info(self):
+        return self._extract_netloc.cache_info()
+
+
+_default_extractor = None
+
+
+def default_extractor():
+    """Process wide extractor, so every parser in a process shares one warm cache"""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = DomainExtractor()
+    return _default_extractor
@@ -0,0 +1,84 @@
+import re
+
+# Row sources of the components, in output order. The response ones are only extracted with extract_responses.
+COMPONENTS = ("headers", "cookies", "queryString", "postData", "parsed_postData", "responseHeaders", "setCookies",
+              "responseBody")
+
+
+def _folded(values):
+    return frozenset(value.casefold() for value in values) if values else None
+
+
+class ExtractionFilter:
+    """
+    Which requests and rows HarParser extracts, checked inside the extraction loop so nothing filtered out is
+    parsed, analyzed or stored.
+
+    Requests are kept or dropped on their calculated entity and domain (include lists first, then exclude lists,
+    case-insensitive), third_party drops the parent domain's own requests. A dropped request costs its domain
+    lookup, which is cached, and nothing else. components limits extraction to those row sources, name_pattern
+    keeps rows whose name matches the regex and analyzed_only keeps rows analyze_string found something in.
+    """
+
+    def __init__(self, include_entities=None, exclude_entities=None, include_domains=None, exclude_domains=None,
+                 third_party=False, components=None, name_pattern=None, analyzed_only=False):
+        unknown = set(components or ()) - set(COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown components: {', '.join(sorted(unknown))}, expected some of "
+                             f"{', '.join(COMPONENTS)}")
+        self.include_entities = _folded(include_entities)
+        self.exclude_entities = _folded(exclude_entities)
+        self.include_domains = _folded(include_domains)
+        self.exclude_domains = _folded(exclude_domains)
+        self.third_party = third_party
+        self.components = frozenset(components) if components else None
+        self.name_pattern = name_pattern
+        self.name_re = re.compile(name_pattern) if name_pattern else None
+        self.analyzed_only = analyzed_only
+        # Requests from the same domain and entity always get the same answer
+        self._decisions = {}
+
+    def keeps_rows(self):
+        """Whether rows are filtered by themselves, beyond the request they come from"""
+        return self.name_re is not None or self.analyzed_only
+
+    def keep_component(self, source):
+        return self.components is None or source in self.components
+
+    def keep_request(self, domain, entity, parent_domain):
+        key = (domain, entity)
+        keep = self._decisions.get(key)
+        if keep is None:
+            keep = self._decisions[key] = self._check_request(domain.casefold(), entity.casefold(), parent_domain)
+        return keep
+
+    def _check_request(self, domain, entity, parent_domain):
+        if self.include_entities is not None and entity not in self.include_entities:
+            return False
+        if self.include_domains is not None and domain not in self.include_domains:
+            return False
+        if self.exclude_entities is not None and entity in self.exclude_entities:
+            return False
+        if self.exclude_domains is not None and domain in self.exclude_domains:
+            return False
+        if self.third_party and parent_domain and parent_domain.casefold() in (domain, entity):
+            return False
+        return True
+
+    def keep_name(self, name):
+        return self.name_re is None or self.name_re.search(name if type(name) == str else str(name)) is not None
+
+    def fingerprint(self):
+        """JSON-able summary for checkpoints, rows stored under other filters aren't reused"""
+        return {"include_entities": sorted(self.include_entities or ()),
+                "exclude_entities": sorted(self.exclude_entities or ()),
+                "include_domains": sorted(self.include_domains or ()),
+                "exclude_domains": sorted(self.exclude_domains or ()),
+                "third_party": self.third_party, "components": sorted(self.components or ()),
+                "name_pattern": self.name_pattern, "analyzed_only": self.analyzed_only}
+
+    def __getstate__(self):
+        # The decision cache is rebuilt in each process
+        state = self.__dict__.copy()
+        state["_decisions"] = {}
+        return state
@@ -0,0 +1,200 @@
+import json
+import re
+
+# Structural bytes we have to stop at while skipping over a JSON value. Everything else inside a
+# container can be jumped over with a single regex search, so we never loop over the payload in Python.
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_SCALAR_END = re.compile(rb'[\s,\]}]')
+_NON_WHITESPACE = re.compile(rb'\S')
+
+_QUOTE = ord('"')
+_OPENERS = (ord('{'), ord('['))
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+class JsonStreamReader:
+    """
+    Minimal incremental JSON reader used to pull the entries out of a HAR file one at a time.
+
+    The reader works on raw bytes (all JSON structural characters are ASCII, so scanning UTF-8 bytes is safe)
+    and only ever holds the value it is currently decoding in memory, plus one read chunk.
+    """
+
+    def __init__(self, fp, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = bytearray()
+        self.pos = 0
+        # Absolute file offset of buf[0], so callers can tell where in the file they are
+        self.offset = 0
+        self.eof = False
+
+    @property
+    def tell(self):
+        return self.offset + self.pos
+
+    def _more(self):
+        if self.eof:
+            raise ValueError("Unexpected end of JSON input")
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            raise ValueError("Unexpected end of JSON input")
+        if not self.buf and self.offset == 0 and chunk.startswith(_UTF8_BOM):
+            chunk = chunk[len(_UTF8_BOM):]
+            self.offset = len(_UTF8_BOM)
+        self.buf += chunk
+
+    def _compact(self):
+        # Drop everything that has already been consumed
+        if self.pos:
+            del self.buf[:self.pos]
+            self.offset += self.pos
+            self.pos = 0
+
+    def _peek(self):
+        while True:
+            m = _NON_WHITESPACE.search(self.buf, self.pos)
+            if m:
+                self.pos = m.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            self._compact()
+            self._more()
+
+    def _expect(self, char):
+        c = self._peek()
+        if c != ord(char):
+            raise ValueError(f"Expected '{char}' at offset {self.tell}, found '{chr(c)}'")
+        self.pos += 1
+
+    def _string_end(self, i):
+        # i points just past the opening quote, returns the index just past the closing quote
+        while True:
+            m = _STRING_SPECIAL.search(self.buf, i)
+            if m is None:
+                i = len(self.buf)
+                self._more()
+                continue
+            i = m.start()
+            if self.buf[i] == _QUOTE:
+                return i + 1
+            # Backslash escape, make sure the escaped byte is in the buffer before skipping it
+            while i + 1 >= len(self.buf):
+                self._more()
+            i += 2
+
+    def _skip_value(self):
+        """Advance past the next JSON value and return its (start, end) indices in the buffer"""
+        c = self._peek()
+        start = self.pos
+        if c == _QUOTE:
+            end = self._string_end(start + 1)
+        elif c in _OPENERS:
+            depth = 0
+            i = start
+            while True:
+                m = _STRUCTURAL.search(self.buf, i)
+                if m is None:
+                    i = len(self.buf)
+                    self._more()
+                    continue
+                i = m.start()
+                if self.buf[i] == _QUOTE:
+                    i = self._string_end(i + 1)
+                    continue
+                depth += 1 if self.buf[i] in _OPENERS else -1
+                i += 1
+                if depth == 0:
+                    end = i
+                    break
+        else:
+            while True:
+                m = _SCALAR_END.search(self.buf, start)
+                if m:
+                    end = m.start()
+                    break
+                try:
+                    self._more()
+                except ValueError:
+                    # A bare scalar may legitimately run up to the end of the input
+                    end = len(self.buf)
+                    break
+        self.pos = end
+        return start, end
+
+    def _read_value(self, raw=False):
+        start, end = self._skip_value()
+        value = bytes(self.buf[start:end])
+        return value if raw else json.loads(value)
+
+    def seek_key(self, key):
+        """
+        Within the object whose opening brace has already been consumed, skip members until `key` is found.
+        Leaves the reader positioned at the key's value. Returns False if the object ends first.
+        """
+        while True:
+            c = self._peek()
+            if c == ord('}'):
+                self.pos += 1
+                return False
+            if c == ord(','):
+                self.pos += 1
+                continue
+            name = self._read_value()
+            self._expect(':')
+            if name == key:
+                return True
+            self._skip_value()
+            self._compact()
+
+    def iter_array(self, with_offsets=False, raw=False):
+        """Yield each element of the array starting at the current position, decoding one at a time"""
+        self._expect('[')
+        yield from self.iter_array_items(with_offsets, raw)
+
+    def iter_array_items(self, with_offsets=False, raw=False):
+        """
+        Yield the remaining elements of an array whose opening bracket (and possibly some elements) was consumed.
+        With with_offsets, yields (element, offset just past the element) so a later run can resume from there.
+        With raw, elements are yielded as their undecoded JSON bytes, e.g. to be decoded in another process.
+        """
+        while True:
+            c = self._peek()
+            if c == ord(']'):
+                self.pos += 1
+                return
+            if c == ord(','):
+                self.pos += 1
+                continue
+            value = self._read_value(raw)
+            self._compact()
+            yield (value, self.tell) if with_offsets else value
+
+    def iter_path(self, path, with_offsets=False, raw=False):
+        """Yield the elements of the array found by following the object keys in `path` from the root"""
+        for key in path:
+            self._expect('{')
+            if not self.seek_key(key):
+                raise ValueError(f"Key '{key}' not found while looking for {'.'.join(path)}")
+        yield from self.iter_array(with_offsets, raw)
+
+
+def iter_har_entries(har_file, chunk_size=DEFAULT_CHUNK_SIZE, offset=0, with_offsets=False, raw=False):
+    """
+    Stream log.entries from a HAR file without loading the whole document.
+
+    A non-zero offset must be one previously reported with with_offsets, reading then resumes right after
+    that entry without looking at anything before it.
+    """
+    with open(har_file, "rb") as f:
+        reader = JsonStreamReader(f, chunk_size)
+        if offset:
+            f.seek(offset)
+            reader.offset = offset
+            yield from reader.iter_array_items(with_offsets, raw)
+        else:
+            yield from reader.iter_path(("log", "entries"), with_offsets, raw)
@@ -1,231 +1,502 @@
-import openpyxl
-import tldextract
+import os
+from time import perf_counter
 
 try:
     from .helpers import *
     from .logger import logger
+    from .har_reader import iter_har_entries
+    from .outputs import OUTPUT_FORMATS, get_sink
+    from .tds import TdsIndex
+    from .domains import default_extractor
+    from .rows import RequestInfo, RowStore
+    from .checkpoint import Checkpoint
+    from .stats import Stats, profiled
+    from .version import __version__
+    from .index import DEFAULT_INDEX_FILE, CaptureIndex
+    from .filters import COMPONENTS, ExtractionFilter
 except:
     from helpers import *
     from logger import logger
+    from har_reader import iter_har_entries
+    from outputs import OUTPUT_FORMATS, get_sink
+    from tds import TdsIndex
+    from domains import default_extractor
+    from rows import RequestInfo, RowStore
+    from checkpoint import Checkpoint
+    from stats import Stats, profiled
+    from version import __version__
+    from index import DEFAULT_INDEX_FILE, CaptureIndex
+    from filters import COMPONENTS, ExtractionFilter
+
 
-from dns_helper import SubdomainScanner
+# Analyzer time is kept per verdict, keyed on the start of the verdict string
+ANALYZE_PHASES = {"Base": "analyze.base64", "Hash": "analyze.hash", "Date": "analyze.date", None: "analyze.none"}
 
 
 class HarParser():
 
-    def __init__(self, har_file, output_file, parent_domain, tds_file="tds.json", check_dns=True):
+    def __init__(self, har_file, output_file, parent_domain, tds_file="tds.json", check_dns=True, stream=False,
+                 output_format="xlsx", tds_index=None, extract_responses=False,
+                 max_body_size=MAX_RESPONSE_BODY_SIZE, incremental=False, checkpoint_dir=None, index_lists=False,
+                 stats=None, jobs=1, index_file=None, filters=None):
         self.har_file = har_file
         self.output_file = output_file
         self.parent_domain = parent_domain
         self.tds_file = tds_file
         self.check_dns = check_dns
+        self.stream = stream
+        self.output_format = output_format
+        self.extract_responses = extract_responses
+        self.max_body_size = max_body_size
+        # Passed to flatten_dict for every parsed body
+        self.flatten_options = {"index_lists": index_lists}
+        # Incremental mode checkpoints after the last entry so a re-run only extracts entries added since
+        self.incremental = incremental
+        self.checkpoint_dir = checkpoint_dir
+        # With more than one job, entries are extracted in chunks across a process pool (not in incremental mode)
+        self.jobs = jobs
+        # Cross-capture index the rows are added to once written, see index.CaptureIndex
+        self.index_file = index_file
+        # Callers parsing many files can pass an already loaded TdsIndex to skip loading it again
+        self.tds_index = tds_index
+        self.domain_extractor = default_extractor()
+        # Timings and counters for --stats. Coarse phases are always recorded, the per component and per analyzer
+        # timings cost ~10% of extraction time so they are only taken when a Stats is passed in.
+        self.stats = stats if stats is not None else Stats()
+        self.timed = stats is not None
 
-        self.headers = []
-        self.cookies = []
-        self.querystring = []
-        self.postdata = []
-        self.parsed_postdata = []
+        self.request_table = []
+        self.headers = RowStore("headers", self.request_table)
+        self.cookies = RowStore("cookies", self.request_table)
+        self.querystring = RowStore("queryString", self.request_table)
+        self.postdata = RowStore("postData", self.request_table)
+        self.parsed_postdata = RowStore("parsed_postData", self.request_table)
+        self.response_headers = RowStore("responseHeaders", self.request_table)
+        self.set_cookies = RowStore("setCookies", self.request_table)
+        self.response_body = RowStore("responseBody", self.request_table)
+        # An ExtractionFilter, pushed down into extract_entry and add_row so filtered out requests and rows are
+        # never parsed or analyzed. The component choice is resolved once here rather than per entry.
+        self.filters = filters
+        self.row_filter = filters if filters is not None and filters.keeps_rows() else None
+        keep = filters.keep_component if filters is not None else lambda source: True
+        self.request_stores = tuple(data for data in (self.headers, self.cookies, self.querystring)
+                                    if keep(data.source))
+        self.keep_postdata = keep(self.postdata.source)
+        self.keep_parsed_postdata = keep(self.parsed_postdata.source)
+        self.keep_response_headers = keep(self.response_headers.source)
+        self.keep_set_cookies = keep(self.set_cookies.source)
+        self.keep_response_body = keep(self.response_body.source)
+        # Subdomains in the order they were first seen, the set makes the membership check O(1)
         self.subdomains = []
+        self.subdomain_set = set()
+        # Background DNS scan fed while extracting, see start_dns_scan()
+        self.dns_scanner = None
+
+    def add_subdomain(self, subdomain):
+        if subdomain not in self.subdomain_set:
+            self.subdomain_set.add(subdomain)
+            self.subdomains.append(subdomain)
+            if self.dns_scanner is not None:
+                self.dns_scanner.add(subdomain)
+
+    def start_dns_scan(self):
+        """Start scanning subdomains in the background, every subdomain found from now on is queued right away"""
+        # dnspython and httpx are slow to import, they are only loaded when DNS checks are on
+        try:
+            from .dns_helper import SubdomainScanner
+        except:
+            from dns_helper import SubdomainScanner
+        self.dns_scanner = SubdomainScanner(self.subdomains, stats=self.stats)
+        self.dns_scanner.start()
 
     def create_workbook(self):
-        columns = ["url", "request_id", "name", "value", "calculated_domain", "calculated_entity", "source"]
-        wb = openpyxl.Workbook()
-
-        # Remove the default sheet
-        default_sheet = wb.active
-        wb.remove(default_sheet)
-
-        parent_sheet = wb.create_sheet("Everything")
-        parent_row = 0
-        for sheet_name, data in zip(["Headers", "Cookies", "QueryString", "PostData", "ParsedPostData"],
-                                    (
-                                            self.headers, self.cookies, self.querystring, self.postdata,
-                                            self.parsed_postdata)):
-
-            sheet = wb.create_sheet(sheet_name)
-            for i in range(len(columns)):
-                sheet.cell(row=1, column=i + 1).value = columns[i]
-                if parent_row == 0:
-                    parent_sheet.cell(row=1, column=i + 1).value = columns[i]
-
-            for row in range(len(data)):
-                parent_row += 1
-                for col in range(len(columns)):
-                    try:
-                        sheet.cell(row=row + 2, column=col + 1).value = remove_illegal_chars(data[row][col])
-                        parent_sheet.cell(row=parent_row + 1, column=col + 1).value = remove_illegal_chars(
-                            data[row][col])
-                    except:
-                        print("ERROR ON ROW", data[row][col])
-                        print("ERROR ON ROW FULL", data[row])
-                        traceback.print_exc()
+        if self.check_dns and self.dns_scanner is None:
+            self.start_dns_scan()
+        scanner = self.dns_scanner
 
-        if self.check_dns:
-            subs_sheet = wb.create_sheet("DNS")
-            scanner = SubdomainScanner(self.subdomains)
-            scanner.scan_subdomains()
-            data = scanner.results
-            rows = []
-
-            # Iterate over each subdomain and record type in the data dictionary
-            for subdomain, record_types in data.items():
-                for record_type, record_data in record_types.items():
-                    # Handle empty record types
-                    if not record_data:
-                        rows.append({'Subdomain': subdomain, 'Record Type': record_type})
-                        continue
-                    for ip_address, ip_data in record_data.items():
-                        # Handle empty IP addresses
-                        if not ip_data:
-                            rows.append({'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address})
-                            continue
-                        for key, value in ip_data.items():
-                            # Handle empty key-value pairs
-                            if not value:
-                                rows.append(
-                                    {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
-                                     'Key': key})
-                                continue
-                            # Handle multiple redirects
-                            if key == 'redirects':
-                                for redirect in value:
-                                    rows.append(
-                                        {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
-                                         'Source IP': redirect[0], 'Target URL': redirect[1]})
-                            # Handle multiple A records
-                            elif key == 'a_records':
-                                # Get resolved_ips for Source IP field
-                                resolved_ips = ', '.join(ip_data.get('resolved_ips', []))
-                                for item in value:
-                                    rows.append(
-                                        {'Subdomain': subdomain, 'Record Type': record_type, 'IP Address': ip_address,
-                                         'Key': key.capitalize(), 'Value': item, 'Source IP': resolved_ips})
-                            # Handle resolved IPs for NS records
-                            elif key == 'resolved_ips':
-                                # Skip resolved_ips rows
-                                continue
-            # Write the header row
-            header_row = ['Subdomain', 'Record Type', 'IP Address', 'Key', 'Value', 'Source IP', 'Target URL']
-            header = [cell for cell in header_row]
-            subs_sheet.append(header)
-            # Write the data rows
-            for row, data_row in enumerate(rows, start=2):
-                subs_sheet.cell(row=row, column=1, value=data_row.get('Subdomain', ''))
-                subs_sheet.cell(row=row, column=2, value=data_row.get('Record Type', ''))
-                subs_sheet.cell(row=row, column=3, value=data_row.get('IP Address', ''))
-                subs_sheet.cell(row=row, column=4, value=data_row.get('Key', ''))
-                subs_sheet.cell(row=row, column=5, value=data_row.get('Value', ''))
-                subs_sheet.cell(row=row, column=6, value=data_row.get('Source IP', ''))
-                subs_sheet.cell(row=row, column=7, value=data_row.get('Target URL', ''))
-        wb.save(self.output_file)
+        sink = get_sink(self.output_format, self.output_file)
+        with self.stats.phase("output"):
+            sink.open()
+        try:
+            with self.stats.phase("output"):
+                for sheet_name, data in self.component_rows():
+                    sink.write_rows(sheet_name, data)
+            # The data is written while DNS finishes, the DNS sheet comes last
+            if scanner:
+                scanner.finish()
+                with self.stats.phase("output"):
+                    sink.write_dns_rows(scanner.result_rows())
+        finally:
+            if scanner:
+                # No-op once finished, otherwise something failed and the scan is abandoned
+                scanner.finish(cancel=True)
+            with self.stats.phase("output"):
+                sink.close()
 
-    def extract_entries(self):
-        with open(self.har_file, "r", encoding="utf-8") as f:
+    def iter_entries(self):
+        # Streaming mode decodes one entry at a time so memory doesn't grow with the size of the HAR
+        if self.stream:
+            return self.stats.iter_timed("har_load", iter_har_entries(self.har_file))
+        with self.stats.phase("har_load"), open(self.har_file, "r", encoding="utf-8") as f:
             har = json.load(f)
+        return iter(har.get("log")["entries"])
+
+    def extract_entries(self):
+        # DNS only waits on network, it runs alongside extraction and writing instead of after them
+        if self.check_dns:
+            self.start_dns_scan()
+        try:
+            self.extract()
+        except BaseException:
+            if self.dns_scanner:
+                self.dns_scanner.finish(cancel=True)
+            raise
+        self.create_workbook()
+        if self.index_file:
+            self.update_index()
+
+    def update_index(self):
+        with self.stats.phase("index"):
+            index = CaptureIndex(self.index_file)
+            try:
+                index.add_parser(self)
+            finally:
+                index.close()
+
+    def extract(self):
+        if self.tds_index is None:
+            with self.stats.phase("tds_load"):
+                self.tds_index = TdsIndex.load(self.tds_file)
+
+        cache_before = self.domain_extractor.cache_info()
+        # With --jobs the lookups happen in the workers, which report their own cache counts
+        worker_hits = worker_misses = 0
+        with self.stats.phase("extract"):
+            if self.incremental:
+                self.extract_incremental()
+            elif self.jobs is None or self.jobs > 1:
+                try:
+                    from .parallel import extract_parallel
+                except:
+                    from parallel import extract_parallel
+                worker_hits, worker_misses = extract_parallel(self, self.jobs)
+            else:
+                request_id = 0
+                for entry in self.iter_entries():
+                    request_id += 1
+                    self.extract_entry(entry, request_id)
+        cache_after = self.domain_extractor.cache_info()
+        hits = cache_after.hits - cache_before.hits + worker_hits
+        misses = cache_after.misses - cache_before.misses + worker_misses
+        self.stats.count("entries", len(self.request_table))
+        self.stats.count("domain_cache.hits", hits)
+        self.stats.count("domain_cache.misses", misses)
+        logger.info(f"Domain extraction cache: {hits} hits, {misses} misses")
+
+    def extraction_fingerprint(self):
+        # Everything that changes which rows come out of an entry, stored rows are only reused if it matches
+        tds_stat = os.stat(self.tds_file)
+        fingerprint = [self.parent_domain, os.path.abspath(self.tds_file), tds_stat.st_mtime_ns, tds_stat.st_size,
+                       self.extract_responses, self.max_body_size, self.flatten_options]
+        if self.filters is not None:
+            fingerprint.append(self.filters.fingerprint())
+        return fingerprint
 
-        entries = har.get("log")["entries"]
-        tds_domains = fetch_tds(self.tds_file)
-
-        request_id = 0
-        for entry in entries:
-            url = entry["request"]["url"]
-            extracted = tldextract.extract(url)
-            domain = extracted.domain + '.' + extracted.suffix
-            entity = (lambda s, d, sub: d.get(s,
-                                              "No result detected") if s in d.keys() or sub not in s else self.parent_domain)(
-                domain, tds_domains, self.parent_domain)
-            if entity == self.parent_domain or entity == "No result detected":
-                if extracted.subdomain:
-                    subdomain = extracted.subdomain + '.' + extracted.domain + '.' + extracted.suffix
-                    if not subdomain in self.subdomains:
-                        self.subdomains.append(subdomain)
+    def extract_incremental(self):
+        checkpoint = Checkpoint(self.har_file, self.extraction_fingerprint(), self.checkpoint_dir)
+        with self.stats.phase("checkpoint_load"):
+            request_id, offset = checkpoint.load(self)
+        mark = self.mark()
+        processed = request_id
+        entries = self.stats.iter_timed("har_load", iter_har_entries(self.har_file, offset=offset, with_offsets=True))
+        while True:
+            try:
+                entry, entry_end = next(entries)
+            except StopIteration:
+                break
+            except ValueError as e:
+                # A crawler may still be writing the file, stop at the last complete entry and pick up from there.
+                # Only the reader's errors mean that, extraction errors propagate with nothing saved.
+                logger.warning(f"Stopped after entry {request_id} of {self.har_file}: {e}")
+                break
             request_id += 1
-            for request_component, data in zip(["headers", "cookies", "queryString"],
-                                               (self.headers, self.cookies, self.querystring)):
-
-                for component_entry in entry["request"][request_component]:
-
-                    data.append([url, request_id, component_entry["name"], component_entry["value"], domain, entity,
-                                 request_component])
-                    analyzed_value = analyze_string(component_entry["value"])
-                    if analyzed_value:
-                        data.append(
-                            [url, request_id, f'!_analyzed_{component_entry["name"]}', analyzed_value, domain, entity,
-                             request_component])
-
-            if entry["request"].get("postData"):
-                mimeType = entry["request"].get("postData").get("mimeType")
-                text = entry["request"].get("postData").get("text")
-                self.postdata.append([url, request_id, mimeType, text, domain, entity, "postData"])
-                analyzed_value = analyze_string(text)
-                if analyzed_value:
-                    self.postdata.append([url, request_id, f'!_analyzed_{mimeType}', analyzed_value, domain, entity,
-                                          "postData"])
-
-                if "multipart/form-data" in mimeType:
-                    parsed_multipart = parse_multipart_form(mimeType, text)
-                    if parsed_multipart:
-                        for k, v in parsed_multipart.items():
-                            self.parsed_postdata.append([url, request_id, k, v, domain, entity, "parsed_postData"])
-                            analyzed_value = analyze_string(v)
-                            if analyzed_value:
-                                self.parsed_postdata.append(
-                                    [url, request_id, f'!_analyzed_{k}', analyzed_value, domain, entity,
-                                     "parsed_postData"])
-                elif text.startswith("{") or text.startswith("[") or type(text) == dict or type(text) == list:
-                    try:
-                        _dict = text
-                        if type(text) == str:
-                            _dict = json.loads(text)
-                        if type(_dict) == list:
-                            # if we end up with a list try to parse the first entry, otherwise it'll bail out
-                            _dict = _dict[0]
-                        for _k, _v in flatten_dict(_dict).items():
-
-                            self.parsed_postdata.append([url, request_id, _k, _v, domain, entity, "parsed_postData"])
-                            analyzed_value = analyze_string(_v)
-                            if analyzed_value:
-                                self.parsed_postdata.append(
-                                    [url, request_id, f'!_analyzed_{_k}', analyzed_value, domain, entity,
-                                     "parsed_postData"])
-                    except:
-                        pass
-                elif "text/plain" in mimeType:
-                    parsed_code_arguments = parse_post_body_code_arguments(entry["request"].get("postData"))
-                    if parsed_code_arguments:
-                        for k, v in parsed_code_arguments.items():
-                            self.parsed_postdata.append([url, request_id, k, v, domain, entity, "parsed_postData"])
-                            analyzed_value = analyze_string(v)
-                            if analyzed_value:
-                                self.parsed_postdata.append(
-                                    [url, request_id, f'!_analyzed_{k}', analyzed_value, domain, entity,
-                                     "parsed_postData"])
-                else:
+            self.extract_entry(entry, request_id)
+            offset = entry_end
+        logger.info(f"Extracted {request_id - processed} new entries from {self.har_file}")
+        if request_id > processed:
+            with self.stats.phase("checkpoint_save"):
+                checkpoint.save(self, mark, request_id, offset)
+
+    def mark(self):
+        """Sizes of everything the parser holds, segment_since(mark) then returns only what was added after"""
+        return len(self.request_table), [len(data) for _, data in self.component_rows()], len(self.subdomains)
+
+    def segment_since(self, mark):
+        """The requests, rows and subdomains added since mark, in a picklable form add_segment() takes back"""
+        table_start, store_starts, subdomains_start = mark
+        return (self.request_table[table_start:],
+                [data.columns(start) for (_, data), start in zip(self.component_rows(), store_starts)],
+                self.subdomains[subdomains_start:])
+
+    def add_segment(self, segment):
+        """Append a segment, its row refs must already point past the requests held so far"""
+        request_table, stores, subdomains = segment
+        self.request_table.extend(request_table)
+        for (sheet_name, data), columns in zip(self.component_rows(), stores):
+            data.extend_columns(*columns)
+        for subdomain in subdomains:
+            self.add_subdomain(subdomain)
+
+    def component_rows(self):
+        sheet_names = ["Headers", "Cookies", "QueryString", "PostData", "ParsedPostData"]
+        data = [self.headers, self.cookies, self.querystring, self.postdata, self.parsed_postdata]
+        if self.extract_responses:
+            sheet_names += ["ResponseHeaders", "SetCookies", "ResponseBody"]
+            data += [self.response_headers, self.set_cookies, self.response_body]
+        if self.filters is not None:
+            # Components that are filtered out are left out of the output altogether
+            return ((sheet_name, store) for sheet_name, store in zip(sheet_names, data)
+                    if self.filters.keep_component(store.source))
+        return zip(sheet_names, data)
+
+    def is_parent_domain(self, host):
+        return host == self.parent_domain or host.endswith("." + self.parent_domain)
+
+    def add_row(self, data, ref, name, value):
+        row_filter = self.row_filter
+        if row_filter is not None and not row_filter.keep_name(name):
+            return
+        if self.timed:
+            start = perf_counter()
+            analyzed_value = analyze_string(value)
+            self.stats.add(ANALYZE_PHASES[analyzed_value[:4] if analyzed_value else None], perf_counter() - start)
+        else:
+            analyzed_value = analyze_string(value)
+        if analyzed_value:
+            data.append(ref, name, value)
+            data.append(ref, f'!_analyzed_{name}', analyzed_value)
+        elif row_filter is None or not row_filter.analyzed_only:
+            data.append(ref, name, value)
+
+    def extract_entry(self, entry, request_id):
+        stats = self.stats if self.timed else None
+        start = perf_counter()
+        request = entry["request"]
+        url = request["url"]
+        extracted = self.domain_extractor.extract(url)
+        domain = extracted.domain + '.' + extracted.suffix
+        host = '.'.join(part for part in (extracted.subdomain, extracted.domain, extracted.suffix) if part)
+        entity = self.tds_index.lookup(host, domain)
+        if entity is None:
+            entity = self.parent_domain if self.is_parent_domain(host) else "No result detected"
+        if entity == self.parent_domain or entity == "No result detected":
+            if extracted.subdomain:
+                self.add_subdomain(extracted.subdomain + '.' + extracted.domain + '.' + extracted.suffix)
+
+        # Everything that is the same for all rows of this request is stored once
+        ref = len(self.request_table)
+        self.request_table.append(RequestInfo(url, request_id, domain, entity))
+        if stats:
+            stats.add("extract.domain", perf_counter() - start)
+        # A filtered out request keeps its place in the request table (request_ids and row refs stay aligned with
+        # the entries) but nothing else is extracted from it
+        if self.filters is not None and not self.filters.keep_request(domain, entity, self.parent_domain):
+            self.stats.count("entries_filtered")
+            return
+
+        for data in self.request_stores:
+            start = perf_counter()
+            for component_entry in request[data.source]:
+                self.add_row(data, ref, component_entry["name"], component_entry["value"])
+            if stats:
+                stats.add("extract." + data.source, perf_counter() - start)
+
+        start = perf_counter()
+        post_data = request.get("postData") if self.keep_postdata or self.keep_parsed_postdata else None
+        if post_data:
+            mimeType = post_data.get("mimeType")
+            text = post_data.get("text")
+            if self.keep_postdata:
+                self.add_row(self.postdata, ref, mimeType, text)
+
+            parsed = None
+            if not self.keep_parsed_postdata:
+                # Only the raw body was asked for
+                pass
+            elif "multipart/form-data" in mimeType:
+                parsed = parse_multipart_form(mimeType, text, **self.flatten_options)
+            elif text.startswith("{") or text.startswith("[") or type(text) == dict or type(text) == list:
+                try:
+                    _dict = text
+                    if type(text) == str:
+                        _dict = json.loads(text)
+                    if type(_dict) == list:
+                        # if we end up with a list try to parse the first entry, otherwise it'll bail out
+                        _dict = _dict[0]
+                    for _k, _v in flatten_dict(_dict, **self.flatten_options).items():
+                        self.add_row(self.parsed_postdata, ref, _k, _v)
+                except:
                     pass
-        self.create_workbook()
+            elif "text/plain" in mimeType:
+                parsed = parse_post_body_code_arguments(post_data, **self.flatten_options)
+
+            if parsed:
+                for k, v in parsed.items():
+                    self.add_row(self.parsed_postdata, ref, k, v)
+            if stats:
+                stats.add("extract.postData", perf_counter() - start)
+
+        if self.extract_responses and (self.keep_response_headers or self.keep_set_cookies or self.keep_response_body):
+            start = perf_counter()
+            self.extract_response(entry.get("response") or {}, ref)
+            if stats:
+                stats.add("extract.response", perf_counter() - start)
+
+    def extract_response(self, response, ref):
+        if self.keep_response_headers:
+            for header in response.get("headers") or ():
+                self.add_row(self.response_headers, ref, header["name"], header["value"])
+        if self.keep_set_cookies:
+            for cookie in response.get("cookies") or ():
+                self.add_row(self.set_cookies, ref, cookie["name"], cookie["value"])
+        if not self.keep_response_body:
+            return
+
+        content = response.get("content") or {}
+        text = decode_response_body(content, self.max_body_size)
+        if text is None:
+            return
+        mime_type = content.get("mimeType")
+        self.add_row(self.response_body, ref, mime_type, text)
+        if "json" in mime_type.lower():
+            try:
+                for k, v in parse_json_data(text, **self.flatten_options).items():
+                    self.add_row(self.response_body, ref, k, v)
+            except:
+                pass
 
 
-import os
 import argparse
+import re
+import sys
+
+
+def output_file_name(output_dir, parent_domain, output_format, suffix=""):
+    return os.path.join(output_dir, f"harryparser_{parent_domain}_{datetime.now().strftime('%Y-%m-%d_%H.%M.%S')}"
+                                    f"{suffix}.{OUTPUT_FORMATS[output_format].extension}")
 
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        try:
+            from .service import main as serve
+        except:
+            from service import main as serve
+        return serve(sys.argv[2:])
+    if sys.argv[1:2] == ["query"]:
+        try:
+            from .index import main as query
+        except:
+            from index import main as query
+        return query(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="HAR Parser CLI")
-    parser.add_argument("har_file", type=str, help="HAR file to parse")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument("har_file", type=str, nargs="+",
+                        help="HAR file to parse, several files, directories or glob patterns run a batch")
     parser.add_argument("-p", "--parent_domain", type=str, required=True, help="Parent domain")
     parser.add_argument("-t", "--tds_file", type=str, default="harryparser/tds.json",
                         help="TDS JSON file (default: tds.json if present)")
     parser.add_argument("-c", "--check_dns", action="store_true", default=True, help="Enable DNS checks")
     parser.add_argument("-o", "--output_dir", type=str, default="output", help="Output directory path")
+    parser.add_argument("-s", "--stream", action="store_true", default=False,
+                        help="Stream entries from the HAR instead of loading the whole file")
+    parser.add_argument("-f", "--format", type=str, default="xlsx", choices=list(OUTPUT_FORMATS),
+                        help="Output format (default: xlsx)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes for batch mode (default: CPU count)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Processes extracting a single HAR in parallel, 0 for one per CPU (default: 1)")
+    parser.add_argument("-r", "--responses", action="store_true", default=False,
+                        help="Also extract response headers, Set-Cookies and textual response bodies")
+    parser.add_argument("--max_body_size", type=int, default=MAX_RESPONSE_BODY_SIZE,
+                        help=f"Largest response body decoded, in bytes (default: {MAX_RESPONSE_BODY_SIZE})")
+    parser.add_argument("-i", "--incremental", action="store_true", default=False,
+                        help="Checkpoint the parse so re-running on a growing HAR only extracts new entries")
+    parser.add_argument("--checkpoint_dir", type=str, default=None,
+                        help="Where incremental checkpoints are kept (default: next to the HAR file)")
+    parser.add_argument("--index_lists", action="store_true", default=False,
+                        help="Flatten every element of lists of objects in bodies (key_0_field), not just the first")
+    parser.add_argument("--stats", action="store_true", default=False,
+                        help="Print time, counts and peak memory per phase when done")
+    parser.add_argument("--stats_json", type=str, default=None, help="Also write the --stats report to this JSON file")
+    parser.add_argument("--stats_memory", action="store_true", default=False,
+                        help="Trace peak Python memory per phase for --stats (slows the run down)")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Dump cProfile stats for the run to this file (main process only in batch mode)")
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_FILE,
+                        help=f"Cross-capture index every run is added to, see `harryparser query` "
+                             f"(default: {DEFAULT_INDEX_FILE})")
+    parser.add_argument("--no_index", action="store_true", default=False, help="Don't add this run to the index")
+    parser.add_argument("--entity", type=str, action="append", default=None,
+                        help="Only extract requests to this entity (repeatable)")
+    parser.add_argument("--exclude_entity", type=str, action="append", default=None,
+                        help="Skip requests to this entity (repeatable)")
+    parser.add_argument("--domain", type=str, action="append", default=None,
+                        help="Only extract requests to this registered domain (repeatable)")
+    parser.add_argument("--exclude_domain", type=str, action="append", default=None,
+                        help="Skip requests to this registered domain (repeatable)")
+    parser.add_argument("--third_party", action="store_true", default=False,
+                        help="Skip requests to the parent domain itself")
+    parser.add_argument("--components", type=lambda value: value.split(","), default=None,
+                        help=f"Only extract these components, comma separated: {','.join(COMPONENTS)} "
+                             f"(the response ones need --responses)")
+    parser.add_argument("--name_regex", type=str, default=None, help="Only keep rows whose name matches this regex")
+    parser.add_argument("--analyzed_only", action="store_true", default=False,
+                        help="Only keep rows analyze_string found something in (base64, hash, date)")
 
     args = parser.parse_args()
+    filters = None
+    if (args.entity or args.exclude_entity or args.domain or args.exclude_domain or args.third_party
+            or args.components or args.name_regex or args.analyzed_only):
+        try:
+            filters = ExtractionFilter(args.entity, args.exclude_entity, args.domain, args.exclude_domain,
+                                       args.third_party, args.components, args.name_regex, args.analyzed_only)
+        except (ValueError, re.error) as e:
+            parser.error(str(e))
     # Check if output directory exists and create it if it doesn't
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
-    output_file = os.path.join(args.output_dir,
-                               f"harryparser_{args.parent_domain}_{datetime.now().strftime('%Y-%m-%d_%H.%M.%S')}.xlsx")
-    h = HarParser(args.har_file, output_file, args.parent_domain, args.tds_file, check_dns=args.check_dns)
-    h.extract_entries()
+    output_file = output_file_name(args.output_dir, args.parent_domain, args.format)
+    try:
+        from .batch import expand_har_paths, run_batch
+    except:
+        from batch import expand_har_paths, run_batch
+
+    har_files = expand_har_paths(args.har_file)
+    if not har_files:
+        parser.error("No HAR files found")
+    index_file = None if args.no_index else args.index
+    stats = Stats(trace_memory=args.stats_memory) if args.stats or args.stats_json or args.stats_memory else None
+    with profiled(args.profile):
+        if har_files != args.har_file or len(har_files) > 1:
+            run_batch(har_files, output_file, args.parent_domain, args.tds_file, check_dns=args.check_dns,
+                      stream=args.stream, output_format=args.format, workers=args.workers, stats=stats,
+                      extract_responses=args.responses, max_body_size=args.max_body_size,
+                      incremental=args.incremental, checkpoint_dir=args.checkpoint_dir,
+                      index_lists=args.index_lists, index_file=index_file, filters=filters)
+        else:
+            h = HarParser(har_files[0], output_file, args.parent_domain, args.tds_file, check_dns=args.check_dns,
+                          stream=args.stream, output_format=args.format, extract_responses=args.responses,
+                          max_body_size=args.max_body_size, incremental=args.incremental,
+                          checkpoint_dir=args.checkpoint_dir, index_lists=args.index_lists, stats=stats,
+                          jobs=args.jobs or None, index_file=index_file, filters=filters)
+            h.extract_entries()
+
+    if stats:
+        print(stats.summary())
+    if args.stats_json:
+        stats.write_json(args.stats_json)
 
 
 if __name__ == "__main__":
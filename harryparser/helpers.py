@@ -1,18 +1,20 @@
 import base64
-import cgi
-import io
+import functools
 import json
 import re
 import traceback
 import urllib.parse
 from datetime import datetime
 
-from dateutil import parser
+try:
+    from .multipart import get_boundary, iter_multipart
+except:
+    from multipart import get_boundary, iter_multipart
 
 
-def parse_post_body_code_arguments(input_str):
+def parse_post_body_code_arguments(input_str, **flatten_options):
     if type(input_str) == dict:
-        return parse_json_data(input_str)
+        return parse_json_data(input_str, **flatten_options)
     if bool(re.match(r'^(\$[\w]+=[^$]*)+$', input_str)):
         # Split the input string into key-value pairs
         key_value_pairs = re.findall(r'\$(\w+)=([^$]*)', input_str)
@@ -26,9 +28,31 @@ def parse_post_body_code_arguments(input_str):
     return False
 
 
+# Shape of canonical base64, anything else can't survive the decode/re-encode round trip in is_base64
+BASE64_RE = re.compile(r'(?:[A-Za-z0-9+/]{4})*(?:[A-Za-z0-9+/]{2}==|[A-Za-z0-9+/]{3}=)?')
+HASH_TYPES = (
+    (re.compile(r"^[a-fA-F\d]{32}$"), "MD5"),
+    (re.compile(r"^[a-fA-F\d]{40}$"), "SHA-1"),
+    (re.compile(r"^[a-fA-F\d]{64}$"), "SHA-256"),
+)
+# `$` also matches before a trailing newline, hence the odd lengths
+HASH_LENGTHS = {32, 33, 40, 41, 64}
+EPOCH_RE = re.compile(r'^\d{10}(\d{3})?$')
+DATE_SEPARATOR_RE = re.compile(r"[-/:.]")
+DIGIT_RE = re.compile(r"[0-9]")
+# Fuzzy date parsing is by far the most expensive check, only short values that could hold a date get it
+MAX_DATE_LENGTH = 64
+
+ANALYZE_CACHE_SIZE = 65536
+# Longer values (whole post bodies) rarely repeat and would pin a lot of memory in the cache
+ANALYZE_CACHE_MAX_LENGTH = 1024
+
+
 def is_base64(s):
+    if type(s) != str or len(s) % 4 or not BASE64_RE.fullmatch(s):
+        return False, None
     try:
-        decoded_bytes = base64.b64decode(s)
+        decoded_bytes = base64.b64decode(s, validate=True)
         if base64.b64encode(decoded_bytes).decode() == s:
             return True, decoded_bytes
     except Exception:
@@ -37,21 +61,16 @@ def is_base64(s):
 
 
 def is_hash(s):
-    if len(str(s)) <= 64:
-        hash_types = {
-            r"^[a-fA-F\d]{32}$": "MD5",
-            r"^[a-fA-F\d]{40}$": "SHA-1",
-            r"^[a-fA-F\d]{64}$": "SHA-256",
-        }
-        for pattern, hash_type in hash_types.items():
-            if re.match(pattern, s):
+    if len(s) in HASH_LENGTHS:
+        for pattern, hash_type in HASH_TYPES:
+            if pattern.match(s):
                 return hash_type
     return None
 
 
 def is_epoch(s):
     # Check if the input string represents an epoch timestamp in seconds or milliseconds
-    if re.match(r'^\d{10}(\d{3})?$', s):
+    if EPOCH_RE.match(s):
         timestamp = int(s[:10])  # Use the first 10 digits as the epoch timestamp in seconds
         return datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
     return None
@@ -62,10 +81,13 @@ def is_date(s):
     if epoch_date:
         return epoch_date
 
-    # Only attempt to parse strings with typical date separators
-    if not re.search(r"[-/:.]", s):
+    # Only attempt to parse short strings with a digit and typical date separators
+    if len(s) > MAX_DATE_LENGTH or not DATE_SEPARATOR_RE.search(s) or not DIGIT_RE.search(s):
         return None
 
+    # Imported here, dateutil is slow to import and most runs never get this far
+    from dateutil import parser
+
     try:
         parsed_date = parser.parse(s, fuzzy=True)
         return parsed_date.strftime("%Y-%m-%d %H:%M:%S")
@@ -73,109 +95,185 @@ def is_date(s):
         return None
 
 
+def classify_string(s):
+    # Cheapest checks first, each one bails out early on length or character class before any decoding
+    try:
+        is_base64_encoded, decoded_bytes = is_base64(s)
+        if is_base64_encoded:
+            return f"Base64 encoded. Decoded bytes: {decoded_bytes}"
+
+        hash_type = is_hash(s)
+        if hash_type:
+            return f"Hash detected ({hash_type})."
+        standardized_date = is_date(s)
+        if standardized_date:
+            return f"Date detected. Standardized date: {standardized_date}"
+    except:
+        print("exception parsing via analyze string", s)
+        traceback.print_exc()
+    return False
+
+
+# Headers and cookies repeat on every request, so verdicts are memoized by value
+_classify_cached = functools.lru_cache(maxsize=ANALYZE_CACHE_SIZE)(classify_string)
+
+
 def analyze_string(s):
     if type(s) == str and s.strip():
-        try:
-            is_base64_encoded, decoded_bytes = is_base64(str(s))
-            if is_base64_encoded:
-                return f"Base64 encoded. Decoded bytes: {decoded_bytes}"
-
-            hash_type = is_hash(str(s))
-            if hash_type:
-                return f"Hash detected ({hash_type})."
-            standardized_date = is_date(str(s))
-            if standardized_date:
-                return f"Date detected. Standardized date: {standardized_date}"
-        except:
-            print("exception parsing via analyze string", s)
-            traceback.print_exc()
+        if len(s) <= ANALYZE_CACHE_MAX_LENGTH:
+            return _classify_cached(s)
+        return classify_string(s)
     return False
 
 
-def flatten_dict(d, parent_key='', sep='_'):
-    items = []
-    for k, v in d.items():
-        new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            if v and isinstance(v[0], dict):
-                items.extend(flatten_dict(v[0], new_key, sep=sep).items())
-            else:
-                items.append((new_key, v))
-        else:
+# Limits for flattening untrusted payloads, deeper containers are kept as values and extra leaves are dropped
+FLATTEN_MAX_DEPTH = 64
+FLATTEN_MAX_LEAVES = 10000
+
+
+def _nested_items(v, index_lists):
+    """The (key, value) pairs to descend into for v, or None when v is a leaf"""
+    if isinstance(v, dict):
+        return iter(v.items())
+    if isinstance(v, list):
+        if index_lists and v:
+            return ((str(i), item) for i, item in enumerate(v))
+        if v and isinstance(v[0], dict):
+            return iter(v[0].items())
+        return None
+    if isinstance(v, str):
+        # Only a string that opens an object can decode to a dict, don't pay for json.loads on anything else
+        c = v[:1]
+        if c == '{' or (c.isspace() and v.lstrip()[:1] == '{'):
             try:
-                # Check if the value is a JSON string and convert it to a dictionary
-                if isinstance(v, str):
-                    try:
-                        # First, try converting the string to a dictionary
-                        v_dict = json.loads(v)
-                        if isinstance(v_dict, dict):
-                            items.extend(flatten_dict(v_dict, new_key, sep=sep).items())
-                        else:
-                            items.append((new_key, v))
-                    except json.JSONDecodeError:
-                        # If the string is not a JSON string, keep it as-is
-                        items.append((new_key, v))
-                else:
-                    items.append((new_key, v))
-            except:
-                items.append((new_key, v))
-    return dict(items)
+                v_dict = json.loads(v)
+            except (ValueError, RecursionError):
+                return None
+            if isinstance(v_dict, dict):
+                return iter(v_dict.items())
+    return None
 
 
-def parse_multipart_form(mimeType, text, debug=False):
+def iter_flatten(d, parent_key='', sep='_', max_depth=FLATTEN_MAX_DEPTH, max_leaves=FLATTEN_MAX_LEAVES,
+                 index_lists=False):
+    """
+    Yield the (key, value) leaves of a nested dict depth first, joining keys with sep.
+
+    Nested dicts and JSON strings holding an object are descended into. For lists of dicts only the first
+    element is, unless index_lists is set, then every element is flattened under its index (key_0_field).
+    Uses an explicit stack so deep payloads can't hit the recursion limit.
+    """
+    stack = [(iter(d.items()), parent_key, 1)]
+    leaves = 0
+    while stack:
+        items, parent_key, depth = stack[-1]
+        for k, v in items:
+            new_key = parent_key + sep + k if parent_key else k
+            nested = _nested_items(v, index_lists) if depth < max_depth else None
+            if nested is not None:
+                stack.append((nested, new_key, depth + 1))
+                break
+            yield new_key, v
+            leaves += 1
+            if leaves >= max_leaves:
+                return
+        else:
+            stack.pop()
+
+
+def flatten_dict(d, parent_key='', sep='_', **options):
+    return dict(iter_flatten(d, parent_key, sep, **options))
+
+
+# Response bodies and uploaded files are only decoded for textual types that can carry identifiers, response
+# bodies also only up to a size cap
+RESPONSE_BODY_MIME_TYPES = ("text/", "json", "javascript", "ecmascript", "xml", "x-www-form-urlencoded")
+MULTIPART_TEXT_MIME_TYPES = RESPONSE_BODY_MIME_TYPES
+MAX_RESPONSE_BODY_SIZE = 1 << 20
+
+
+def parse_multipart_form(mimeType, text, debug=False, **flatten_options):
     if debug:
         print(text)
 
-    # Parse the form data using FieldStorage
-    form = cgi.FieldStorage(
-        fp=io.BytesIO(text.encode()),
-        environ={
-            'REQUEST_METHOD': 'POST',
-            'CONTENT_TYPE': mimeType,
-        },
-        keep_blank_values=True
-    )
-    if debug:
-        print(form)
-    # Get the form fields as a dictionary
+    boundary = get_boundary(mimeType)
+    if not boundary:
+        return {}
+    body = text.encode() if isinstance(text, str) else text
+    # Get the text fields as a dictionary
     data = {}
-    for field in form.keys():
-        v = form[field].value
+    for part in iter_multipart(body, boundary):
+        if part.name is None:
+            continue
+        # File uploads are only decoded when they are textual, binary ones are skipped without a copy
+        if part.filename is not None and not any(t in (part.content_type or "").lower()
+                                                 for t in MULTIPART_TEXT_MIME_TYPES):
+            continue
+        v = part.text()
         # Lazy check for possible json
         if "{" in v:
             try:
-                v = json.loads(form[field].value)
+                v = json.loads(v)
             except:
                 pass
-        data[field] = v
+        data[part.name] = v
+    if debug:
+        print(data)
     try:
         # Print the extracted data
         if debug:
-            print(flatten_dict(data))
-        return (flatten_dict(data))
+            print(flatten_dict(data, **flatten_options))
+        return (flatten_dict(data, **flatten_options))
     except:
         print("flatten dict failed on multipart parsing")
         print(data)
         traceback.print_exc()
 
 
+def decode_response_body(content, max_size=MAX_RESPONSE_BODY_SIZE, mime_types=RESPONSE_BODY_MIME_TYPES):
+    """
+    Return the text of a HAR response.content, or None when it is filtered out.
+
+    The checks on MIME type and size only look at metadata, so bodies that are skipped are never decoded.
+    """
+    text = content.get("text")
+    if not text or type(text) != str:
+        return None
+    mime_type = (content.get("mimeType") or "").lower()
+    if not any(t in mime_type for t in mime_types):
+        return None
+    is_base64_encoded = content.get("encoding") == "base64"
+    # Base64 inflates by 4/3, so the encoded length is enough to know the decoded size
+    size = len(text) * 3 // 4 if is_base64_encoded else len(text)
+    if size > max_size:
+        return None
+    if is_base64_encoded:
+        try:
+            return base64.b64decode(text).decode("utf-8", errors="replace")
+        except ValueError:
+            return None
+    return text
+
+
 def fetch_tds(tds_file):
     with open(tds_file, "r") as fin:
         j = json.load(fin)
         return (j.get("domains"))
 
 
+# Control characters Excel refuses, everything below 0x20 except tab, newline and carriage return
+ILLEGAL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
 def remove_illegal_chars(s):
     if type(s) == str:
-        return ''.join(c for c in s if ord(c) > 31 or ord(c) == 9 or ord(c) == 10 or ord(c) == 13)
+        return ILLEGAL_CHARS_RE.sub('', s)
     if type(s) == list:
         return str(s)
     return s
 
 
-def parse_json_data(text):  # Union[str, Dict, list]) -> Dict[str, Any]:
+def parse_json_data(text, **flatten_options):  # Union[str, Dict, list]) -> Dict[str, Any]:
     if isinstance(text, str):
         try:
             text = json.loads(text)
@@ -185,4 +283,4 @@ def parse_json_data(text):  # Union[str, Dict, list]) -> Dict[str, Any]:
     if isinstance(text, list):
         text = text[0]
 
-    return flatten_dict(text) if isinstance(text, dict) else {}
+    return flatten_dict(text, **flatten_options) if isinstance(text, dict) else {}
@@ -0,0 +1,365 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+try:
+    from .outputs import flat_value
+    from .logger import logger
+except:
+    from outputs import flat_value
+    from logger import logger
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".local", "share", "harryparser", "index.sqlite")
+# Shorter values (true, en-US, 0) are everywhere and say nothing about who is tracking whom
+MIN_VALUE_LENGTH = 8
+# Longer values are bodies and blobs rather than identifiers
+MAX_VALUE_LENGTH = 2048
+ANALYZED_PREFIX = "!_analyzed_"
+CACHE_SIZE_KB = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (capture_id INTEGER PRIMARY KEY, har_file TEXT UNIQUE, parent_domain TEXT,
+                                     size INTEGER, mtime_ns INTEGER, entries INTEGER, indexed_at REAL,
+                                     first_observation INTEGER, last_observation INTEGER, options TEXT);
+CREATE TABLE IF NOT EXISTS value_text (value_hash INTEGER PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS observations (value_hash INTEGER, name TEXT, calculated_entity TEXT,
+                                         calculated_domain TEXT, source TEXT, analysis TEXT, capture_id INTEGER,
+                                         count INTEGER);
+CREATE INDEX IF NOT EXISTS observations_value ON observations (value_hash, capture_id);
+CREATE INDEX IF NOT EXISTS observations_name ON observations (name, capture_id);
+CREATE INDEX IF NOT EXISTS observations_entity ON observations (calculated_entity, capture_id);
+CREATE INDEX IF NOT EXISTS observations_domain ON observations (calculated_domain, capture_id);
+CREATE TABLE IF NOT EXISTS value_stats (value_hash INTEGER PRIMARY KEY, sites INTEGER, entities INTEGER,
+                                        captures INTEGER, observations INTEGER);
+CREATE INDEX IF NOT EXISTS value_stats_spread ON value_stats (sites, entities);
+-- How many captures of each site (kind 'site', key the parent domain) and entity (kind 'entity') a value was seen
+-- in, so value_stats is updated per capture rather than recounted from every observation of the value. Only kept
+-- for values seen in two captures or more, a value's first capture has its site and entities in its observations.
+CREATE TABLE IF NOT EXISTS value_spread (value_hash INTEGER, kind TEXT, key TEXT, captures INTEGER,
+                                         PRIMARY KEY (value_hash, kind, key)) WITHOUT ROWID;
+"""
+# Bumped when the schema changes, _upgrade brings older indexes up to date on open
+SCHEMA_VERSION = 3
+
+# The values of the capture being added or removed: their observation count, whether the capture is the first
+# (last) of its site to have them and how many of their entities it is the first (last) to have them with
+CAPTURE_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS capture_values (value_hash INTEGER PRIMARY KEY, observations INTEGER,
+                                                sites INTEGER DEFAULT 0, entities INTEGER DEFAULT 0);
+CREATE TEMP TABLE IF NOT EXISTS capture_entities (value_hash INTEGER, entity TEXT, PRIMARY KEY (value_hash, entity));
+"""
+
+# Run once the capture's observations are in. Every statement only touches the values of the capture through
+# primary keys, and value_stats is written once per value.
+ADD_VALUE_STATS = (
+    # Values seen in one capture until now get their spread from that capture's observations
+    "INSERT INTO value_spread SELECT DISTINCT o.value_hash, 'site', c.parent_domain, 1 "
+    "FROM capture_values cv CROSS JOIN value_stats s USING (value_hash) CROSS JOIN observations o USING (value_hash) "
+    "JOIN captures c USING (capture_id) WHERE s.captures = 1 AND o.capture_id != :capture",
+    "INSERT INTO value_spread SELECT DISTINCT o.value_hash, 'entity', o.calculated_entity, 1 "
+    "FROM capture_values cv CROSS JOIN value_stats s USING (value_hash) CROSS JOIN observations o USING (value_hash) "
+    "WHERE s.captures = 1 AND o.capture_id != :capture AND o.calculated_entity IS NOT NULL",
+    "UPDATE capture_values SET sites = NOT EXISTS (SELECT 1 FROM value_spread s "
+    "WHERE s.value_hash = capture_values.value_hash AND s.kind = 'site' AND s.key = :site), "
+    "entities = (SELECT count(*) FROM capture_entities ce WHERE ce.value_hash = capture_values.value_hash "
+    "AND NOT EXISTS (SELECT 1 FROM value_spread s WHERE s.value_hash = ce.value_hash AND s.kind = 'entity' "
+    "AND s.key = ce.entity))",
+    "INSERT INTO value_spread SELECT value_hash, 'site', :site, 1 FROM capture_values CROSS JOIN value_stats "
+    "USING (value_hash) WHERE true ON CONFLICT DO UPDATE SET captures = captures + 1",
+    "INSERT INTO value_spread SELECT value_hash, 'entity', entity, 1 FROM capture_entities CROSS JOIN value_stats "
+    "USING (value_hash) WHERE true ON CONFLICT DO UPDATE SET captures = captures + 1",
+    "INSERT INTO value_stats SELECT value_hash, sites, entities, 1, observations FROM capture_values WHERE true "
+    "ON CONFLICT DO UPDATE SET sites = sites + excluded.sites, entities = entities + excluded.entities, "
+    "captures = captures + 1, observations = observations + excluded.observations",
+)
+# Run before the capture's observations are deleted
+REMOVE_VALUE_STATS = (
+    "UPDATE value_spread SET captures = captures - 1 "
+    "WHERE kind = 'site' AND key = :site AND value_hash IN (SELECT value_hash FROM capture_values)",
+    "UPDATE value_spread SET captures = captures - 1 "
+    "WHERE kind = 'entity' AND value_hash IN (SELECT value_hash FROM capture_entities) AND EXISTS (SELECT 1 "
+    "FROM capture_entities ce WHERE ce.value_hash = value_spread.value_hash AND ce.entity = value_spread.key)",
+    # Values without a spread are only in this capture, their value_stats row goes whatever these say
+    "UPDATE capture_values SET sites = EXISTS (SELECT 1 FROM value_spread s "
+    "WHERE s.value_hash = capture_values.value_hash AND s.kind = 'site' AND s.key = :site AND s.captures = 0), "
+    "entities = (SELECT count(*) FROM value_spread s WHERE s.value_hash = capture_values.value_hash "
+    "AND s.kind = 'entity' AND s.captures = 0)",
+    "UPDATE value_stats SET (sites, entities, captures, observations) = "
+    "(SELECT value_stats.sites - cv.sites, value_stats.entities - cv.entities, value_stats.captures - 1, "
+    "value_stats.observations - cv.observations FROM capture_values cv WHERE cv.value_hash = value_stats.value_hash) "
+    "WHERE value_hash IN (SELECT value_hash FROM capture_values)",
+    "DELETE FROM value_stats WHERE captures = 0 AND value_hash IN (SELECT value_hash FROM capture_values)",
+    "DELETE FROM value_spread WHERE captures = 0 AND value_hash IN (SELECT value_hash FROM capture_values)",
+    # Back to a single capture (or none), so no spread
+    "DELETE FROM value_spread WHERE value_hash IN (SELECT value_hash FROM capture_values cv "
+    "WHERE NOT EXISTS (SELECT 1 FROM value_stats s WHERE s.value_hash = cv.value_hash AND s.captures > 1))",
+)
+
+# Rebuilds the spread tables from observations, for indexes written before they existed
+REBUILD_VALUE_STATS = (
+    "DELETE FROM value_spread",
+    "DELETE FROM value_stats",
+    "INSERT INTO value_stats SELECT o.value_hash, count(DISTINCT c.parent_domain), "
+    "count(DISTINCT o.calculated_entity), count(DISTINCT o.capture_id), sum(o.count) "
+    "FROM observations o JOIN captures c USING (capture_id) GROUP BY o.value_hash",
+    "INSERT INTO value_spread SELECT o.value_hash, 'site', c.parent_domain, count(DISTINCT o.capture_id) "
+    "FROM observations o JOIN captures c USING (capture_id) "
+    "WHERE o.value_hash IN (SELECT value_hash FROM value_stats WHERE captures > 1) "
+    "GROUP BY o.value_hash, c.parent_domain",
+    "INSERT INTO value_spread SELECT value_hash, 'entity', calculated_entity, count(DISTINCT capture_id) "
+    "FROM observations WHERE calculated_entity IS NOT NULL "
+    "AND value_hash IN (SELECT value_hash FROM value_stats WHERE captures > 1) GROUP BY value_hash, calculated_entity",
+)
+
+
+def value_hash(value):
+    """64 bit key of a value, the values themselves are stored once in value_text"""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big",
+                          signed=True)
+
+
+def iter_observations(component_rows):
+    """
+    Collapse extracted rows into (value_hash, name, entity, domain, source, analysis, count, value) observations.
+
+    Repeats within a capture are counted rather than stored again. An analyzed row follows the row it analyzes, its
+    verdict ("Base64 encoded", "Hash detected"...) is kept as the analysis of that observation.
+    """
+    observations = {}
+    for _, data in component_rows:
+        request_table = data.request_table
+        last = None
+        for ref, name, value in zip(data.refs, data.names, data.values):
+            if type(name) == str and name.startswith(ANALYZED_PREFIX):
+                if last is not None and last[1] is None:
+                    last[1] = str(value).split(".", 1)[0]
+                continue
+            last = None
+            value = flat_value(value)
+            if value is None:
+                continue
+            if type(value) != str:
+                value = str(value)
+            if not MIN_VALUE_LENGTH <= len(value) <= MAX_VALUE_LENGTH:
+                continue
+            request = request_table[ref]
+            key = (value_hash(value), name if type(name) == str else str(name), request.entity, request.domain,
+                   data.source)
+            last = observations.get(key)
+            if last is None:
+                last = observations[key] = [0, None, value]
+            last[0] += 1
+    for (hashed, name, entity, domain, source), (count, analysis, value) in observations.items():
+        yield hashed, name, entity, domain, source, analysis, count, value
+
+
+class CaptureIndex:
+    """
+    SQLite index of the values seen across every capture parsed, to find identifiers shared between sites and
+    entities without reopening each output.
+
+    Each capture adds one observation per distinct (value, name, entity, domain, source), with its count.
+    value_stats keeps how many sites (parent domains), entities and captures each value was seen in, so the
+    "most widely shared values" query is an index scan. It is updated one capture at a time through value_spread,
+    so adding a capture never recounts the earlier observations of its values (a User-Agent seen on every site
+    would otherwise get slower to index with every capture). Indexing a HAR again replaces its earlier
+    observations, and is skipped if neither the file nor the extraction options changed since.
+    """
+
+    def __init__(self, index_file=DEFAULT_INDEX_FILE):
+        self.index_file = index_file
+        os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+        self.conn = sqlite3.connect(index_file, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Each capture touches pages all over the value, name, entity and domain indexes
+        self.conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(CAPTURE_TABLES)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._upgrade()
+
+    def _upgrade(self):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # Another process may have upgraded it while this one waited for the lock
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                if "options" not in [column[1] for column in self.conn.execute("PRAGMA table_info(captures)")]:
+                    # Captures indexed before options were stored are indexed again on their next run
+                    self.conn.execute("ALTER TABLE captures ADD COLUMN options TEXT")
+                # A new index has nothing to rebuild
+                if version < 2 and self.conn.execute("SELECT 1 FROM captures LIMIT 1").fetchone():
+                    logger.info(f"Upgrading {self.index_file}")
+                    for statement in REBUILD_VALUE_STATS:
+                        self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _update_value_stats(self, statements, capture_id, parent_domain, values, entities):
+        """Apply the ADD/REMOVE_VALUE_STATS statements for one capture, given as (value_hash, observations) and
+        (value_hash, entity) pairs"""
+        self.conn.execute("DELETE FROM capture_values")
+        self.conn.execute("DELETE FROM capture_entities")
+        self.conn.executemany("INSERT INTO capture_values (value_hash, observations) VALUES (?, ?)", values)
+        self.conn.executemany("INSERT INTO capture_entities VALUES (?, ?)", entities)
+        for statement in statements:
+            self.conn.execute(statement, {"capture": capture_id, "site": parent_domain})
+
+    def add_capture(self, har_file, parent_domain, component_rows, entries, options=None):
+        """
+        Index the rows of one capture, returns its capture_id or None when it was already indexed as is.
+        options are the (JSON-able) extraction options the rows came from: a capture indexed from a filtered run is
+        indexed again by a run with other options, rather than skipped with only part of its rows.
+        """
+        har_file = os.path.abspath(har_file)
+        stat = os.stat(har_file)
+        options = json.dumps(options, sort_keys=True)
+        with self.conn:
+            # Takes the write lock up front: a read upgraded to a write can't wait for other writers, SQLite fails
+            # it right away instead, while BEGIN IMMEDIATE waits out the connection timeout
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT capture_id, parent_domain, size, mtime_ns, options, first_observation, "
+                                    "last_observation FROM captures WHERE har_file = ?", (har_file,)).fetchone()
+            if row is not None:
+                if row[1:5] == (parent_domain, stat.st_size, stat.st_mtime_ns, options):
+                    logger.info(f"{har_file} is already indexed")
+                    return None
+                # A capture's observations are inserted in one go, so they are one rowid range
+                old_values = self.conn.execute("SELECT value_hash, sum(count) FROM observations "
+                                               "WHERE rowid BETWEEN ? AND ? GROUP BY value_hash", row[5:]).fetchall()
+                old_entities = self.conn.execute("SELECT DISTINCT value_hash, calculated_entity FROM observations "
+                                                 "WHERE rowid BETWEEN ? AND ? AND calculated_entity IS NOT NULL",
+                                                 row[5:]).fetchall()
+                self._update_value_stats(REMOVE_VALUE_STATS, row[0], row[1], old_values, old_entities)
+                self.conn.execute("DELETE FROM observations WHERE rowid BETWEEN ? AND ?", row[5:])
+                self.conn.execute("DELETE FROM captures WHERE capture_id = ?", (row[0],))
+
+            capture_id = self.conn.execute(
+                "INSERT INTO captures (har_file, parent_domain, size, mtime_ns, entries, indexed_at, options) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (har_file, parent_domain, stat.st_size, stat.st_mtime_ns, entries, time.time(), options)).lastrowid
+            observations = list(iter_observations(component_rows))
+            self.conn.executemany("INSERT OR IGNORE INTO value_text VALUES (?, ?)",
+                                  ((o[0], o[7]) for o in observations))
+            first = self.conn.execute("SELECT coalesce(max(rowid), 0) + 1 FROM observations").fetchone()[0]
+            self.conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (o[:6] + (capture_id, o[6]) for o in observations))
+            self.conn.execute("UPDATE captures SET first_observation = ?, last_observation = ? WHERE capture_id = ?",
+                              (first, first + len(observations) - 1, capture_id))
+            values = {}
+            entities = set()
+            for o in observations:
+                values[o[0]] = values.get(o[0], 0) + o[6]
+                if o[2] is not None:
+                    entities.add((o[0], o[2]))
+            self._update_value_stats(ADD_VALUE_STATS, capture_id, parent_domain, values.items(), entities)
+        logger.info(f"Indexed {len(observations)} observations from {har_file} into {self.index_file}")
+        return capture_id
+
+    def add_parser(self, parser):
+        return self.add_capture(parser.har_file, parser.parent_domain, parser.component_rows(),
+                                len(parser.request_table), parser.extraction_fingerprint())
+
+    def _rows(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def lookup(self, value):
+        """Every capture, name, entity and domain a value was seen with"""
+        return self._rows("SELECT c.parent_domain, c.har_file, o.name, o.calculated_entity, o.calculated_domain, "
+                          "o.source, o.analysis, o.count FROM observations o JOIN captures c USING (capture_id) "
+                          "WHERE o.value_hash = ? ORDER BY c.parent_domain, o.calculated_entity, o.name",
+                          (value_hash(value),))
+
+    def shared(self, min_sites=2, min_entities=1, name=None, entity=None, domain=None, analysis=None, limit=50):
+        """
+        Values seen on at least min_sites sites and min_entities entities, most widely shared first.
+        name, entity and domain keep values seen with that name/entity/domain, analysis with a verdict starting so.
+        """
+        filters, params = [], [min_sites, min_entities]
+        for column, wanted in (("name", name), ("calculated_entity", entity), ("calculated_domain", domain)):
+            if wanted is not None:
+                filters.append(f"o.{column} = ?")
+                params.append(wanted)
+        if analysis is not None:
+            filters.append("o.analysis LIKE ? || '%'")
+            params.append(analysis)
+        where = ""
+        if filters:
+            # Checked per candidate, values seen on more than one site are a small part of the index
+            where = (f"AND EXISTS (SELECT 1 FROM observations o WHERE o.value_hash = s.value_hash "
+                     f"AND {' AND '.join(filters)})")
+        params.append(limit)
+        return self._rows(
+            "SELECT t.value, s.sites, s.entities, s.captures, s.observations, "
+            "(SELECT group_concat(DISTINCT o.name) FROM observations o WHERE o.value_hash = s.value_hash) AS names, "
+            "(SELECT group_concat(DISTINCT o.calculated_entity) FROM observations o "
+            "WHERE o.value_hash = s.value_hash) AS entity_names "
+            f"FROM value_stats s JOIN value_text t USING (value_hash) WHERE s.sites >= ? AND s.entities >= ? {where} "
+            "ORDER BY s.sites DESC, s.entities DESC LIMIT ?", params)
+
+    def captures(self):
+        return self._rows("SELECT capture_id, har_file, parent_domain, entries, indexed_at, "
+                          "last_observation - first_observation + 1 AS observations FROM captures ORDER BY capture_id")
+
+    def close(self):
+        self.conn.close()
+
+
+def format_rows(rows):
+    if not rows:
+        return "No results"
+    columns = list(rows[0])
+    widths = [min(max(len(str(row[column])) for row in rows + [dict(zip(columns, columns))]), 60)
+              for column in columns]
+    lines = ["  ".join(f"{column:<{width}}" for column, width in zip(columns, widths))]
+    for row in rows:
+        lines.append("  ".join(f"{str(row[column])[:width]:<{width}}" for column, width in zip(columns, widths)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="harryparser query",
+                                     description="Look up values across every capture in the HARryParser index")
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_FILE,
+                        help=f"Index file (default: {DEFAULT_INDEX_FILE})")
+    parser.add_argument("--json", action="store_true", default=False, help="Print the results as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    value_parser = commands.add_parser("value", help="Where a value was seen")
+    value_parser.add_argument("value", type=str)
+    shared_parser = commands.add_parser("shared", help="Values seen across the most sites and entities")
+    shared_parser.add_argument("--min_sites", type=int, default=2, help="Seen on at least this many sites (default: 2)")
+    shared_parser.add_argument("--min_entities", type=int, default=1,
+                               help="Seen with at least this many entities (default: 1)")
+    shared_parser.add_argument("--name", type=str, default=None, help="Only values seen under this name")
+    shared_parser.add_argument("--entity", type=str, default=None, help="Only values seen with this entity")
+    shared_parser.add_argument("--domain", type=str, default=None, help="Only values seen with this domain")
+    shared_parser.add_argument("--analysis", type=str, default=None,
+                               help="Only values analyzed as this (Base64, Hash, Date...)")
+    shared_parser.add_argument("--limit", type=int, default=50, help="Most results shown (default: 50)")
+    commands.add_parser("captures", help="The captures indexed so far")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.index):
+        parser.error(f"No index at {args.index}, it is created by running harryparser on a HAR file")
+    index = CaptureIndex(args.index)
+    try:
+        if args.command == "value":
+            rows = index.lookup(args.value)
+        elif args.command == "shared":
+            rows = index.shared(args.min_sites, args.min_entities, args.name, args.entity, args.domain,
+                                args.analysis, args.limit)
+        else:
+            rows = index.captures()
+    finally:
+        index.close()
+    print(json.dumps(rows, indent=2) if args.json else format_rows(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import re
+
+BOUNDARY_RE = re.compile(r'boundary=(?:"([^"]+)"|([^;\s]+))', re.IGNORECASE)
+# Parameters of a Content-Disposition header, e.g. `form-data; name="field"; filename="a.txt"`
+PARAM_RE = re.compile(r';\s*([\w\-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;\s]*))')
+ESCAPE_RE = re.compile(r'\\(.)')
+
+
+def get_boundary(content_type):
+    m = BOUNDARY_RE.search(content_type or "")
+    return (m.group(1) or m.group(2)) if m else None
+
+
+class MultipartPart:
+    """One part of a multipart body. The payload is a memoryview into the body, it is only decoded on request."""
+    __slots__ = ("headers", "name", "filename", "content_type", "payload")
+
+    def __init__(self, headers, payload):
+        self.headers = headers
+        self.payload = payload
+        self.content_type = headers.get("content-type")
+        params = {}
+        for m in PARAM_RE.finditer(headers.get("content-disposition", "")):
+            value = m.group(3) if m.group(2) is None else ESCAPE_RE.sub(r'\1', m.group(2))
+            params[m.group(1).lower()] = value
+        self.name = params.get("name")
+        self.filename = params.get("filename")
+
+    def text(self, encoding="utf-8"):
+        return str(self.payload, encoding, "replace")
+
+    def __repr__(self):
+        return f"MultipartPart(name={self.name!r}, filename={self.filename!r}, {len(self.payload)} bytes)"
+
+
+def _parse_headers(body, start, end):
+    """Read header lines from start up to the first blank line, returns (headers, offset of the payload)"""
+    headers = {}
+    i = start
+    while i < end:
+        line_end = body.find(b"\n", i, end)
+        if line_end == -1:
+            line_end = end
+        line = body[i:line_end].rstrip(b"\r")
+        i = line_end + 1
+        if not line:
+            return headers, min(i, end)
+        name, sep, value = line.decode("utf-8", "replace").partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    # No blank line, the part has headers only
+    return headers, end
+
+
+def iter_multipart(body, boundary):
+    """
+    Yield the parts of a multipart body (bytes) split on boundary.
+
+    Only the delimiters are searched for, payloads are handed out as memoryview slices of body so nothing is copied
+    until a caller decodes a part. Both CRLF and bare LF line breaks are accepted, a body cut off before its closing
+    delimiter yields what is there.
+    """
+    view = memoryview(body)
+    delimiter = b"--" + boundary.encode()
+    pos = body.find(delimiter)
+    while pos != -1:
+        pos += len(delimiter)
+        if body[pos:pos + 2] == b"--":
+            return
+        # Skip transport padding and the line break after the delimiter
+        eol = body.find(b"\n", pos)
+        if eol == -1:
+            return
+        start = eol + 1
+        # The line break before the next delimiter belongs to the delimiter, not the payload
+        next_pos = body.find(b"\n" + delimiter, start - 1)
+        end = len(body) if next_pos == -1 else next_pos
+        if end > start and body[end - 1] == 13:
+            end -= 1
+        end = max(end, start)
+        headers, payload_start = _parse_headers(body, start, end)
+        yield MultipartPart(headers, view[payload_start:end])
+        pos = next_pos if next_pos == -1 else next_pos + 1
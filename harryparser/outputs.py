@@ -0,0 +1,269 @@
+import csv
+import json
+import os
+import sqlite3
+import traceback
+
+try:
+    from .helpers import remove_illegal_chars
+except:
+    from helpers import remove_illegal_chars
+
+
+# Shared schema for every extracted row, whatever the output format
+COLUMNS = ["url", "request_id", "name", "value", "calculated_domain", "calculated_entity", "source"]
+DNS_COLUMNS = ["subdomain", "record_type", "ip_address", "key", "value", "source_ip", "target_url"]
+# Column titles used in the DNS sheet of the workbook
+DNS_HEADER = ['Subdomain', 'Record Type', 'IP Address', 'Key', 'Value', 'Source IP', 'Target URL']
+
+# Value types openpyxl can write without any conversion
+CELL_TYPES = (str, int, float, bool, type(None))
+
+
+def flat_value(value):
+    # Lists and dicts (e.g. unflattened post data) are stored as their string form, like the workbook does
+    if isinstance(value, (list, dict, tuple, bytes)):
+        return str(value)
+    return value
+
+
+def related_file(output_file, suffix):
+    # x.csv -> x_dns.csv, for formats that keep one table per file
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_{suffix}{ext}"
+
+
+class OutputSink:
+    """
+    Destination for extracted rows. Rows arrive per component (the sheet_name), possibly over several calls,
+    each in `columns` order, followed by the DNS rows in DNS_COLUMNS order. Nothing is written until open()
+    and close() must be called to flush the output.
+    """
+    extension = None
+
+    def __init__(self, output_file, columns=COLUMNS):
+        self.output_file = output_file
+        self.columns = columns
+
+    def open(self):
+        pass
+
+    def write_rows(self, sheet_name, rows):
+        raise NotImplementedError
+
+    def write_dns_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class XlsxSink(OutputSink):
+    extension = "xlsx"
+
+    def open(self):
+        import openpyxl
+
+        # Write-only mode streams each sheet to disk as rows are appended, so the workbook is never held in memory
+        # (only with lxml installed, openpyxl's fallback writer still builds each sheet in memory)
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.parent_sheet = self.wb.create_sheet("Everything")
+        self.parent_sheet.append(self.columns)
+        self.sheets = {}
+
+    def write_rows(self, sheet_name, rows):
+        sheet = self.sheets.get(sheet_name)
+        if sheet is None:
+            sheet = self.sheets[sheet_name] = self.wb.create_sheet(sheet_name)
+            sheet.append(self.columns)
+
+        for data_row in rows:
+            # Sanitize once and write the same values to both sheets
+            values = [remove_illegal_chars(value) for value in data_row]
+            # A failed append breaks a write-only sheet, so anything unusual is checked up front
+            if not all(type(value) in CELL_TYPES for value in values):
+                values = self._writable_values(sheet, values, data_row)
+            sheet.append(values)
+            self.parent_sheet.append(values)
+
+    def write_dns_rows(self, rows):
+        subs_sheet = self.wb.create_sheet("DNS")
+        subs_sheet.append(DNS_HEADER)
+        for row in rows:
+            subs_sheet.append(row)
+
+    def close(self):
+        self.wb.save(self.output_file)
+
+    @staticmethod
+    def _writable_values(sheet, values, data_row):
+        from openpyxl.cell import WriteOnlyCell
+
+        # Blank out only the values openpyxl can't store, the rest of the row is still written
+        writable = []
+        for value in values:
+            try:
+                WriteOnlyCell(sheet, value=value)
+                writable.append(value)
+            except:
+                print("ERROR ON ROW", value)
+                print("ERROR ON ROW FULL", data_row)
+                traceback.print_exc()
+                writable.append(None)
+        return writable
+
+
+class CsvSink(OutputSink):
+    extension = "csv"
+
+    def open(self):
+        self.fout = open(self.output_file, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.fout)
+        self.writer.writerow(self.columns)
+
+    def write_rows(self, sheet_name, rows):
+        self.writer.writerows([flat_value(value) for value in row] for row in rows)
+
+    def write_dns_rows(self, rows):
+        with open(related_file(self.output_file, "dns"), "w", newline="", encoding="utf-8") as fout:
+            writer = csv.writer(fout)
+            writer.writerow(DNS_COLUMNS)
+            writer.writerows(rows)
+
+    def close(self):
+        self.fout.close()
+
+
+class JsonlSink(OutputSink):
+    extension = "jsonl"
+
+    def open(self):
+        self.fout = open(self.output_file, "w", encoding="utf-8")
+
+    @staticmethod
+    def _write(fout, columns, rows):
+        for row in rows:
+            fout.write(json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False))
+            fout.write("\n")
+
+    def write_rows(self, sheet_name, rows):
+        self._write(self.fout, self.columns, rows)
+
+    def write_dns_rows(self, rows):
+        with open(related_file(self.output_file, "dns"), "w", encoding="utf-8") as fout:
+            self._write(fout, DNS_COLUMNS, rows)
+
+    def close(self):
+        self.fout.close()
+
+
+class SqliteSink(OutputSink):
+    extension = "sqlite"
+    table = "har_data"
+    dns_table = "dns"
+
+    def open(self):
+        self.conn = sqlite3.connect(self.output_file)
+        # The file is rebuilt from scratch each run, durability of partial writes doesn't matter
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        for table, columns in ((self.table, self.columns), (self.dns_table, DNS_COLUMNS)):
+            self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+
+    def _insert(self, table, columns, rows):
+        placeholders = ", ".join("?" * len(columns))
+        self.conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})",
+                              ([flat_value(value) for value in row] for row in rows))
+
+    def write_rows(self, sheet_name, rows):
+        self._insert(self.table, self.columns, rows)
+
+    def write_dns_rows(self, rows):
+        self._insert(self.dns_table, DNS_COLUMNS, rows)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def import_pyarrow():
+    """pyarrow is optional and slow to import, so it is only imported once parquet output is asked for"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required for parquet output, install it with `pip install pyarrow`")
+    return pyarrow
+
+
+class ParquetSink(OutputSink):
+    extension = "parquet"
+    batch_size = 50000
+
+    def __init__(self, output_file, columns=COLUMNS):
+        self.pyarrow = import_pyarrow()
+        super().__init__(output_file, columns)
+
+    def _schema(self, columns):
+        pyarrow = self.pyarrow
+        return pyarrow.schema([(column, pyarrow.int64() if column == "request_id" else pyarrow.string())
+                               for column in columns])
+
+    @staticmethod
+    def _value(column, value):
+        if value is None or column == "request_id":
+            return value
+        return str(value)
+
+    def _write(self, writer, columns, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write_batch(writer, columns, batch)
+                batch = []
+        if batch:
+            self._write_batch(writer, columns, batch)
+
+    def _write_batch(self, writer, columns, batch):
+        arrays = {column: [self._value(column, row[i]) for row in batch] for i, column in enumerate(columns)}
+        writer.write_table(self.pyarrow.Table.from_pydict(arrays, schema=writer.schema))
+
+    def open(self):
+        self.writer = self.pyarrow.parquet.ParquetWriter(self.output_file, self._schema(self.columns))
+
+    def write_rows(self, sheet_name, rows):
+        self._write(self.writer, self.columns, rows)
+
+    def write_dns_rows(self, rows):
+        with self.pyarrow.parquet.ParquetWriter(related_file(self.output_file, "dns"),
+                                           self._schema(DNS_COLUMNS)) as writer:
+            self._write(writer, DNS_COLUMNS, rows)
+
+    def close(self):
+        self.writer.close()
+
+
+OUTPUT_FORMATS = {
+    "xlsx": XlsxSink,
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+    "parquet": ParquetSink,
+}
+
+
+def get_sink(output_format, output_file, columns=COLUMNS):
+    try:
+        sink_class = OUTPUT_FORMATS[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    return sink_class(output_file, columns)
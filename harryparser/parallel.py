@@ -0,0 +1,104 @@
+import itertools
+import json
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .harryparser import HarParser
+    from .har_reader import iter_har_entries
+    from .tds import TdsIndex
+    from .stats import Stats
+except:
+    from harryparser import HarParser
+    from har_reader import iter_har_entries
+    from tds import TdsIndex
+    from stats import Stats
+
+# Entries per task, big enough to amortize the round trip to a worker, small enough to keep every worker busy
+DEFAULT_CHUNK_SIZE = 256
+# Chunks queued per worker, bounds how much of a capture is held in memory while waiting on results
+CHUNKS_IN_FLIGHT = 4
+
+# Per-process state, filled once by _init_worker and reused for every chunk that worker extracts
+_worker_state = {}
+
+
+def _init_worker(parser_options, stats_options):
+    _worker_state["tds_index"] = TdsIndex.load(parser_options["tds_file"])
+    _worker_state["parser_options"] = parser_options
+    _worker_state["stats_options"] = stats_options
+
+
+def _extract_chunk(first_request_id, raw_entries):
+    """
+    Decode and extract a run of entries, returns the parser segment, the worker stats (or None) and the domain
+    cache (hits, misses) of the chunk
+    """
+    stats_options = _worker_state["stats_options"]
+    h = HarParser(None, None, check_dns=False, tds_index=_worker_state["tds_index"],
+                  stats=Stats(**stats_options) if stats_options is not None else None,
+                  **_worker_state["parser_options"])
+    mark = h.mark()
+    cache_before = h.domain_extractor.cache_info()
+    for request_id, raw_entry in enumerate(raw_entries, first_request_id):
+        h.extract_entry(json.loads(raw_entry), request_id)
+    cache_after = h.domain_extractor.cache_info()
+
+    request_table, stores, subdomains = h.segment_since(mark)
+    # Every entry adds one request, so in the full table this chunk's requests start at first_request_id - 1
+    base = first_request_id - 1
+    if base:
+        stores = [(array("I", (ref + base for ref in refs)), names, values) for refs, names, values in stores]
+    return ((request_table, stores, subdomains), h.stats.report() if stats_options is not None else None,
+            (cache_after.hits - cache_before.hits, cache_after.misses - cache_before.misses))
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def extract_parallel(parser, jobs, chunk_size=None):
+    """
+    Extract parser.har_file across `jobs` processes, leaving parser holding exactly what a serial extract would.
+
+    Entries are read here without being decoded and sent to the workers in chunks. Each worker loads its own TDS
+    index and domain extractor, decodes and extracts its chunk, and the chunks are added back in request_id order.
+    Returns the (hits, misses) of the workers' domain caches, the lookups all happen there.
+    """
+    jobs = jobs or os.cpu_count()
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    parser_options = {"parent_domain": parser.parent_domain, "tds_file": parser.tds_file,
+                      "extract_responses": parser.extract_responses, "max_body_size": parser.max_body_size,
+                      "filters": parser.filters, **parser.flatten_options}
+    stats_options = {"trace_memory": parser.stats.trace_memory} if parser.timed else None
+    raw_entries = parser.stats.iter_timed("har_load", iter_har_entries(parser.har_file, raw=True))
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(parser_options, stats_options)) as executor:
+        pending = deque()
+        request_id = 0
+        cache = [0, 0]
+
+        def merge_oldest():
+            segment, report, (hits, misses) = pending.popleft().result()
+            parser.add_segment(segment)
+            if report is not None:
+                parser.stats.merge(report)
+            cache[0] += hits
+            cache[1] += misses
+
+        for chunk in iter_chunks(raw_entries, chunk_size):
+            pending.append(executor.submit(_extract_chunk, request_id + 1, chunk))
+            request_id += len(chunk)
+            if len(pending) >= jobs * CHUNKS_IN_FLIGHT:
+                merge_oldest()
+        while pending:
+            merge_oldest()
+    return tuple(cache)
@@ -0,0 +1,75 @@
+import sys
+from array import array
+
+# Names up to this length are interned, the same few header/cookie/param names repeat on every request
+INTERN_MAX_LENGTH = 128
+
+
+class RequestInfo:
+    """The per-request part of a row, stored once and shared by every row extracted from that request"""
+    __slots__ = ("url", "request_id", "domain", "entity")
+
+    def __init__(self, url, request_id, domain, entity):
+        self.url = url
+        self.request_id = request_id
+        self.domain = domain
+        self.entity = entity
+
+
+def intern_name(name):
+    if type(name) == str and len(name) <= INTERN_MAX_LENGTH:
+        return sys.intern(name)
+    return name
+
+
+class RowStore:
+    """
+    Columnar buffer for the rows of one component (one sheet).
+
+    Each row only keeps an index into the shared request table plus its name and value, the source is fixed per
+    store. Iterating yields full rows in outputs.COLUMNS order, built on the fly.
+    """
+
+    def __init__(self, source, request_table):
+        self.source = source
+        self.request_table = request_table
+        self.refs = array("I")
+        self.names = []
+        self.values = []
+
+    def append(self, ref, name, value):
+        self.refs.append(ref)
+        self.names.append(intern_name(name))
+        self.values.append(value)
+
+    def columns(self, start=0):
+        """The raw (refs, names, values) columns from row `start` on, e.g. to persist only new rows"""
+        return self.refs[start:], self.names[start:], self.values[start:]
+
+    def extend_columns(self, refs, names, values):
+        self.refs.extend(refs)
+        self.names.extend(names)
+        self.values.extend(values)
+
+    def row(self, i):
+        request = self.request_table[self.refs[i]]
+        return [request.url, request.request_id, self.names[i], self.values[i], request.domain, request.entity,
+                self.source]
+
+    def __len__(self):
+        return len(self.refs)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.refs)
+        return self.row(i)
+
+    def __iter__(self):
+        request_table = self.request_table
+        source = self.source
+        for ref, name, value in zip(self.refs, self.names, self.values):
+            request = request_table[ref]
+            yield [request.url, request.request_id, name, value, request.domain, request.entity, source]
+
+    def __repr__(self):
+        return f"RowStore({self.source!r}, {len(self)} rows)"
@@ -0,0 +1,389 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from .harryparser import HarParser, output_file_name
+    from .tds import TdsIndex
+    from .domains import default_extractor
+    from .outputs import OUTPUT_FORMATS
+    from .logger import logger
+    from .index import DEFAULT_INDEX_FILE
+    from .filters import ExtractionFilter
+except:
+    from harryparser import HarParser, output_file_name
+    from tds import TdsIndex
+    from domains import default_extractor
+    from outputs import OUTPUT_FORMATS
+    from logger import logger
+    from index import DEFAULT_INDEX_FILE
+    from filters import ExtractionFilter
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Finished jobs kept around so their status can still be polled
+MAX_FINISHED_JOBS = 1000
+# Window for the recent throughput figures in /metrics
+THROUGHPUT_WINDOW = 60
+
+# HarParser options a job may set, with their types. Paths (checkpoints, index) are the service's to choose.
+JOB_OPTIONS = {"output_format": str, "check_dns": bool, "stream": bool, "extract_responses": bool,
+               "max_body_size": int, "index_lists": bool, "incremental": bool, "filters": dict}
+
+# Worker pools are started (and restarted) from request handler threads. Forking a process with other threads
+# running can leave the child with locks those threads held, so workers come from a fork server (spawned where
+# there is none).
+MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Per-process state, filled once by _init_worker and kept warm across every job that worker runs
+_worker_state = {}
+
+
+def confined_path(path, root):
+    """path resolved under root (relative paths are taken from root), raises ValueError if it ends up outside"""
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath((root, resolved)) != root:
+        raise ValueError(f"{path} is outside of {root}")
+    return resolved
+
+
+def _init_worker(tds_file):
+    _worker_state["tds_file"] = tds_file
+    _worker_state["tds_index"] = TdsIndex.load(tds_file)
+    # Builds the suffix list trie now rather than during the first job
+    default_extractor().extract("https://www.example.com/")
+
+
+def _run_job(har_file, output_file, parent_domain, options):
+    start = time.perf_counter()
+    if "filters" in options:
+        options = {**options, "filters": ExtractionFilter(**options["filters"])}
+    h = HarParser(har_file, output_file, parent_domain, _worker_state["tds_file"],
+                  tds_index=_worker_state["tds_index"], **options)
+    h.extract_entries()
+    return {"entries": len(h.request_table), "rows": sum(len(data) for _, data in h.component_rows()),
+            "subdomains": len(h.subdomains), "seconds": round(time.perf_counter() - start, 3)}
+
+
+class Job:
+    __slots__ = ("id", "har_file", "output_file", "parent_domain", "options", "future", "submitted", "finished",
+                 "result", "error")
+
+    def __init__(self, job_id, har_file, output_file, parent_domain, options):
+        self.id = job_id
+        self.har_file = har_file
+        self.output_file = output_file
+        self.parent_domain = parent_domain
+        self.options = options
+        self.future = None
+        self.submitted = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return "failed" if self.error else "done"
+        return "running" if self.future.running() else "queued"
+
+    def to_dict(self):
+        return {"id": self.id, "status": self.status, "har_file": self.har_file, "output_file": self.output_file,
+                "parent_domain": self.parent_domain, "options": self.options, "submitted": self.submitted,
+                "finished": self.finished, "result": self.result, "error": self.error}
+
+
+class HarService:
+    """
+    Runs parse jobs on a pool of worker processes that stay up between jobs.
+
+    Each worker loads the TDS index and the domain extractor once, and keeps its analyzer memo and nameserver
+    cache warm for every later job, so a job only pays for its own HAR. DNS answers are shared between workers
+    through the on-disk DNS cache, which each scan opens for its own duration.
+    """
+
+    def __init__(self, tds_file, workers=None, output_dir="output", index_file=None, input_dir=None):
+        self.tds_file = tds_file
+        # Every file a job writes (output, checkpoints) is under output_dir
+        self.output_dir = output_dir
+        self.checkpoint_dir = os.path.join(output_dir, "checkpoints")
+        # When set, jobs may only read HAR files under it
+        self.input_dir = input_dir
+        # Every job is added to this index, None for no index
+        self.index_file = index_file
+        # Built (or refreshed) once here, the workers then all load it from the on-disk cache
+        self.tds_entries = len(TdsIndex.load(tds_file))
+        self.workers = workers or os.cpu_count()
+        self.executor = self._new_executor()
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.entries = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+        # (finished, entries) of recently finished jobs
+        self.recent = deque()
+
+    def submit(self, request):
+        """Queue a job from its JSON request, raises ValueError when the request is invalid"""
+        if not isinstance(request, dict):
+            raise ValueError("Expected a JSON object")
+        har_file = request.get("har_file")
+        parent_domain = request.get("parent_domain")
+        if not isinstance(har_file, str) or not isinstance(parent_domain, str):
+            raise ValueError("har_file and parent_domain are required")
+        if self.input_dir:
+            har_file = confined_path(har_file, self.input_dir)
+        if not os.path.isfile(har_file):
+            raise ValueError(f"HAR file not found: {har_file}")
+        options = {}
+        for name, value in (request.get("options") or {}).items():
+            if name not in JOB_OPTIONS:
+                raise ValueError(f"Unknown option: {name}")
+            if not isinstance(value, JOB_OPTIONS[name]):
+                raise ValueError(f"Option {name} must be a {JOB_OPTIONS[name].__name__}")
+            options[name] = value
+        if "filters" in options:
+            try:
+                ExtractionFilter(**options["filters"])
+            except (TypeError, ValueError, re.error) as e:
+                raise ValueError(f"Invalid filters: {e}")
+        if self.index_file:
+            options["index_file"] = self.index_file
+        if options.get("incremental"):
+            # One directory per HAR, captures with the same file name don't share checkpoints
+            har_key = hashlib.sha256(os.path.abspath(har_file).encode("utf-8", "surrogatepass")).hexdigest()[:16]
+            options["checkpoint_dir"] = os.path.join(self.checkpoint_dir, har_key)
+        output_format = options.get("output_format", "xlsx")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+
+        job_id = str(next(self.job_ids))
+        output_file = request.get("output_file")
+        os.makedirs(self.output_dir, exist_ok=True)
+        if output_file:
+            if not isinstance(output_file, str):
+                raise ValueError("output_file must be a str")
+            output_file = confined_path(output_file, self.output_dir)
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        else:
+            output_file = output_file_name(self.output_dir, parent_domain, output_format, f"_{job_id}")
+        job = Job(job_id, har_file, output_file, parent_domain, options)
+        executor = self.executor
+        try:
+            job.future = executor.submit(_run_job, har_file, output_file, parent_domain, options)
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory) since the last job, the pool is unusable from then on
+            executor = self._replace_executor(executor)
+            job.future = executor.submit(_run_job, har_file, output_file, parent_domain, options)
+        # Only jobs that made it to a pool are listed, so every listed job has a future
+        with self.lock:
+            self.jobs[job_id] = job
+        job.future.add_done_callback(lambda future: self._finished(job, future, executor))
+        logger.info(f"Job {job_id} queued: {har_file} -> {output_file}")
+        return job
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(MP_CONTEXT),
+                                   initializer=_init_worker, initargs=(self.tds_file,))
+
+    def _replace_executor(self, broken):
+        """Swap the broken pool for a new one, once however many jobs notice it. The broken pool stops itself."""
+        with self.lock:
+            if self.executor is broken:
+                logger.warning("A worker process died, restarting the worker pool")
+                self.executor = self._new_executor()
+            return self.executor
+
+    def _finished(self, job, future, executor):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # Every job queued on that pool fails the same way, later jobs go to a new pool
+            error = RuntimeError("The worker process running the job died (killed or out of memory)")
+            self._replace_executor(executor)
+        with self.lock:
+            job.finished = time.time()
+            if error is not None:
+                job.error = f"{type(error).__name__}: {error}"
+                self.failed += 1
+            else:
+                job.result = future.result()
+                self.completed += 1
+                self.entries += job.result["entries"]
+                self.rows += job.result["rows"]
+                self.busy_seconds += job.result["seconds"]
+                self.recent.append((job.finished, job.result["entries"]))
+            finished = [job_id for job_id, j in self.jobs.items() if j.finished is not None]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+        if error is not None:
+            logger.error(f"Job {job.id} failed: {job.error}")
+        else:
+            logger.info(f"Job {job.id} done in {job.result['seconds']}s, {job.result['entries']} entries")
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def metrics(self):
+        now = time.time()
+        with self.lock:
+            while self.recent and self.recent[0][0] < now - THROUGHPUT_WINDOW:
+                self.recent.popleft()
+            statuses = [job.status for job in self.jobs.values()]
+            uptime = now - self.started
+            return {
+                "workers": self.workers,
+                "queue_depth": statuses.count("queued"),
+                "running": statuses.count("running"),
+                "completed": self.completed,
+                "failed": self.failed,
+                "entries": self.entries,
+                "rows": self.rows,
+                "uptime_seconds": round(uptime, 1),
+                "jobs_per_minute": round(self.completed / uptime * 60, 2) if uptime else 0,
+                "recent_jobs_per_minute": round(len(self.recent) * 60 / THROUGHPUT_WINDOW, 2),
+                "recent_entries_per_second": round(sum(entries for _, entries in self.recent) / THROUGHPUT_WINDOW, 1),
+                "mean_job_seconds": round(self.busy_seconds / self.completed, 3) if self.completed else None,
+                "tds_entries": self.tds_entries,
+            }
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the service:
+        POST /jobs        {"har_file", "parent_domain", "output_file"?, "options"?, "wait"?} -> the job
+        GET  /jobs/<id>   the job, with its status, result or error
+        GET  /metrics     queue depth, job counts and throughput
+        GET  /health      {"status": "ok"}
+    """
+    server_version = "harryparser"
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/metrics":
+            self._send(200, service.metrics())
+        elif self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path.startswith("/jobs/"):
+            job = service.job(self.path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "Unknown job"})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send(404, {"error": "Not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+            job = self.server.service.submit(request)
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except BrokenProcessPool as e:
+            # Even a new pool fails, workers can't start at all
+            self._send(503, {"error": f"No worker available: {e}"})
+            return
+        if request.get("wait"):
+            # Errors end up in the job itself
+            job.future.exception()
+            while job.finished is None:
+                time.sleep(0.01)
+            self._send(200, job.to_dict())
+        else:
+            self._send(202, job.to_dict())
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """HTTP server for service on host:port, or on a Unix socket when socket_path is given"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="harryparser serve",
+                                     description="Run HARryParser as a service that takes parse jobs over HTTP")
+    parser.add_argument("-t", "--tds_file", type=str, default="harryparser/tds.json", help="TDS JSON file")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes running jobs (default: CPU count)")
+    parser.add_argument("-o", "--output_dir", type=str, default="output",
+                        help="Where job outputs and checkpoints go, a job's output_file is relative to it")
+    parser.add_argument("-i", "--input_dir", type=str, default=None,
+                        help="Only accept HAR files under this directory (default: any readable file)")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", type=str, default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--index", type=str, default=DEFAULT_INDEX_FILE,
+                        help=f"Cross-capture index jobs are added to (default: {DEFAULT_INDEX_FILE})")
+    parser.add_argument("--no_index", action="store_true", default=False, help="Don't add jobs to the index")
+    args = parser.parse_args(argv)
+
+    service = HarService(args.tds_file, args.workers, args.output_dir, None if args.no_index else args.index,
+                         args.input_dir)
+    server = make_server(service, args.host, args.port, args.socket)
+    logger.info(f"Serving on {args.socket or f'http://{args.host}:{server.server_address[1]}'} "
+                f"with {service.workers} workers")
+    # Stopped by a supervisor the same way as by Ctrl-C, so the socket and the pool are cleaned up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close(wait=False)
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import contextlib
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from .logger import logger
+except:
+    from logger import logger
+
+
+def max_rss_mb():
+    """Peak resident memory of this process so far, None where the platform can't tell"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return round(rss / (1 << 20) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+class Stats:
+    """
+    Wall time, call counts and peak memory per phase of a run, plus free-form counters.
+
+    Coarse phases (loading, output) use phase(), which also records peak traced memory when trace_memory is on.
+    Hot paths (per component, per analyzer call) add their own timings with add(), which only costs a dict update.
+    Phases may nest, a nested phase's time is also part of its parent's.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        # name -> [seconds, count]
+        self.phases = {}
+        # name -> peak traced bytes
+        self.peaks = {}
+        self.counters = Counter()
+        self._stack = []
+
+    def add(self, name, seconds, count=1):
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [seconds, count]
+        else:
+            phase[0] += seconds
+            phase[1] += count
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        tracing = self.trace_memory
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if self._stack:
+                # reset_peak is global, save the parent's peak so far before it is lost
+                self._stack[-1] = max(self._stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._stack.append(0)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if tracing:
+                peak = max(self._stack.pop(), tracemalloc.get_traced_memory()[1])
+                self.peaks[name] = max(self.peaks.get(name, 0), peak)
+                if self._stack:
+                    self._stack[-1] = max(self._stack[-1], peak)
+
+    def iter_timed(self, name, iterable):
+        """Yield from iterable, adding the time spent producing each item to phase `name`"""
+        iterator = iter(iterable)
+        perf_counter = time.perf_counter
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, perf_counter() - start, 0)
+                return
+            self.add(name, perf_counter() - start)
+            yield item
+
+    def report(self):
+        return {
+            "phases": {name: {"seconds": round(seconds, 6), "count": count,
+                              "peak_mb": round(self.peaks[name] / (1 << 20), 2) if name in self.peaks else None}
+                       for name, (seconds, count) in self.phases.items()},
+            "counters": dict(self.counters),
+            "max_rss_mb": max_rss_mb(),
+        }
+
+    def merge(self, report):
+        """Fold in a report() from another process, times and counts add up, peaks keep the maximum"""
+        for name, phase in report["phases"].items():
+            self.add(name, phase["seconds"], phase["count"])
+            if phase["peak_mb"] is not None:
+                self.peaks[name] = max(self.peaks.get(name, 0), int(phase["peak_mb"] * (1 << 20)))
+        self.counters.update(report["counters"])
+
+    def summary(self):
+        lines = [f"{'Phase':<32}{'Seconds':>12}{'Count':>12}{'Peak MB':>10}"]
+        for name, (seconds, count) in self.phases.items():
+            peak = f"{self.peaks[name] / (1 << 20):.1f}" if name in self.peaks else "-"
+            lines.append(f"{name:<32}{seconds:>12.3f}{count:>12}{peak:>10}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'Counter':<32}{'Value':>12}")
+            for name, value in self.counters.items():
+                lines.append(f"{name:<32}{value:>12}")
+        rss = max_rss_mb()
+        if rss is not None:
+            lines.append("")
+            lines.append(f"Max RSS: {rss:.1f} MB")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with open(path, "w") as fout:
+            json.dump(self.report(), fout, indent=2)
+
+
+@contextlib.contextmanager
+def profiled(profile_file):
+    """Run the block under cProfile and dump the stats to profile_file (for pstats/snakeviz), no-op without a file"""
+    if not profile_file:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        logger.info(f"Profile written to {profile_file}")
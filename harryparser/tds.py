@@ -0,0 +1,114 @@
+import hashlib
+import json
+import marshal
+import os
+
+try:
+    from .logger import logger
+except:
+    from logger import logger
+
+# Bump whenever the layout of the cached index changes so stale caches are rebuilt
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "harryparser")
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def build_domain_index(tds):
+    """Map every domain known to the TDS, including subdomain-level tracker entries, to its entity"""
+    index = {}
+    for domain, tracker in tds.get("trackers", {}).items():
+        owner = (tracker.get("owner") or {}).get("name")
+        if owner:
+            index[domain] = owner
+    # The domains table is the authoritative domain -> entity mapping, it wins over tracker owners
+    index.update(tds.get("domains") or {})
+    return index
+
+
+class TdsIndex:
+    """
+    Tracker entity lookup built from DuckDuckGo's tds.json.
+
+    Lookups walk the host's suffixes from most to least specific, so an entry for a tracking subdomain
+    (e.g. metrics.example.net) is found before the one for its registrable domain.
+    The compiled index is cached on disk with marshal and only rebuilt when tds.json changes.
+    """
+
+    def __init__(self, domains):
+        self.domains = domains
+
+    def __len__(self):
+        return len(self.domains)
+
+    @classmethod
+    def from_file(cls, tds_file):
+        with open(tds_file, "r") as fin:
+            return cls(build_domain_index(json.load(fin)))
+
+    @classmethod
+    def load(cls, tds_file, cache_dir=DEFAULT_CACHE_DIR):
+        if not cache_dir:
+            return cls.from_file(tds_file)
+
+        stat = os.stat(tds_file)
+        abs_path = os.path.abspath(tds_file)
+        cache_file = os.path.join(cache_dir, f"tds_{hashlib.sha1(abs_path.encode()).hexdigest()[:16]}.idx")
+
+        cached = None
+        try:
+            with open(cache_file, "rb") as fin:
+                cached = marshal.load(fin)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        digest = None
+        if isinstance(cached, tuple) and len(cached) == 5 and cached[0] == CACHE_VERSION:
+            version, mtime_ns, size, cached_digest, domains = cached
+            if mtime_ns == stat.st_mtime_ns and size == stat.st_size:
+                return cls(domains)
+            # Touched but possibly unchanged (e.g. a fresh checkout), only the content hash can tell
+            digest = file_hash(tds_file)
+            if digest == cached_digest:
+                cls._write_cache(cache_file, stat, digest, domains)
+                return cls(domains)
+
+        logger.debug(f"Building TDS index for {tds_file}")
+        index = cls.from_file(tds_file)
+        cls._write_cache(cache_file, stat, digest or file_hash(tds_file), index.domains)
+        return index
+
+    @staticmethod
+    def _write_cache(cache_file, stat, digest, domains):
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as fout:
+                marshal.dump((CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest, domains), fout)
+            # Atomic so concurrent runs never read a half written cache
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write TDS cache {cache_file}: {e}")
+
+    def lookup(self, host, registrable_domain=None):
+        """Return the entity for host, or None. The walk stops at registrable_domain when it is given."""
+        domains = self.domains
+        host = host.lower().rstrip(".")
+        while True:
+            entity = domains.get(host)
+            if entity is not None:
+                return entity
+            if host == registrable_domain:
+                return None
+            dot = host.find(".")
+            # Never match a bare public suffix such as "com"
+            if dot == -1 or (registrable_domain is None and host.find(".", dot + 1) == -1):
+                return None
+            host = host[dot + 1:]
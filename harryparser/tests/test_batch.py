@@ -0,0 +1,67 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from harryparser import batch
+from harryparser.batch import BATCH_COLUMNS, expand_har_paths, run_batch
+from harryparser.harryparser import HarParser
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class TestBatch(unittest.TestCase):
+    def test_expand_har_paths(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("b.har", "a.har", "notes.txt"):
+                open(os.path.join(tmp, name), "w").close()
+            a, b = os.path.join(tmp, "a.har"), os.path.join(tmp, "b.har")
+            self.assertEqual(expand_har_paths([tmp]), [a, b])
+            self.assertEqual(expand_har_paths([os.path.join(tmp, "*.har"), a]), [a, b])
+            self.assertEqual(expand_har_paths([b]), [b])
+
+    def test_run_batch_merges_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            har_files = []
+            for i in range(3):
+                har_file = os.path.join(tmp, f"capture_{i}.har")
+                with open(har_file, "w", encoding="utf-8") as f:
+                    json.dump(sample_har(), f)
+                har_files.append(har_file)
+            har_files.append(os.path.join(tmp, "missing.har"))
+
+            output_file = os.path.join(tmp, "out.csv")
+            # One file in flight per worker, later files are only submitted as earlier ones are merged
+            with mock.patch.object(batch, "FILES_IN_FLIGHT", 1):
+                run_batch(har_files, output_file, "example.com", TDS_FILE, check_dns=False, output_format="csv",
+                          workers=2)
+            with open(output_file, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(list(rows[0].keys()), BATCH_COLUMNS)
+
+            h = HarParser(har_files[0], None, "example.com", TDS_FILE, check_dns=False)
+            h.extract()
+            single = sum(len(data) for _, data in h.component_rows())
+            for har_file in har_files[:3]:
+                file_rows = [row for row in rows if row["har_file"] == har_file]
+                self.assertEqual(len(file_rows), single)
+                # Every file keeps its own request_id numbering
+                self.assertEqual(file_rows[0]["request_id"], "1")
+            self.assertEqual(list(dict.fromkeys(row["har_file"] for row in rows)), har_files[:3])
+
+    def test_unreadable_tds_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "capture.har")
+            with open(har_file, "w", encoding="utf-8") as f:
+                json.dump(sample_har(), f)
+            output_file = os.path.join(tmp, "out.csv")
+            # The actual error, before any output is created or any worker started
+            with self.assertRaises(FileNotFoundError):
+                run_batch([har_file], output_file, "example.com", os.path.join(tmp, "missing_tds.json"),
+                          check_dns=False, output_format="csv", workers=2)
+            self.assertFalse(os.path.exists(output_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+
+from harryparser.harryparser import HarParser
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class CountingParser(HarParser):
+    def extract_entry(self, entry, request_id):
+        self.extracted = getattr(self, "extracted", 0) + 1
+        super().extract_entry(entry, request_id)
+
+
+def write_har(path, entries, truncate=0):
+    # entries is the last key, like a crawler appending to the array would leave it
+    raw = json.dumps({"log": {"version": "1.2", "entries": entries}})
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(raw[:len(raw) - truncate] if truncate else raw)
+
+
+def rows(parser):
+    return {sheet_name: list(data) for sheet_name, data in parser.component_rows()}
+
+
+class TestIncremental(unittest.TestCase):
+    def parse(self, har_file, **kwargs):
+        h = CountingParser(har_file, None, "example.com", TDS_FILE, check_dns=False, incremental=True, **kwargs)
+        h.extract()
+        return h
+
+    def test_only_new_entries_are_extracted(self):
+        entries = sample_har()["log"]["entries"]
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "capture.har")
+            write_har(har_file, entries[:10])
+            self.assertEqual(self.parse(har_file).extracted, 10)
+
+            # The crawler is half way through writing entry 16
+            write_har(har_file, entries[:16], truncate=200)
+            self.assertEqual(self.parse(har_file).extracted, 5)
+
+            write_har(har_file, entries)
+            incremental = self.parse(har_file)
+            self.assertEqual(incremental.extracted, 10)
+
+            full = HarParser(har_file, None, "example.com", TDS_FILE, check_dns=False)
+            full.extract()
+            self.assertEqual(rows(incremental), rows(full))
+            self.assertEqual(incremental.subdomains, full.subdomains)
+
+            # Nothing new, nothing extracted, same rows
+            again = self.parse(har_file)
+            self.assertEqual(getattr(again, "extracted", 0), 0)
+            self.assertEqual(rows(again), rows(full))
+
+    def test_changes_invalidate_checkpoint(self):
+        entries = sample_har()["log"]["entries"]
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "capture.har")
+            checkpoint_dir = os.path.join(tmp, "checkpoints")
+            write_har(har_file, entries[:10])
+            self.parse(har_file, checkpoint_dir=checkpoint_dir)
+            self.assertEqual(sorted(os.listdir(checkpoint_dir)), ["capture.har.checkpoint", "capture.har.rows"])
+
+            # A different option changes the rows, so everything is extracted again
+            h = self.parse(har_file, checkpoint_dir=checkpoint_dir, extract_responses=True)
+            self.assertEqual(h.extracted, 10)
+
+            # Rewritten rather than appended to
+            entries[0]["request"]["url"] = "https://changed.example.com/"
+            write_har(har_file, entries)
+            h = self.parse(har_file, checkpoint_dir=checkpoint_dir, extract_responses=True)
+            self.assertEqual(h.extracted, len(entries))
+            self.assertEqual(h.headers[0][0], "https://changed.example.com/")
+
+    def test_extraction_errors_are_not_truncation(self):
+        class FailingParser(CountingParser):
+            def extract_entry(self, entry, request_id):
+                if request_id == 3:
+                    raise UnicodeEncodeError("utf-8", "\ud800", 0, 1, "surrogates not allowed")
+                super().extract_entry(entry, request_id)
+
+        entries = sample_har()["log"]["entries"][:4]
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "capture.har")
+            write_har(har_file, entries)
+            for _ in range(2):
+                h = FailingParser(har_file, None, "example.com", TDS_FILE, check_dns=False, incremental=True)
+                with self.assertRaises(UnicodeEncodeError):
+                    h.extract()
+            # Nothing was saved for the failed runs, so no request is counted twice
+            self.assertEqual(len(self.parse(har_file).request_table), 4)
+
+    def test_rows_are_plain_data(self):
+        entries = sample_har()["log"]["entries"]
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "capture.har")
+            write_har(har_file, entries[:10])
+            self.parse(har_file)
+            write_har(har_file, entries)
+            resumed = self.parse(har_file)
+            with open(f"{har_file}.rows", encoding="ascii") as fin:
+                segments = [json.loads(line) for line in fin]
+            self.assertEqual(len(segments), 2)
+            self.assertEqual(len(segments[0][0]) + len(segments[1][0]), len(resumed.request_table))
+
+            # A rows file that isn't what the checkpoint recorded is reported, never executed
+            with open(f"{har_file}.rows", "wb") as fout:
+                fout.write(b"cos\nsystem\n(S'true'\ntR." + b" " * 10000)
+            with self.assertRaises(ValueError):
+                self.parse(har_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
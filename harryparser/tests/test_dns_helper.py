@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+import dns.rdatatype
+import dns.resolver
+
+from harryparser import dns_helper
+from harryparser.dns_cache import DnsCache
+from harryparser.dns_helper import SubdomainScanner
+
+ZONE = {
+    ("www.example.com", "A"): ["93.184.216.34"],
+    ("www.example.com", "CNAME"): ["cdn.example.net."],
+    ("www.example.com", "NS"): ["ns1.example.com."],
+    ("ns1.example.com", "A"): ["10.0.0.53"],
+}
+REDIRECTS = {"93.184.216.34": "https://www.example.com/", "cdn.example.net": "cdn.example.net"}
+
+
+class FakeRdata(SimpleNamespace):
+    def __str__(self):
+        return self.address
+
+
+class FakeAnswer(list):
+    expiration = time.time() + 3600
+
+
+class FakeScanner(SubdomainScanner):
+    """Answers from ZONE/REDIRECTS instead of the network, and tracks how many lookups overlap"""
+    in_flight = 0
+    peak = 0
+    queries = 0
+
+    async def _resolve(self, resolver, name, record_type):
+        FakeScanner.queries += 1
+        async with self._semaphore:
+            FakeScanner.in_flight += 1
+            FakeScanner.peak = max(FakeScanner.peak, FakeScanner.in_flight)
+            try:
+                await asyncio.sleep(0.001)
+            finally:
+                FakeScanner.in_flight -= 1
+        if resolver is not self._resolver:
+            # Query sent to the nameserver found through the NS record
+            return FakeAnswer([FakeRdata(address="93.184.216.35", rdtype=dns.rdatatype.A)])
+        if (name, record_type) not in ZONE:
+            raise dns.resolver.NoAnswer()
+        return FakeAnswer(FakeRdata(address=value, target=value, rdtype=dns.rdatatype.A)
+                          for value in ZONE[(name, record_type)])
+
+    async def _record_redirects(self, domain):
+        FakeScanner.queries += 1
+        return REDIRECTS.get(domain), True
+
+
+class TestSubdomainScanner(unittest.TestCase):
+    def test_results_shape(self):
+        scanner = FakeScanner(["www.example.com", "missing.example.com"], cache_file=None)
+        scanner.scan_subdomains()
+        self.assertEqual(list(scanner.results), ["www.example.com", "missing.example.com"])
+        self.assertEqual(scanner.results["missing.example.com"], {"A": {}, "CNAME": {}, "NS": {}})
+
+        result = scanner.results["www.example.com"]
+        self.assertEqual(result["A"], {"93.184.216.34": {"redirects": [("93.184.216.34", "https://www.example.com/")]}})
+        # A self redirect is followed until the hop limit instead of forever
+        self.assertEqual(len(result["CNAME"]["cdn.example.net"]["redirects"]), 10)
+        self.assertEqual(result["NS"], {"ns1.example.com": {"resolved_ips": ["10.0.0.53"],
+                                                           "a_records": ["93.184.216.35"]}})
+        self.assertIn(["www.example.com", "NS", "ns1.example.com", "A_records", "93.184.216.35", "10.0.0.53", ""],
+                      scanner.result_rows())
+
+    def test_concurrency_is_bounded(self):
+        FakeScanner.peak = 0
+        scanner = FakeScanner([f"host{i}.example.com" for i in range(200)], max_concurrency=8, cache_file=None)
+        scanner.scan_subdomains()
+        self.assertEqual(len(scanner.results), 200)
+        self.assertLessEqual(FakeScanner.peak, 8)
+
+    def test_repeat_scan_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_file = os.path.join(tmp, "dns_cache.sqlite")
+            dns_helper._nameserver_ips.clear()
+            FakeScanner.queries = 0
+            first = FakeScanner(["www.example.com", "missing.example.com"], cache_file=cache_file)
+            first.scan_subdomains()
+            self.assertGreater(FakeScanner.queries, 0)
+
+            FakeScanner.queries = 0
+            dns_helper._nameserver_ips.clear()
+            second = FakeScanner(["www.example.com", "missing.example.com"], cache_file=cache_file)
+            second.scan_subdomains()
+            self.assertEqual(FakeScanner.queries, 0)
+            self.assertEqual(second.results, first.results)
+
+    def test_background_scan(self):
+        serial = FakeScanner(["www.example.com", "missing.example.com", "a.example.com"], cache_file=None)
+        serial.scan_subdomains()
+
+        FakeScanner.queries = 0
+        scanner = FakeScanner(["www.example.com"], cache_file=None)
+        scanner.start()
+        for subdomain in ("missing.example.com", "www.example.com", "a.example.com"):
+            scanner.add(subdomain)
+        # Scanning starts as soon as subdomains come in, not when finish() is called
+        deadline = time.time() + 5
+        while FakeScanner.queries == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(FakeScanner.queries, 0)
+        scanner.finish()
+        self.assertEqual(list(scanner.results), ["www.example.com", "missing.example.com", "a.example.com"])
+        self.assertEqual(scanner.results, serial.results)
+
+        abandoned = FakeScanner([f"host{i}.example.com" for i in range(50)], cache_file=None)
+        abandoned.start()
+        abandoned.finish(cancel=True)
+        self.assertFalse(abandoned.results)
+
+    def test_background_scan_failure(self):
+        class BrokenScanner(FakeScanner):
+            @contextlib.asynccontextmanager
+            async def _session(self):
+                raise FileNotFoundError("no cache directory")
+                yield
+
+        scanner = BrokenScanner(["www.example.com"], cache_file=None)
+        scanner.start()
+        scanner._thread.join()
+        # Subdomains found after the scan died don't interrupt extraction, finish() reports the actual error
+        scanner.add("a.example.com")
+        with self.assertRaises(FileNotFoundError):
+            scanner.finish()
+
+    def test_unencodable_redirect_host(self):
+        scanner = SubdomainScanner([], cache_file=None)
+
+        async def probe():
+            async with scanner._session():
+                return await scanner._record_redirects("xn--zz.example.com")
+
+        # Rejected before any connection is made, and counted as a failed probe rather than failing the scan
+        self.assertEqual(asyncio.run(probe()), (None, False))
+
+
+class TestDnsCache(unittest.TestCase):
+    def test_concurrent_caches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_file = os.path.join(tmp, "dns_cache.sqlite")
+            first, second = DnsCache(cache_file), DnsCache(cache_file)
+            first.set("a.example.com", "A", "", ["10.0.0.1"], 60)
+            # Buffered writes hold no lock, the other cache writes right away
+            self.assertEqual(first.get("a.example.com", "A"), (True, ["10.0.0.1"]))
+            second.set("b.example.com", "A", "", ["10.0.0.2"], 60)
+            second.flush()
+            first.flush()
+            self.assertEqual(second.get("a.example.com", "A"), (True, ["10.0.0.1"]))
+            first.close()
+            second.close()
+
+    def test_unusable_cache_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            blocker = os.path.join(tmp, "file")
+            open(blocker, "w").close()
+            self.assertIsNone(DnsCache.open(os.path.join(blocker, "dns_cache.sqlite")))
+            # The scan goes on without a cache
+            scanner = FakeScanner(["www.example.com"], cache_file=os.path.join(blocker, "dns_cache.sqlite"))
+            scanner.scan_subdomains()
+            self.assertIn("93.184.216.34", scanner.results["www.example.com"]["A"])
+
+
+if __name__ == '__main__':
+    unittest.main()
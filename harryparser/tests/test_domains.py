@@ -0,0 +1,25 @@
+import unittest
+
+from harryparser.domains import DomainExtractor
+
+
+class TestDomainExtractor(unittest.TestCase):
+    def test_extract_is_cached_per_host(self):
+        extractor = DomainExtractor(cache_size=16)
+        self.assertEqual(extractor.extractor.suffix_list_urls, ())
+
+        for path in ("a", "b?x=1", "c#frag"):
+            extracted = extractor.extract(f"https://user@metrics.example.co.uk:8443/{path}")
+            self.assertEqual(tuple(extracted), ("metrics", "example", "co.uk"))
+        info = extractor.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+        self.assertEqual(tuple(extractor.extract("https://10.0.0.1/")), ("", "10.0.0.1", ""))
+        self.assertEqual(extractor.extract("data:text/plain,hello").domain, "")
+        # urlsplit rejects these, they still get the answer tldextract gives for them
+        for url in ("http://[::1", "https://[tracker.example.com/"):
+            self.assertEqual(extractor.extract(url), extractor.extractor(url))
+
+
+if __name__ == '__main__':
+    unittest.main()
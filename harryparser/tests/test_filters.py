@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from harryparser import parallel
+from harryparser.filters import ExtractionFilter
+from harryparser.harryparser import HarParser
+from harryparser.stats import Stats
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+def rows(parser):
+    return {sheet_name: [data.row(i) for i in range(len(data))] for sheet_name, data in parser.component_rows()}
+
+
+class TestExtractionFilter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.har_file = os.path.join(cls.tmp_dir.name, "sample.har")
+        with open(cls.har_file, "w", encoding="utf-8") as fout:
+            json.dump(sample_har(), fout)
+        cls.full = rows(cls.parse())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    @classmethod
+    def parse(cls, filters=None, **options):
+        h = HarParser(cls.har_file, None, "example.com", TDS_FILE, check_dns=False, extract_responses=True,
+                      filters=filters, **options)
+        h.extract()
+        return h
+
+    def test_components_and_names(self):
+        h = self.parse(ExtractionFilter(components=["cookies", "parsed_postData"], name_pattern=r"^(_ga|user_id)$"))
+        self.assertEqual(rows(h), {
+            "Cookies": [row for row in self.full["Cookies"] if row[2] in ("_ga", "!_analyzed__ga")],
+            "ParsedPostData": [row for row in self.full["ParsedPostData"] if row[2] == "user_id"],
+        })
+        self.assertTrue(rows(h)["ParsedPostData"])
+        # Skipped components aren't even extracted
+        self.assertEqual(len(h.headers), 0)
+
+    def test_response_components(self):
+        with mock.patch("harryparser.harryparser.decode_response_body") as decode:
+            h = self.parse(ExtractionFilter(components=["responseHeaders", "setCookies"]))
+        # The response body isn't decoded at all, even though its (empty) store looks like the selected ones
+        decode.assert_not_called()
+        self.assertEqual((h.keep_response_headers, h.keep_set_cookies, h.keep_response_body), (True, True, False))
+        self.assertEqual(list(rows(h)), ["ResponseHeaders", "SetCookies"])
+        self.assertEqual(rows(h)["ResponseHeaders"], self.full["ResponseHeaders"])
+
+    def test_analyzed_only(self):
+        h = self.parse(ExtractionFilter(analyzed_only=True))
+        for sheet_name, sheet_rows in rows(h).items():
+            full = self.full[sheet_name]
+            expected = []
+            for i, row in enumerate(full):
+                if i + 1 < len(full) and full[i + 1][2] == f"!_analyzed_{row[2]}" and full[i + 1][0] == row[0]:
+                    expected += [row, full[i + 1]]
+            self.assertEqual(sheet_rows, expected, sheet_name)
+        self.assertTrue(rows(h)["Headers"])
+
+    def test_requests(self):
+        # Every request in the sample goes to the parent domain
+        for filters in (ExtractionFilter(third_party=True), ExtractionFilter(exclude_domains=["EXAMPLE.com"]),
+                        ExtractionFilter(include_entities=["Google LLC"])):
+            h = self.parse(filters, stats=Stats())
+            self.assertEqual(sum(len(data) for _, data in h.component_rows()), 0)
+            # Filtered requests keep their place, so request_ids and refs line up with the entries
+            self.assertEqual(len(h.request_table), 25)
+            self.assertEqual(h.stats.counters["entries_filtered"], 25)
+            self.assertEqual(len(h.subdomains), 4)
+        self.assertEqual(rows(self.parse(ExtractionFilter(include_entities=["Example.com"]))), self.full)
+
+    def test_parallel(self):
+        filters = ExtractionFilter(components=["headers", "cookies"], name_pattern="a", analyzed_only=True)
+        with mock.patch.object(parallel, "DEFAULT_CHUNK_SIZE", 4):
+            self.assertEqual(rows(self.parse(filters, jobs=2)), rows(self.parse(filters)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ExtractionFilter(components=["cookie"])
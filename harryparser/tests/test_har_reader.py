@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from harryparser.har_reader import JsonStreamReader, iter_har_entries
+from harryparser.harryparser import HarParser
+
+TDS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tds.json")
+
+
+def sample_har():
+    entries = []
+    for i in range(25):
+        entries.append({
+            "startedDateTime": "2023-05-01T10:00:00.000Z",
+            "request": {
+                "method": "POST" if i % 3 == 0 else "GET",
+                "url": f"https://sub{i % 4}.example.com/path?id={i}",
+                "headers": [{"name": "User-Agent", "value": "Mozilla/5.0 \"quoted\" \\ back\\slash ü"},
+                            {"name": "X-Hash", "value": "d41d8cd98f00b204e9800998ecf8427e"}],
+                "cookies": [{"name": "_ga", "value": f"GA1.2.{i}.1682935200"}],
+                "queryString": [{"name": "id", "value": str(i)}],
+                "postData": {"mimeType": "application/json",
+                             "text": json.dumps({"user": {"id": i, "tags": ["a]", "{b"]}})} if i % 3 == 0 else None,
+            },
+            "response": {"status": 200, "content": {"size": 0, "text": "[]{}\"\\"}},
+        })
+    return {"log": {"version": "1.2", "creator": {"name": "test", "version": "1"},
+                    "pages": [{"id": "page_1", "title": "}{]["}], "entries": entries, "comment": "trailing"}}
+
+
+class TestHarReader(unittest.TestCase):
+    def test_stream_matches_json_load(self):
+        har = sample_har()
+        raw = json.dumps(har, indent=2, ensure_ascii=False).encode("utf-8")
+        for chunk_size in (1, 7, 64, 1 << 20):
+            reader = JsonStreamReader(io.BytesIO(raw), chunk_size)
+            self.assertEqual(list(reader.iter_path(("log", "entries"))), har["log"]["entries"])
+
+    def test_missing_entries(self):
+        reader = JsonStreamReader(io.BytesIO(b'{"log": {"pages": []}}'))
+        with self.assertRaises(ValueError):
+            list(reader.iter_path(("log", "entries")))
+
+    def test_truncated_file(self):
+        raw = json.dumps(sample_har()).encode("utf-8")
+        reader = JsonStreamReader(io.BytesIO(raw[:len(raw) // 2]), 128)
+        with self.assertRaises(ValueError):
+            list(reader.iter_path(("log", "entries")))
+
+    def test_streaming_parser_produces_same_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "sample.har")
+            with open(har_file, "w", encoding="utf-8") as f:
+                json.dump(sample_har(), f)
+
+            parsers = []
+            for stream in (False, True):
+                h = HarParser(har_file, os.path.join(tmp, f"out_{stream}.xlsx"), "example.com", TDS_FILE,
+                              check_dns=False, stream=stream)
+                h.extract_entries()
+                parsers.append(h)
+
+            self.assertEqual(list(iter_har_entries(har_file)), sample_har()["log"]["entries"])
+            for attr in ("headers", "cookies", "querystring", "postdata", "parsed_postdata", "subdomains"):
+                self.assertEqual(list(getattr(parsers[0], attr)), list(getattr(parsers[1], attr)))
+            self.assertTrue(parsers[0].headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpyxl
+
+from harryparser.harryparser import HarParser
+from harryparser.tests.test_dns_helper import FakeScanner
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class RecordingScanner(FakeScanner):
+    """Remembers which subdomains had been added by the time finish() was first called"""
+    def __init__(self, subdomains, **kwargs):
+        super().__init__(subdomains, cache_file=None, **kwargs)
+        self.added_before_finish = None
+
+    def finish(self, cancel=False):
+        if self.added_before_finish is None:
+            self.added_before_finish = list(self.subdomains)
+        super().finish(cancel)
+
+
+class TestCreateWorkbook(unittest.TestCase):
+    def test_write_only_workbook(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "out.xlsx")
+            h = HarParser("unused.har", output_file, "example.com", check_dns=False)
+            h.headers = [["https://a.example.com/", 1, "User-Agent", "bad\x01value", "example.com", "example.com",
+                          "headers"],
+                         ["https://a.example.com/", 1, "X-Dict", {"not": "writable"}, "example.com", "example.com",
+                          "headers"]]
+            h.cookies = [["https://a.example.com/", 1, "ids", ["a", "b"], "example.com", "example.com", "cookies"]]
+            h.create_workbook()
+
+            wb = openpyxl.load_workbook(output_file, read_only=True)
+            self.assertEqual(wb.sheetnames, ["Everything", "Headers", "Cookies", "QueryString", "PostData",
+                                             "ParsedPostData"])
+            everything = list(wb["Everything"].values)
+            self.assertEqual(everything[0][0], "url")
+            self.assertEqual([row[3] for row in everything[1:]], ["badvalue", None, "['a', 'b']"])
+            self.assertEqual(len(list(wb["Headers"].values)), 3)
+            self.assertEqual(list(wb["Cookies"].values)[1], everything[3])
+
+
+class TestResponseExtraction(unittest.TestCase):
+    def test_response_rows(self):
+        body = base64.b64encode(json.dumps({"uid": "aGVsbG8=", "meta": {"ts": 1}}).encode()).decode()
+        entries = []
+        for content in ({"mimeType": "application/json; charset=utf-8", "text": body, "encoding": "base64"},
+                        {"mimeType": "image/png", "text": "iVBORw0KGgo=", "encoding": "base64"},
+                        {"mimeType": "text/html", "text": "x" * 2048}):
+            entries.append({"request": {"url": "https://tracker.example.net/p", "headers": [], "cookies": [],
+                                        "queryString": []},
+                            "response": {"headers": [{"name": "Server", "value": "nginx"}],
+                                         "cookies": [{"name": "uid", "value": "d41d8cd98f00b204e9800998ecf8427e"}],
+                                         "content": content}})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "responses.har")
+            with open(har_file, "w") as f:
+                json.dump({"log": {"entries": entries}}, f)
+            h = HarParser(har_file, None, "example.com", TDS_FILE, check_dns=False, stream=True,
+                          extract_responses=True, max_body_size=1024)
+            h.extract()
+
+        sheets = dict(h.component_rows())
+        self.assertEqual(list(sheets)[-3:], ["ResponseHeaders", "SetCookies", "ResponseBody"])
+        self.assertEqual(len(sheets["ResponseHeaders"]), 3)
+        self.assertEqual(sheets["SetCookies"][0][2:4], ["uid", "d41d8cd98f00b204e9800998ecf8427e"])
+        self.assertEqual(sheets["SetCookies"][1][2], "!_analyzed_uid")
+        # Only the JSON body passes the MIME filter and the size cap, and it is flattened into fields
+        body_rows = {row[2]: row[3] for row in sheets["ResponseBody"]}
+        self.assertEqual(body_rows["uid"], "aGVsbG8=")
+        self.assertEqual(body_rows["!_analyzed_uid"], "Base64 encoded. Decoded bytes: b'hello'")
+        self.assertEqual(body_rows["meta_ts"], 1)
+        self.assertEqual({row[1] for row in sheets["ResponseBody"]}, {1})
+        self.assertTrue(all(row[6] == "responseBody" for row in sheets["ResponseBody"]))
+
+        h = HarParser(har_file, None, "example.com", TDS_FILE, check_dns=False)
+        self.assertEqual(len(list(h.component_rows())), 5)
+
+
+class TestBackgroundDns(unittest.TestCase):
+    def test_dns_overlaps_extraction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            har_file = os.path.join(tmp, "sample.har")
+            with open(har_file, "w", encoding="utf-8") as f:
+                json.dump(sample_har(), f)
+            output_file = os.path.join(tmp, "out.csv")
+            with mock.patch("harryparser.dns_helper.SubdomainScanner", RecordingScanner):
+                h = HarParser(har_file, output_file, "example.com", TDS_FILE, output_format="csv")
+                h.extract_entries()
+
+            scanner = h.dns_scanner
+            # Subdomains reached the scanner while the HAR was parsed, in the order they were found
+            self.assertEqual(scanner.added_before_finish, [f"sub{i}.example.com" for i in range(4)])
+            self.assertEqual(list(scanner.results), h.subdomains)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "out_dns.csv")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,58 @@
 import unittest
 from harryparser.helpers import *
+from harryparser import helpers
 
 class TestCases(unittest.TestCase):
     def test_dns_resolver_functions(self):
         assert(True==True)
 
+    def test_analyze_string_verdicts(self):
+        self.assertEqual(analyze_string("aGVsbG8="), "Base64 encoded. Decoded bytes: b'hello'")
+        # Non-canonical padding doesn't survive the round trip
+        self.assertFalse(is_base64("aGVsbG9=")[0])
+        self.assertEqual(analyze_string("d41d8cd98f00b204e9800998ecf8427eab"), False)
+        self.assertEqual(analyze_string("D41D8CD98F00B204E9800998ECF8427E0000000"), False)
+        # Bare hex digests are valid base64 too, which is checked first
+        self.assertTrue(analyze_string("da39a3ee5e6b4b0d3255bfef95601890afd80709").startswith("Base64"))
+        self.assertEqual(analyze_string("da39a3ee5e6b4b0d3255bfef95601890afd80709\n"), "Hash detected (SHA-1).")
+        self.assertEqual(analyze_string("1682935200"), "Date detected. Standardized date: 2023-05-01 10:00:00")
+        self.assertEqual(analyze_string("2023-05-01T10:00:00Z"),
+                         "Date detected. Standardized date: 2023-05-01 10:00:00")
+        self.assertFalse(analyze_string("no separators here"))
+        self.assertFalse(analyze_string("just-words/and:dots."))
+        self.assertFalse(analyze_string("   "))
+        self.assertFalse(analyze_string(12345))
+        self.assertFalse(analyze_string(["1682935200"]))
+
+    def test_analyze_string_is_memoized(self):
+        helpers._classify_cached.cache_clear()
+        for _ in range(3):
+            analyze_string("2023-05-01T10:00:00Z")
+        info = helpers._classify_cached.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+        # Large values bypass the cache
+        analyze_string("x" * (ANALYZE_CACHE_MAX_LENGTH + 1))
+        self.assertEqual(helpers._classify_cached.cache_info().currsize, 1)
+
+    def test_flatten_dict(self):
+        data = {"a": {"b": 1, "c": [{"d": 2}, {"d": 3}]}, "e": '{"f": "g"}', "h": " [1]", "i": [1, 2]}
+        self.assertEqual(flatten_dict(data), {"a_b": 1, "a_c_d": 2, "e_f": "g", "h": " [1]", "i": [1, 2]})
+        self.assertEqual(flatten_dict(data, index_lists=True),
+                         {"a_b": 1, "a_c_0_d": 2, "a_c_1_d": 3, "e_f": "g", "h": " [1]", "i_0": 1, "i_1": 2})
+
+    def test_flatten_dict_limits(self):
+        deep = leaf = {}
+        for _ in range(5000):
+            leaf["k"] = {}
+            leaf = leaf["k"]
+        leaf["k"] = "v"
+        # Well past the recursion limit, the part below max_depth is kept as a value
+        flat = flatten_dict(deep, max_depth=3)
+        self.assertEqual(list(flat), ["k_k_k"])
+        self.assertIsInstance(flat["k_k_k"], dict)
+        self.assertEqual(len(flatten_dict(deep, max_depth=10000)), 1)
+        self.assertEqual(list(iter_flatten({str(i): i for i in range(10)}, max_leaves=3)),
+                         [("0", 0), ("1", 1), ("2", 2)])
+
 if __name__ == '__main__':
     unittest.main()
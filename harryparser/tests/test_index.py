@@ -0,0 +1,152 @@
+import contextlib
+import io
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
+import unittest
+
+from harryparser.filters import ExtractionFilter
+from harryparser.harryparser import HarParser
+from harryparser.index import CaptureIndex, main
+from harryparser.rows import RequestInfo, RowStore
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+USER_AGENT = "Mozilla/5.0 \"quoted\" \\ back\\slash ü"
+HASH = "d41d8cd98f00b204e9800998ecf8427e"
+
+
+def index_captures(index_file, worker, captures=5):
+    index = CaptureIndex(index_file)
+    try:
+        for i in range(captures):
+            har_file = os.path.join(os.path.dirname(index_file), f"{worker}-{i}.har")
+            open(har_file, "w").close()
+            data = RowStore("cookies", [RequestInfo("https://t.example/", 1, "t.example", "Tracker")])
+            for j in range(200):
+                data.append(0, "uid", f"shared-value-{j}")
+            index.add_capture(har_file, f"site{worker}.example", [("Cookies", data)], 1)
+    finally:
+        index.close()
+
+
+class TestCaptureIndex(unittest.TestCase):
+    def parse(self, tmp_dir, name, parent_domain, index_file, **options):
+        har_file = os.path.join(tmp_dir, name)
+        if not os.path.exists(har_file):
+            har = sample_har()
+            # Every capture gets its own cookie values, the headers are the same everywhere
+            for entry in har["log"]["entries"]:
+                for cookie in entry["request"]["cookies"]:
+                    cookie["value"] += f".{name}"
+            with open(har_file, "w", encoding="utf-8") as fout:
+                json.dump(har, fout)
+        HarParser(har_file, os.path.join(tmp_dir, name + ".csv"), parent_domain, TDS_FILE, check_dns=False,
+                  output_format="csv", index_file=index_file, **options).extract_entries()
+        return har_file
+
+    def test_correlation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_file = os.path.join(tmp_dir, "index.sqlite")
+            self.parse(tmp_dir, "a.har", "example.com", index_file)
+            b = self.parse(tmp_dir, "b.har", "other.com", index_file)
+            # Unchanged, so not indexed twice
+            self.parse(tmp_dir, "b.har", "other.com", index_file)
+
+            index = CaptureIndex(index_file)
+            try:
+                self.assertEqual([capture["parent_domain"] for capture in index.captures()],
+                                 ["example.com", "other.com"])
+                seen = index.lookup(USER_AGENT)
+                self.assertEqual(sorted({row["parent_domain"] for row in seen}), ["example.com", "other.com"])
+                self.assertEqual(sum(row["count"] for row in seen), 50)
+                self.assertEqual({row["name"] for row in seen}, {"User-Agent"})
+
+                shared = index.shared(min_sites=2)
+                self.assertIn(USER_AGENT, [row["value"] for row in shared])
+                self.assertFalse([row for row in shared if row["value"].startswith("GA1.2.")])
+                hashed = index.shared(min_sites=2, analysis="Base64")
+                self.assertEqual([(row["value"], row["sites"], row["names"]) for row in hashed],
+                                 [(HASH, 2, "X-Hash")])
+                self.assertEqual(index.shared(min_sites=2, name="X-Hash"), hashed)
+                self.assertEqual(index.shared(min_sites=3), [])
+
+                # A capture that changed replaces its earlier observations
+                os.utime(b, ns=(0, 0))
+                self.parse(tmp_dir, "b.har", "example.com", index_file)
+                self.assertEqual(len(index.captures()), 2)
+                self.assertEqual(index.shared(min_sites=2), [])
+                self.assertEqual(index.shared(min_sites=1, analysis="Base64")[0]["captures"], 2)
+            finally:
+                index.close()
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                main(["--index", index_file, "--json", "value", HASH])
+            self.assertEqual({row["name"] for row in json.loads(out.getvalue())}, {"X-Hash"})
+
+    def test_options_change(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_file = os.path.join(tmp_dir, "index.sqlite")
+            self.parse(tmp_dir, "a.har", "example.com", index_file, filters=ExtractionFilter(components=["cookies"]))
+            # The filtered run indexed part of the capture, an unfiltered run of the same file indexes all of it
+            self.parse(tmp_dir, "a.har", "example.com", index_file)
+            index = CaptureIndex(index_file)
+            try:
+                self.assertEqual(len(index.captures()), 1)
+                self.assertEqual(sum(row["count"] for row in index.lookup(USER_AGENT)), 25)
+                self.assertIsNone(index.add_parser(HarParser(os.path.join(tmp_dir, "a.har"), None, "example.com",
+                                                             TDS_FILE, check_dns=False)))
+            finally:
+                index.close()
+
+    def test_concurrent_writers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_file = os.path.join(tmp_dir, "index.sqlite")
+            CaptureIndex(index_file).close()
+            with ProcessPoolExecutor(4) as executor:
+                # Writers wait for each other rather than failing with "database is locked"
+                for future in [executor.submit(index_captures, index_file, worker) for worker in range(4)]:
+                    future.result()
+            index = CaptureIndex(index_file)
+            try:
+                self.assertEqual(len(index.captures()), 20)
+                self.assertEqual(index.shared(min_sites=4, limit=1000)[0]["captures"], 20)
+            finally:
+                index.close()
+
+    def test_value_stats_match_observations(self):
+        rng = random.Random(0)
+        entities = ["Google LLC", "Facebook, Inc.", "Hotjar Ltd", None]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = CaptureIndex(os.path.join(tmp_dir, "index.sqlite"))
+            try:
+                for i in range(40):
+                    # Some HARs are indexed again after changing, under another site too
+                    har_file = os.path.join(tmp_dir, f"{rng.randrange(15)}.har")
+                    with open(har_file, "w") as fout:
+                        fout.write("x" * i)
+                    request_table = [RequestInfo("https://t.example/", j, "t.example", entity)
+                                     for j, entity in enumerate(entities)]
+                    data = RowStore("cookies", request_table)
+                    for _ in range(30):
+                        data.append(rng.randrange(len(request_table)), "uid", f"value-{rng.randrange(40):04}")
+                    index.add_capture(har_file, f"site{rng.randrange(6)}.example", [("Cookies", data)], 4)
+
+                stats = index.conn.execute("SELECT * FROM value_stats ORDER BY value_hash").fetchall()
+                expected = index.conn.execute(
+                    "SELECT o.value_hash, count(DISTINCT c.parent_domain), count(DISTINCT o.calculated_entity), "
+                    "count(DISTINCT o.capture_id), sum(o.count) FROM observations o JOIN captures c USING (capture_id) "
+                    "GROUP BY o.value_hash ORDER BY o.value_hash").fetchall()
+                self.assertEqual(stats, expected)
+                # Values seen in a single capture have no spread rows
+                self.assertEqual(index.conn.execute(
+                    "SELECT count(*) FROM value_spread WHERE value_hash NOT IN "
+                    "(SELECT value_hash FROM value_stats WHERE captures > 1)").fetchone()[0], 0)
+            finally:
+                index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
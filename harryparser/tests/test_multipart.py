@@ -0,0 +1,33 @@
+import unittest
+
+from harryparser.helpers import parse_multipart_form
+from harryparser.multipart import get_boundary, iter_multipart
+
+
+class TestMultipart(unittest.TestCase):
+    def test_iter_multipart(self):
+        body = (b'preamble\r\n--XyZ\r\nContent-Disposition: form-data; name="a"\r\n\r\nline1\r\nline2\r\n'
+                b'--XyZ\nContent-Disposition: form-data; name="b\\"q"; filename="f.bin"\n'
+                b'Content-Type: application/octet-stream\n\n\x00\xff\n--XyZ--\r\nepilogue')
+        self.assertEqual(get_boundary('multipart/form-data; boundary="XyZ"'), "XyZ")
+        parts = list(iter_multipart(body, get_boundary("multipart/form-data; boundary=XyZ; charset=utf-8")))
+        self.assertEqual([(p.name, p.filename) for p in parts], [("a", None), ('b"q', "f.bin")])
+        self.assertEqual(parts[0].text(), "line1\r\nline2")
+        # Payloads point into the body rather than being copied out of it
+        self.assertIsInstance(parts[1].payload, memoryview)
+        self.assertIs(parts[1].payload.obj, body)
+        self.assertEqual(bytes(parts[1].payload), b"\x00\xff")
+
+    def test_parse_multipart_form(self):
+        mime_type = "multipart/form-data; boundary=b0"
+        text = ('--b0\r\nContent-Disposition: form-data; name="event"\r\n\r\n{"id": 1, "user": {"name": "x"}}\r\n'
+                '--b0\r\nContent-Disposition: form-data; name="empty"\r\n\r\n\r\n'
+                '--b0\r\nContent-Disposition: form-data; name="log"; filename="a.txt"\r\nContent-Type: text/plain\r\n'
+                '\r\nhello\r\n'
+                '--b0\r\nContent-Disposition: form-data; name="img"; filename="a.png"\r\nContent-Type: image/png\r\n'
+                '\r\n\x89PNG\r\n'
+                '--b0\r\nContent-Disposition: form-data; name="cut"\r\n\r\nno closing delimiter')
+        self.assertEqual(parse_multipart_form(mime_type, text),
+                         {"event_id": 1, "event_user_name": "x", "empty": "", "log": "hello",
+                          "cut": "no closing delimiter"})
+        self.assertEqual(parse_multipart_form("multipart/form-data", text), {})
@@ -0,0 +1,89 @@
+import csv
+import importlib.util
+import json
+import os
+import sqlite3
+import tempfile
+import tracemalloc
+import unittest
+
+from harryparser.outputs import COLUMNS, DNS_COLUMNS, get_sink, related_file
+
+ROWS = [["https://a.example.com/", 1, "User-Agent", "Mozilla", "example.com", "example.com", "headers"],
+        ["https://a.example.com/", 1, "data", ["x", 1], "example.com", "example.com", "parsed_postData"]]
+DNS_ROWS = [["a.example.com", "A", "1.2.3.4", "", "", "1.2.3.4", "http://b.example.com/"]]
+
+
+class TestOutputSinks(unittest.TestCase):
+    def write(self, output_format, tmp):
+        output_file = os.path.join(tmp, f"out.{output_format}")
+        with get_sink(output_format, output_file) as sink:
+            sink.write_rows("Headers", ROWS[:1])
+            sink.write_rows("ParsedPostData", ROWS[1:])
+            sink.write_dns_rows(DNS_ROWS)
+        return output_file
+
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = self.write("csv", tmp)
+            with open(output_file, newline="") as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], COLUMNS)
+            self.assertEqual(rows[2][3], "['x', 1]")
+            with open(related_file(output_file, "dns"), newline="") as f:
+                self.assertEqual(list(csv.reader(f)), [DNS_COLUMNS] + DNS_ROWS)
+
+    def test_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = self.write("jsonl", tmp)
+            with open(output_file) as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(rows[0], dict(zip(COLUMNS, ROWS[0])))
+            self.assertEqual(rows[1]["value"], ["x", 1])
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = self.write("sqlite", tmp)
+            # Writing twice to the same file replaces the previous run
+            self.write("sqlite", tmp)
+            conn = sqlite3.connect(output_file)
+            self.assertEqual(conn.execute("SELECT count(*) FROM har_data").fetchone()[0], 2)
+            self.assertEqual(conn.execute("SELECT request_id, value FROM har_data WHERE source = 'headers'").fetchall(),
+                             [(1, "Mozilla")])
+            self.assertEqual([list(row) for row in conn.execute("SELECT * FROM dns")], DNS_ROWS)
+            conn.close()
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = self.write("parquet", tmp)
+            table = pyarrow.parquet.read_table(output_file)
+            self.assertEqual(table.column_names, COLUMNS)
+            self.assertEqual(table.column("value").to_pylist(), ["Mozilla", "['x', 1]"])
+
+    def test_xlsx_memory_does_not_grow(self):
+        """Write-only sheets go to disk as rows come in (openpyxl needs lxml for that)"""
+        def peak(rows):
+            with tempfile.TemporaryDirectory() as tmp:
+                tracemalloc.start()
+                try:
+                    with get_sink("xlsx", os.path.join(tmp, "out.xlsx")) as sink:
+                        for _ in range(rows // 500):
+                            sink.write_rows("Headers", ROWS[:1] * 500)
+                    return tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+        # The first workbook also pays for importing openpyxl
+        peak(0)
+        small, large = peak(500), peak(2000)
+        self.assertLess(large, small * 2, f"peak memory: {small >> 10} KiB for 500 rows, {large >> 10} KiB for 2000")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            get_sink("docx", "out.docx")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from harryparser import parallel
+from harryparser.harryparser import HarParser
+from harryparser.stats import Stats
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class TestParallel(unittest.TestCase):
+    def test_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            har_file = os.path.join(tmp_dir, "sample.har")
+            with open(har_file, "w", encoding="utf-8") as fout:
+                json.dump(sample_har(), fout)
+
+            serial = HarParser(har_file, None, "example.com", TDS_FILE, check_dns=False, extract_responses=True)
+            serial.extract()
+            # Small chunks so the 25 entries are spread over several tasks and have to be put back in order
+            with mock.patch.object(parallel, "DEFAULT_CHUNK_SIZE", 4):
+                parallel_parser = HarParser(har_file, None, "example.com", TDS_FILE, check_dns=False,
+                                            extract_responses=True, jobs=2, stats=Stats())
+                parallel_parser.extract()
+
+        self.assertEqual([(r.url, r.request_id, r.domain, r.entity) for r in parallel_parser.request_table],
+                         [(r.url, r.request_id, r.domain, r.entity) for r in serial.request_table])
+        for (sheet_name, data), (_, expected) in zip(parallel_parser.component_rows(), serial.component_rows()):
+            self.assertEqual(list(data), list(expected), sheet_name)
+        self.assertEqual(parallel_parser.subdomains, serial.subdomains)
+        # Worker timings are merged back
+        self.assertEqual(parallel_parser.stats.phases["extract.headers"][1], 25)
+        # So are the domain cache counts, every lookup happens in a worker
+        lookups = [parser.stats.counters["domain_cache.hits"] + parser.stats.counters["domain_cache.misses"]
+                   for parser in (serial, parallel_parser)]
+        self.assertEqual(lookups[1], lookups[0])
+        self.assertGreater(lookups[1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import pickle
+import tracemalloc
+import unittest
+
+from harryparser.rows import RequestInfo, RowStore
+
+
+def peak_memory(build):
+    tracemalloc.start()
+    try:
+        kept = build()
+        return tracemalloc.get_traced_memory()[1], kept
+    finally:
+        tracemalloc.stop()
+
+
+class TestRowStore(unittest.TestCase):
+    def test_rows_round_trip(self):
+        table = [RequestInfo("https://a.example.com/", 1, "example.com", "Example")]
+        store = RowStore("headers", table)
+        store.append(0, "Accept", "*/*")
+        store.append(0, "X-Data", {"nested": True})
+        expected = [["https://a.example.com/", 1, "Accept", "*/*", "example.com", "Example", "headers"],
+                    ["https://a.example.com/", 1, "X-Data", {"nested": True}, "example.com", "Example", "headers"]]
+        self.assertEqual(list(store), expected)
+        self.assertEqual(store[-1], expected[1])
+        self.assertEqual(list(pickle.loads(pickle.dumps(store))), expected)
+
+    def test_memory_per_million_rows(self):
+        """The row store needs well under half the memory of a list per row (scaled down to 200k rows)"""
+        requests, rows_per_request = 20000, 10
+        urls = [f"https://host{i % 50}.example.com/path?id={i}" for i in range(requests)]
+        names = [f"header-{j}" for j in range(rows_per_request)]
+        values = [f"value-{i}-{j}" for i in range(requests) for j in range(rows_per_request)]
+
+        def build_lists():
+            rows = []
+            for i, url in enumerate(urls):
+                for j, name in enumerate(names):
+                    rows.append([url, i + 1, name, values[i * rows_per_request + j], "example.com", "Example",
+                                 "headers"])
+            return rows
+
+        def build_store():
+            table = []
+            store = RowStore("headers", table)
+            for i, url in enumerate(urls):
+                table.append(RequestInfo(url, i + 1, "example.com", "Example"))
+                for j, name in enumerate(names):
+                    store.append(i, name, values[i * rows_per_request + j])
+            return store
+
+        list_peak, rows = peak_memory(build_lists)
+        store_peak, store = peak_memory(build_store)
+        self.assertEqual(list(store), rows)
+        per_million = 1000000 / len(rows)
+        self.assertLess(store_peak, list_peak / 2,
+                        f"row memory per million rows: lists {list_peak * per_million / 2 ** 20:.0f} MiB, "
+                        f"row store {store_peak * per_million / 2 ** 20:.0f} MiB")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import csv
+import http.client
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from harryparser.service import MP_CONTEXT, HarService, make_server
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.har_file = os.path.join(self.tmp_dir.name, "sample.har")
+        with open(self.har_file, "w", encoding="utf-8") as fout:
+            json.dump(sample_har(), fout)
+        self.service = HarService(TDS_FILE, workers=1, output_dir=self.tmp_dir.name)
+        self.server = make_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.tmp_dir.cleanup()
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=60)
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_jobs_and_metrics(self):
+        options = {"output_format": "csv", "check_dns": False}
+        for _ in range(2):
+            status, job = self.request("POST", "/jobs", {"har_file": self.har_file, "parent_domain": "example.com",
+                                                         "options": options, "wait": True})
+            self.assertEqual(status, 200)
+            self.assertEqual(job["status"], "done", job["error"])
+            self.assertEqual(job["result"]["entries"], 25)
+            with open(job["output_file"], newline="", encoding="utf-8") as fin:
+                self.assertEqual(sum(1 for _ in csv.reader(fin)) - 1, job["result"]["rows"])
+
+        status, polled = self.request("GET", f"/jobs/{job['id']}")
+        self.assertEqual((status, polled["status"]), (200, "done"))
+
+        status, metrics = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertEqual((metrics["completed"], metrics["failed"], metrics["queue_depth"]), (2, 0, 0))
+        self.assertEqual(metrics["entries"], 50)
+
+    def test_bad_requests(self):
+        status, body = self.request("POST", "/jobs", {"har_file": self.har_file})
+        self.assertEqual(status, 400)
+        status, body = self.request("POST", "/jobs", {"har_file": self.har_file, "parent_domain": "example.com",
+                                                      "options": {"jobs": 4}})
+        self.assertEqual((status, body["error"]), (400, "Unknown option: jobs"))
+        # Jobs only write under the output directory
+        for options, output_file in (({"checkpoint_dir": "/tmp"}, None), ({}, "../escaped.csv"),
+                                     ({}, "/tmp/escaped.csv")):
+            status, body = self.request("POST", "/jobs", {"har_file": self.har_file, "parent_domain": "example.com",
+                                                          "options": options, "output_file": output_file})
+            self.assertEqual(status, 400, body)
+        self.assertEqual(self.request("GET", "/jobs/404")[0], 404)
+
+        # A HAR that fails to parse fails its job, the service keeps going
+        broken = os.path.join(self.tmp_dir.name, "broken.har")
+        with open(broken, "w") as fout:
+            fout.write("{not json")
+        status, job = self.request("POST", "/jobs", {"har_file": broken, "parent_domain": "example.com",
+                                                     "options": {"output_format": "csv", "check_dns": False},
+                                                     "wait": True})
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(self.request("GET", "/metrics")[1]["failed"], 1)
+
+    def test_paths(self):
+        status, job = self.request("POST", "/jobs", {"har_file": self.har_file, "parent_domain": "example.com",
+                                                     "output_file": "sub/out.csv", "wait": True,
+                                                     "options": {"output_format": "csv", "check_dns": False,
+                                                                 "incremental": True}})
+        self.assertEqual(job["status"], "done", job["error"])
+        self.assertEqual(job["output_file"], os.path.join(os.path.realpath(self.tmp_dir.name), "sub", "out.csv"))
+        self.assertTrue(os.path.isfile(job["output_file"]))
+        # Checkpoints go under the output directory too, not next to the HAR
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp_dir.name, "checkpoints"))), 1)
+        self.assertFalse(os.path.exists(f"{self.har_file}.checkpoint"))
+
+        inputs = HarService(TDS_FILE, workers=1, output_dir=self.tmp_dir.name,
+                            input_dir=os.path.join(self.tmp_dir.name, "captures"))
+        try:
+            with self.assertRaises(ValueError):
+                inputs.submit({"har_file": self.har_file, "parent_domain": "example.com"})
+        finally:
+            inputs.close()
+
+    def test_worker_death(self):
+        request = {"har_file": self.har_file, "parent_domain": "example.com",
+                   "options": {"output_format": "csv", "check_dns": False}, "wait": True}
+        self.assertEqual(self.request("POST", "/jobs", request)[1]["status"], "done")
+        broken = self.service.executor
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        deadline = time.time() + 10
+        while not broken._broken and time.time() < deadline:
+            time.sleep(0.01)
+
+        # The next job runs on a new pool, and /metrics keeps working
+        status, job = self.request("POST", "/jobs", request)
+        self.assertEqual((status, job["status"]), (200, "done"), job["error"])
+        self.assertIsNot(self.service.executor, broken)
+        # Not forked from the multi-threaded server
+        self.assertEqual(self.service.executor._mp_context.get_start_method(), MP_CONTEXT)
+        status, metrics = self.request("GET", "/metrics")
+        self.assertEqual((status, metrics["completed"]), (200, 2))
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Dependencies only the code paths that need them may import
+HEAVY_MODULES = ("openpyxl", "tldextract", "dns", "httpx", "dateutil", "pyarrow", "requests")
+# Cumulative import time of harryparser.harryparser. Around 50ms with lazy imports, the eager imports took ~700ms.
+STARTUP_BUDGET_MS = 250
+
+
+def import_times(*args):
+    """Run python -X importtime with args, returns {top level module: cumulative microseconds}"""
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def heavy(modules):
+    return sorted(name for name in modules if name.split(".")[0] in HEAVY_MODULES)
+
+
+class TestStartup(unittest.TestCase):
+    def test_version_and_help_are_light(self):
+        for flag in ("--version", "--help"):
+            # Same as the harryparser console script
+            times = import_times("-c", f"import sys; sys.argv[1:] = [{flag!r}]; "
+                                       f"from harryparser.harryparser import main; main()")
+            self.assertEqual(heavy(times), [], flag)
+            self.assertLess(times["harryparser.harryparser"] / 1000, STARTUP_BUDGET_MS, flag)
+
+    def test_csv_run_without_dns_skips_excel_and_dns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            har_file = os.path.join(tmp_dir, "sample.har")
+            with open(har_file, "w", encoding="utf-8") as fout:
+                json.dump(sample_har(), fout)
+            script = textwrap.dedent(f"""
+                import sys
+                from harryparser.harryparser import HarParser
+                HarParser({har_file!r}, {os.path.join(tmp_dir, "out.csv")!r}, "example.com", {TDS_FILE!r},
+                          check_dns=False, output_format="csv").extract_entries()
+                print(" ".join(sys.modules))
+            """)
+            result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True,
+                                    check=True)
+        # Extraction needs tldextract (and requests through it), dateutil only if a value looks like a date
+        loaded = {name.split(".")[0] for name in result.stdout.split()}
+        self.assertEqual(loaded & {"openpyxl", "dns", "httpx", "pyarrow"}, set())
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+
+from harryparser.harryparser import HarParser
+from harryparser.stats import Stats
+from harryparser.tests.test_har_reader import TDS_FILE, sample_har
+
+
+class TestStats(unittest.TestCase):
+    def test_phases_and_memory(self):
+        stats = Stats(trace_memory=True)
+        with stats.phase("outer"):
+            big = bytearray(8 << 20)
+            del big
+            with stats.phase("inner"):
+                small = bytearray(1 << 20)
+                del small
+        self.assertEqual(list(stats.iter_timed("items", range(3))), [0, 1, 2])
+        stats.count("things", 2)
+
+        report = stats.report()
+        self.assertEqual(report["phases"]["items"]["count"], 3)
+        # The outer peak survives the inner phase resetting the tracemalloc peak
+        self.assertGreaterEqual(report["phases"]["outer"]["peak_mb"], 8)
+        self.assertLess(report["phases"]["inner"]["peak_mb"], 8)
+        self.assertGreaterEqual(report["phases"]["outer"]["seconds"], report["phases"]["inner"]["seconds"])
+
+        merged = Stats()
+        merged.merge(report)
+        merged.merge(report)
+        self.assertEqual(merged.phases["items"][1], 6)
+        self.assertEqual(merged.counters["things"], 4)
+        self.assertIn("outer", merged.summary())
+
+    def test_parser_stats(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            har_file = os.path.join(tmp_dir, "sample.har")
+            with open(har_file, "w") as fout:
+                json.dump(sample_har(), fout)
+            h = HarParser(har_file, os.path.join(tmp_dir, "out.csv"), "example.com", TDS_FILE, check_dns=False,
+                          output_format="csv", stats=Stats())
+            h.extract_entries()
+            h.stats.write_json(os.path.join(tmp_dir, "stats.json"))
+            with open(os.path.join(tmp_dir, "stats.json")) as fin:
+                report = json.load(fin)
+
+        phases = report["phases"]
+        for phase in ("tds_load", "har_load", "extract", "extract.headers", "extract.postData", "output"):
+            self.assertIn(phase, phases)
+        self.assertEqual(phases["extract.headers"]["count"], 25)
+        # Each header, cookie and query value goes through the analyzer once
+        analyzed = sum(phase["count"] for name, phase in phases.items() if name.startswith("analyze."))
+        self.assertGreaterEqual(analyzed, 25 * 4)
+        self.assertGreaterEqual(phases["analyze.base64"]["count"], 25)
+        self.assertEqual(report["counters"]["entries"], 25)
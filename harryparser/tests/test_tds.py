@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+
+from harryparser.tds import TdsIndex
+
+TDS = {
+    "trackers": {
+        "metrics.cdn.example.net": {"owner": {"name": "Metrics Co"}},
+        "tracker.com": {"owner": {"name": "Wrong Owner"}},
+    },
+    "domains": {"tracker.com": "Tracker Inc", "google.co.uk": "Google LLC"},
+}
+
+
+class TestTdsIndex(unittest.TestCase):
+    def test_lookup_walks_suffixes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tds_file = os.path.join(tmp, "tds.json")
+            with open(tds_file, "w") as f:
+                json.dump(TDS, f)
+            index = TdsIndex.load(tds_file, cache_dir=None)
+
+        self.assertEqual(index.lookup("a.b.tracker.com", "tracker.com"), "Tracker Inc")
+        self.assertEqual(index.lookup("x.metrics.cdn.example.net", "example.net"), "Metrics Co")
+        self.assertIsNone(index.lookup("cdn.example.net", "example.net"))
+        self.assertEqual(index.lookup("WWW.Google.co.uk."), "Google LLC")
+        self.assertIsNone(index.lookup("co.uk"))
+        self.assertIsNone(index.lookup("nottracker.com", "nottracker.com"))
+
+    def test_cache_is_rebuilt_when_tds_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tds_file = os.path.join(tmp, "tds.json")
+            cache_dir = os.path.join(tmp, "cache")
+            with open(tds_file, "w") as f:
+                json.dump(TDS, f)
+
+            self.assertEqual(len(TdsIndex.load(tds_file, cache_dir)), 3)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            # Same content with a new mtime keeps the cached index
+            os.utime(tds_file, ns=(1, 1))
+            self.assertEqual(TdsIndex.load(tds_file, cache_dir).lookup("tracker.com"), "Tracker Inc")
+
+            with open(tds_file, "w") as f:
+                json.dump({"domains": {"tracker.com": "Renamed Inc"}}, f)
+            os.utime(tds_file, ns=(2, 2))
+            index = TdsIndex.load(tds_file, cache_dir)
+            self.assertEqual(index.lookup("tracker.com"), "Renamed Inc")
+            self.assertEqual(len(index), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,2 @@
+# Kept in its own module so setup.py and --version can read it without importing anything else
+__version__ = "0.1"
@@ -1,14 +1,21 @@
+import re
+
 from setuptools import setup
 
+with open("harryparser/version.py") as fin:
+    version = re.search(r'__version__ = "(.+)"', fin.read()).group(1)
+
 setup(
     name='HARryParser',
-    version='0.1',
+    version=version,
     author='Argelius Labs',
     description='A simple parser for .har files to support privacy data analysis.',
     packages=['harryparser'],
-    install_requires=['certifi==2022.12.7', 'charset-normalizer==3.1.0', 'dnspython==2.3.0', 'et-xmlfile==1.1.0',
-                      'filelock==3.10.7', 'idna==3.4', 'openpyxl==3.1.2', 'python-dateutil==2.8.2', 'requests==2.31.0',
-                      'requests-file==1.5.1', 'six==1.16.0', 'tldextract==3.4.0', 'urllib3==1.26.15', ],
+    install_requires=['anyio==3.7.1', 'certifi==2022.12.7', 'charset-normalizer==3.1.0', 'dnspython==2.3.0',
+                      'et-xmlfile==1.1.0', 'filelock==3.10.7', 'h11==0.14.0', 'httpcore==0.17.3', 'httpx==0.24.1',
+                      'idna==3.4', 'lxml==4.9.2', 'openpyxl==3.1.2', 'python-dateutil==2.8.2',
+                      'requests==2.31.0', 'requests-file==1.5.1', 'six==1.16.0', 'sniffio==1.3.0',
+                      'tldextract==3.4.0', 'urllib3==1.26.15', ],
     entry_points={
         'console_scripts': [
             'harryparser=harryparser.harryparser:main',